@@ -0,0 +1,65 @@
+"""Concurrent throughput of the compliance pipeline, blocking vs async.
+
+Runs N compliance checks at once against the stub LLM, once through the old
+synchronous `compliance_check` called from a coroutine (what the endpoint used
+to do) and once through `acompliance_check`. A probe task measures how long
+the event loop is stalled, which is what `/health` and `/hvac-metrics` feel.
+
+    python -m benchmarks.bench_async --concurrency 16 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.stubs import StubChatModel, stub_retriever
+from compliance_checker import ComplianceChecker
+
+SENSOR_DATA = json.dumps({"HVAC_Metrics": {"System_Status": {"Flow_Signal_Faulty": False}}})
+
+
+async def _probe(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def _run(mode: str, checker: ComplianceChecker, concurrency: int) -> dict:
+    async def one():
+        if mode == "blocking":
+            return checker.compliance_check(SENSOR_DATA)
+        return await checker.acompliance_check(SENSOR_DATA)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(concurrency / elapsed, 2),
+        "max_loop_stall_s": round(await probe, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call (s)")
+    args = parser.parse_args()
+
+    checker = ComplianceChecker(
+        llm=StubChatModel(latency=args.latency), embeddings=None, retriever=stub_retriever(), collection=None
+    )
+    results = [asyncio.run(_run(mode, checker, args.concurrency)) for mode in ("blocking", "async")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
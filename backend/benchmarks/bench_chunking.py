@@ -0,0 +1,126 @@
+"""PDF extraction speed and retrieved context size: character vs structured chunking.
+
+Builds PDFs from the regulation fixtures and compares the old ingestion path
+(every page joined into one string, split into 8000-character chunks with 500
+overlap) with the streaming, parallel page extraction and section-aware
+StructuredChunker. Reports pages per second on a large synthetic PDF, then
+indexes the fixture corpus both ways into temporary Chroma collections with
+the hash embedder and reports tokens retrieved per query at k and how often
+the expected answer is among them.
+
+    python -m benchmarks.bench_chunking --pages 400 --workers 4 --k 3
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+
+from langchain_chroma import Chroma
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from PyPDF2 import PdfReader
+
+from benchmarks.stubs import HashEmbeddings, fixture_pdf
+from ingestion import IngestionPipeline
+from tokens import count_tokens
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "regulations.json")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def _character_chunks(path: str) -> list:
+    with open(path, "rb") as f:
+        text = "\n".join(page.extract_text() or "" for page in PdfReader(f).pages)
+    return RecursiveCharacterTextSplitter(chunk_size=8000, chunk_overlap=500).split_text(text)
+
+
+def _structured_chunks(pipeline: IngestionPipeline, path: str) -> list:
+    return [chunk.text for chunk in pipeline.chunker.chunks(pipeline._pages(path))]
+
+
+def _throughput(label: str, pages: int, chunks: list, elapsed: float) -> dict:
+    return {
+        "mode": label,
+        "pages": pages,
+        "elapsed_s": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 1),
+        "chunks": len(chunks),
+        "mean_chunk_tokens": round(sum(count_tokens(chunk) for chunk in chunks) / len(chunks), 1),
+    }
+
+
+def _retrieval(label: str, store: Chroma, queries: list, k: int) -> dict:
+    tokens, answered = [], 0
+    for q in queries:
+        context = "\n".join(doc.page_content for doc in store.similarity_search(q["query"], k=k))
+        tokens.append(count_tokens(context))
+        answered += _normalize(q["answer"]) in _normalize(context)
+    return {
+        "mode": label,
+        "k": k,
+        "tokens_per_query_mean": round(sum(tokens) / len(tokens), 1),
+        "tokens_per_query_max": max(tokens),
+        "answer_in_context": round(answered / len(queries), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400, help="pages of the synthetic PDF timed for extraction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="extraction processes")
+    parser.add_argument("--k", type=int, default=3, help="chunks retrieved per query")
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    documents, queries = fixture["documents"], fixture["queries"]
+    report = {"workers": args.workers, "extraction": [], "retrieval": []}
+
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = IngestionPipeline(vectorstore=None, workers=args.workers,
+                                     jobs_path=os.path.join(directory, "ingestion_jobs.sqlite3"))
+        large = os.path.join(directory, "large.pdf")
+        with open(large, "wb") as f:
+            f.write(fixture_pdf([
+                "\n".join(documents[(2 * i + j) % len(documents)]["text"] for j in range(2))
+                for i in range(args.pages)
+            ]))
+        # Warm the process pool so worker start-up is not billed to the first run
+        _structured_chunks(pipeline, large)
+
+        started = time.perf_counter()
+        chunks = _character_chunks(large)
+        report["extraction"].append(_throughput("character", args.pages, chunks, time.perf_counter() - started))
+        started = time.perf_counter()
+        chunks = _structured_chunks(pipeline, large)
+        report["extraction"].append(_throughput("structured", args.pages, chunks, time.perf_counter() - started))
+
+        # One PDF per source document, a page per fixture document
+        by_source = defaultdict(list)
+        for doc in documents:
+            by_source[doc["source"]].append(doc["text"])
+        paths = []
+        for source, pages in by_source.items():
+            paths.append(os.path.join(directory, source))
+            with open(paths[-1], "wb") as f:
+                f.write(fixture_pdf(pages))
+
+        for label, chunker in (("character", _character_chunks),
+                               ("structured", lambda path: _structured_chunks(pipeline, path))):
+            store = Chroma(collection_name=label, persist_directory=os.path.join(directory, "chroma"),
+                           embedding_function=HashEmbeddings())
+            for path in paths:
+                store.add_texts(chunker(path), metadatas=None)
+            report["retrieval"].append(_retrieval(label, store, queries, args.k))
+        pipeline.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Latency and throughput of the API endpoints, fully offline.
+
+Starts the real FastAPI app in-process with the OpenAI chat model replaced by
+the latency-configurable stub and the embeddings by the hash embedder, against
+a temporary Chroma directory seeded with a PDF corpus built from the
+regulation fixtures. Each endpoint is driven by `concurrency` clients until
+`requests` calls have completed, and p50/p95/p99 latency plus throughput are
+written as JSON so runs can be compared over time.
+
+/index-pdf is timed from upload until its ingestion job has finished, each
+call with a distinct PDF. /chat and /check-compliance send a distinct
+snapshot per call so the answer caches miss unless --cache is given.
+/generate-report is only generated once per run, the telemetry does not
+change, so its numbers measure serving from the report store.
+
+    python -m benchmarks.bench_endpoints --concurrency 1,8 --requests 50 --latency 0.2 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ENDPOINTS = ("chat", "check-compliance", "index-pdf", "generate-report", "hvac-metrics")
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "regulations.json")
+# Documents of the fixture corpus per PDF page
+DOCUMENTS_PER_PAGE = 2
+# Interval at which an ingestion job is polled for completion (s)
+JOB_POLL_INTERVAL = 0.02
+
+
+def _isolate(directory: str) -> None:
+    """Point every on-disk store at `directory`; must run before the app is imported."""
+    os.environ["CHROMA_DIR"] = os.path.join(directory, "chroma_db")
+    os.environ["UPLOAD_DIR"] = os.path.join(directory, "uploads")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(directory, "embeddings.sqlite3")
+    os.environ["COMPLIANCE_CACHE_PATH"] = os.path.join(directory, "compliance_cache.sqlite3")
+    os.environ["REPORT_STORE_PATH"] = os.path.join(directory, "reports.sqlite3")
+    os.environ["INGEST_JOBS_PATH"] = os.path.join(directory, "ingestion_jobs.sqlite3")
+    os.environ["CHAT_SESSION_PATH"] = os.path.join(directory, "chat_sessions.sqlite3")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def _stub_clients(latency: float) -> None:
+    """Make the shared resources open the stub LLM and hash embedder instead of OpenAI."""
+    import resources
+    from benchmarks.stubs import HashEmbeddings, StubChatModel
+
+    resources.get_embeddings = HashEmbeddings
+    resources.ChatOpenAI = lambda callbacks=None, **kwargs: StubChatModel(latency=latency, callbacks=callbacks)
+
+
+def _corpus(pdfs: int) -> list:
+    """(filename, PDF bytes) of the regulation fixtures spread over `pdfs` files."""
+    from benchmarks.stubs import fixture_pdf
+
+    with open(FIXTURE) as f:
+        documents = json.load(f)["documents"]
+    files = []
+    for n in range(pdfs):
+        texts = [doc["text"] for doc in documents[n::pdfs]]
+        pages = ["\n".join(texts[i:i + DOCUMENTS_PER_PAGE]) for i in range(0, len(texts), DOCUMENTS_PER_PAGE)]
+        files.append((f"regulations-{n}.pdf", fixture_pdf(pages or [f"Empty fixture {n}"])))
+    return files
+
+
+async def _index(client, files: list) -> None:
+    response = await client.post("/index-pdf", files=[("files", (name, data, "application/pdf")) for name, data in files])
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/index-pdf/{job_id}")).json()
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion failed: {job['error']}")
+        if job["status"] == "done":
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def _call(endpoint: str, snapshot: dict, reuse: bool):
+    """Coroutine factory issuing one request of `endpoint`, the i-th of the run."""
+    from benchmarks.stubs import fixture_pdf
+
+    def distinct(i: int, run: str) -> dict:
+        if reuse:
+            return snapshot
+        return {"HVAC_Metrics": {**snapshot["HVAC_Metrics"], "Benchmark_Request": f"{run}-{i}"}}
+
+    async def call(client, i: int, run: str) -> None:
+        if endpoint == "chat":
+            response = await client.post("/chat", json={
+                "query": "Does the current flow rate comply with the ventilation requirements?",
+                "sensor_data": distinct(i, run),
+            })
+        elif endpoint == "check-compliance":
+            response = await client.post("/check-compliance", json={"sensor_data": distinct(i, run)})
+        elif endpoint == "index-pdf":
+            page = f"Benchmark upload {run}-{i}\nAir handling units shall be inspected every {i + 1} months."
+            await _index(client, [(f"upload-{run}-{i}.pdf", fixture_pdf([page]))])
+            return
+        elif endpoint == "generate-report":
+            response = await client.get("/generate-report")
+        else:
+            response = await client.get(f"/hvac-metrics/{i % 100}")
+        response.raise_for_status()
+
+    return call
+
+
+async def _drive(client, endpoint: str, call, concurrency: int, requests: int) -> dict:
+    latencies, errors = [], []
+    issued = 0
+    run = f"c{concurrency}-{time.time_ns()}"
+
+    async def worker():
+        nonlocal issued
+        while issued < requests:
+            i = issued
+            issued += 1
+            started = time.perf_counter()
+            try:
+                await call(client, i, run)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        result.update(p50_ms=round(p50, 1), p95_ms=round(p95, 1), p99_ms=round(p99, 1),
+                      mean_ms=round(float(np.mean(latencies)) * 1000, 1))
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _run(args, endpoints: list, concurrencies: list) -> list:
+    import httpx
+
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await _index(client, _corpus(args.pdfs))
+            snapshot = (await client.get("/hvac-metrics/0")).json()
+            results = []
+            for endpoint in endpoints:
+                call = _call(endpoint, snapshot, args.cache)
+                for concurrency in concurrencies:
+                    for i in range(args.warmup):
+                        await call(client, i, f"warmup-c{concurrency}")
+                    results.append(await _drive(client, endpoint, call, concurrency, args.requests))
+                    print(json.dumps(results[-1]), file=sys.stderr)
+            return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated client counts, each run in turn")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests before each run")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call (s)")
+    parser.add_argument("--pdfs", type=int, default=4, help="PDFs in the seeded corpus")
+    parser.add_argument("--cache", action="store_true", help="repeat one snapshot so answer caches can hit")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    concurrencies = [int(n) for n in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        _isolate(directory)
+        _stub_clients(args.latency)
+        started_at = time.time()
+        results = asyncio.run(_run(args, endpoints, concurrencies))
+
+    report = {
+        "revision": _revision(),
+        "started_at": started_at,
+        "config": {
+            "latency_s": args.latency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "pdfs": args.pdfs,
+            "cache": args.cache,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
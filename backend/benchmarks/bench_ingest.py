@@ -0,0 +1,73 @@
+"""Telemetry ingest rate into the per-device ring buffers, in readings per second.
+
+Replays rows of data_points.csv as pushed readings, one at a time, in JSON
+batches and as parsed NDJSON bodies, spread over several devices, and reports
+the sustained rate plus the latest-reading lookup cost.
+
+    python -m benchmarks.bench_ingest --readings 200000 --batch 500 --devices 10
+"""
+import argparse
+import json
+import time
+
+from device_telemetry import DeviceTelemetry, parse_readings
+from telemetry_store import HVAC_COLUMNS, get_telemetry_store
+
+
+def _readings(count: int, devices: int) -> list:
+    rows = get_telemetry_store().rows()
+    start = time.time()
+    return [
+        {"device_id": f"device-{i % devices}", "timestamp": start + i, **dict(zip(HVAC_COLUMNS, rows[i % len(rows)]))}
+        for i in range(count)
+    ]
+
+
+def _rate(label: str, count: int, elapsed: float) -> dict:
+    return {"mode": label, "readings": count, "elapsed_s": round(elapsed, 3),
+            "readings_per_s": round(count / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--retention", type=int, default=8640)
+    args = parser.parse_args()
+
+    readings = _readings(args.readings, args.devices)
+    results = []
+
+    store = DeviceTelemetry(retention=args.retention)
+    started = time.perf_counter()
+    for reading in readings:
+        store.buffer(reading["device_id"], create=True).append(reading)
+    results.append(_rate("single", len(readings), time.perf_counter() - started))
+
+    store = DeviceTelemetry(retention=args.retention)
+    started = time.perf_counter()
+    for i in range(0, len(readings), args.batch):
+        store.ingest(readings[i:i + args.batch])
+    results.append(_rate(f"batch-{args.batch}", len(readings), time.perf_counter() - started))
+
+    bodies = ["\n".join(json.dumps(r) for r in readings[i:i + args.batch]).encode()
+              for i in range(0, len(readings), args.batch)]
+    store = DeviceTelemetry(retention=args.retention)
+    started = time.perf_counter()
+    for body in bodies:
+        store.ingest(*parse_readings(body, "application/x-ndjson"))
+    results.append(_rate(f"ndjson-{args.batch}", len(readings), time.perf_counter() - started))
+
+    lookups = 100000
+    started = time.perf_counter()
+    for i in range(lookups):
+        store.latest(f"device-{i % args.devices}")
+    results.append({"mode": "latest", "lookups": lookups,
+                    "us_per_lookup": round((time.perf_counter() - started) / lookups * 1e6, 2)})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
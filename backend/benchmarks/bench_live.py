@@ -0,0 +1,87 @@
+"""Fan-out cost of the live metrics channel with many subscribers.
+
+Attaches N in-process subscribers to one channel fed by the CSV replay,
+publishes a series of readings and reports how long it takes until every
+fast subscriber has its message, plus delta vs snapshot message size. A share
+of subscribers is made slow; publishing does not wait for them, and they end
+up with fewer, coalesced deltas rather than a backlog.
+
+    python -m benchmarks.bench_live --subscribers 5000 --updates 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from live_metrics import MetricsChannel
+from telemetry_store import get_telemetry_store
+
+
+async def _run(subscribers: int, updates: int, slow_share: float) -> dict:
+    telemetry = get_telemetry_store()
+    channel = MetricsChannel(source=lambda: None, interval=3600)
+    received = [0] * subscribers
+    messages = [0] * subscribers
+    slow = int(subscribers * slow_share)
+    delivered = asyncio.Event()
+    pending = subscribers - slow
+
+    async def consume(i: int):
+        nonlocal pending
+        async for message in channel.subscribe():
+            if message.startswith(b":"):
+                continue
+            messages[i] += 1
+            received[i] = int(message.split(b'"version": ', 1)[1].split(b",", 1)[0])
+            if i < slow:
+                await asyncio.sleep(0.2)
+            elif received[i] == channel.version:
+                pending -= 1
+                if not pending:
+                    delivered.set()
+
+    tasks = [asyncio.create_task(consume(i)) for i in range(subscribers)]
+    await asyncio.sleep(0)
+
+    fanout = []
+    for step in range(updates):
+        pending = subscribers - slow
+        delivered.clear()
+        started = time.perf_counter()
+        if not channel.publish(step, telemetry.hvac_metrics(step)):
+            continue  # identical consecutive rows publish nothing
+        await delivered.wait()
+        fanout.append(time.perf_counter() - started)
+
+    # Let the slow subscribers catch up with the final version
+    await asyncio.sleep(0.5)
+    snapshot_bytes = len(channel.message(0))
+    delta_bytes = len(channel.message(channel.version - 1))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "subscribers": subscribers,
+        "updates": updates,
+        "fanout_ms_p50": round(statistics.median(fanout) * 1000, 2),
+        "fanout_ms_max": round(max(fanout) * 1000, 2),
+        "snapshot_bytes": snapshot_bytes,
+        "delta_bytes": delta_bytes,
+        "fast_messages_per_subscriber": messages[-1],
+        "slow_messages_per_subscriber": messages[0] if slow else None,
+        "slow_caught_up": all(version == channel.version for version in received[:slow]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--slow-share", type=float, default=0.1, help="share of subscribers that sleep after each message")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args.subscribers, args.updates, args.slow_share)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Regulation retrieval quality and prompt size: vector vs keyword vs hybrid.
+
+Indexes the fixture corpus into a temporary Chroma collection with the hash
+embedder, then reports recall@k of vector-only, BM25-only and hybrid (RRF)
+retrieval, and compares the prompt tokens and answer coverage of the old
+context (top-3 whole chunks) with the token-budgeted passage packing.
+
+    python -m benchmarks.bench_retrieval --budget 300
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from langchain_chroma import Chroma
+
+from benchmarks.stubs import HashEmbeddings
+from hybrid_retrieval import HybridRetriever, _doc_key
+from tokens import count_tokens
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "regulations.json")
+KS = (1, 3, 5)
+
+
+def _recall(rankings: list, queries: list, k: int) -> float:
+    hits = [len(set(ranking[:k]) & set(q["relevant"])) / len(q["relevant"]) for ranking, q in zip(rankings, queries)]
+    return round(sum(hits) / len(hits), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=300, help="token budget of the packed context")
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    documents, queries = fixture["documents"], fixture["queries"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = Chroma(collection_name="bench", persist_directory=directory, embedding_function=HashEmbeddings())
+        store.add_texts(
+            [doc["text"] for doc in documents],
+            metadatas=[{"source": doc["source"]} for doc in documents],
+            ids=[doc["id"] for doc in documents],
+        )
+        retriever = HybridRetriever(store, store._collection, token_budget=args.budget)
+        index = retriever.keyword_index()
+
+        rankings = {"vector": [], "keyword": [], "hybrid": []}
+        baseline_tokens, packed_tokens, baseline_answers, packed_answers = [], [], 0, 0
+        for q in queries:
+            vector_docs = store.similarity_search(q["query"], k=max(KS))
+            rankings["vector"].append([_doc_key(doc) for doc in vector_docs])
+            rankings["keyword"].append([index.ids[i] for i, _ in index.search(q["query"], max(KS))])
+            rankings["hybrid"].append([_doc_key(doc) for doc in retriever.retrieve(q["query"], k=max(KS))])
+
+            # Old behaviour: the top 3 vector chunks pasted whole
+            baseline = "\n".join(doc.page_content for doc in vector_docs[:3])
+            packed = retriever.search(q["query"], k=5)
+            baseline_tokens.append(count_tokens(baseline))
+            packed_tokens.append(count_tokens(packed))
+            baseline_answers += q["answer"] in baseline
+            packed_answers += q["answer"] in packed
+
+    report = {
+        "queries": len(queries),
+        "recall": {
+            method: {f"@{k}": _recall(ranked, queries, k) for k in KS} for method, ranked in rankings.items()
+        },
+        "prompt_tokens": {
+            "top3_chunks_mean": round(sum(baseline_tokens) / len(queries), 1),
+            "packed_mean": round(sum(packed_tokens) / len(queries), 1),
+            "budget": args.budget,
+        },
+        "answer_in_context": {
+            "top3_chunks": round(baseline_answers / len(queries), 3),
+            "packed": round(packed_answers / len(queries), 3),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Semantic chat cache lookup latency and match quality.
+
+Fills the cache with random unit "question" vectors, then looks up
+paraphrases (the stored vector plus noise, cosine ~0.97) and unrelated
+questions. Reports lookup p50/p99 with every entry in one scope (the worst
+case) and spread over many scopes, plus the paraphrase hit rate and the
+false hit rate on unrelated questions.
+
+    python -m benchmarks.bench_semantic_cache --entries 20000 --dimensions 1536 --scopes 100
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def _unit(rows: np.ndarray) -> np.ndarray:
+    return rows / np.linalg.norm(rows, axis=-1, keepdims=True)
+
+
+def _run(label: str, vectors: np.ndarray, scopes: int, lookups: int, noise: float) -> dict:
+    rng = np.random.default_rng(1)
+    cache = SemanticCache(capacity=len(vectors))
+    for i, vector in enumerate(vectors):
+        cache.put(f"scope-{i % scopes}", "v1", vector, f"q{i}", f"a{i}")
+
+    picked = rng.integers(0, len(vectors), lookups)
+    paraphrases = _unit(vectors[picked] + rng.standard_normal((lookups, vectors.shape[1])) * noise)
+    unrelated = _unit(rng.standard_normal((lookups, vectors.shape[1])))
+
+    latencies, correct = [], 0
+    for i, query in zip(picked, paraphrases):
+        started = time.perf_counter()
+        answer = cache.get(f"scope-{i % scopes}", query)
+        latencies.append(time.perf_counter() - started)
+        correct += answer == f"a{i}"
+    false_hits = 0
+    for n, query in enumerate(unrelated):
+        started = time.perf_counter()
+        false_hits += cache.get(f"scope-{n % scopes}", query) is not None
+        latencies.append(time.perf_counter() - started)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "mode": label,
+        "entries": len(vectors),
+        "scopes": scopes,
+        "paraphrase_cosine": round(float(np.mean(np.sum(paraphrases * vectors[picked], axis=1))), 3),
+        "paraphrase_hit_rate": round(correct / lookups, 3),
+        "false_hit_rate": round(false_hits / lookups, 3),
+        "lookup_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "lookup_p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--scopes", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--noise", type=float, default=0.006)
+    args = parser.parse_args()
+
+    vectors = _unit(np.random.default_rng(0).standard_normal((args.entries, args.dimensions)).astype(np.float32))
+
+    started = time.perf_counter()
+    vectors @ vectors[0]
+    exact_ms = (time.perf_counter() - started) * 1000
+
+    results = [
+        _run("single-scope", vectors, 1, args.lookups, args.noise),
+        _run(f"{args.scopes}-scopes", vectors, args.scopes, args.lookups, args.noise),
+        {"mode": "full-exact-scan", "entries": args.entries, "scan_ms": round(exact_ms, 3)},
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Throughput of the API as uvicorn workers are added, fully offline.
+
+For each worker count, starts `uvicorn benchmarks.stub_app:app --workers N`
+in a fresh directory, seeds the corpus through /index-pdf (run by whichever
+worker is the index writer, the job polled through any worker), waits for
+every worker to pick up the new index version, then drives one endpoint with
+`concurrency` clients per worker and reports throughput, latency and scaling
+efficiency against one worker as JSON.
+
+The stub LLM only sleeps, so with enough clients throughput is bounded by
+the CPU work of each request; gains beyond one worker need as many free
+cores as workers, plus one for this client.
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --endpoint chat --concurrency 32 --requests 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_endpoints import ENDPOINTS, _call, _corpus, _drive, _index, _revision
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds allowed for the workers to start and open the store
+STARTUP_TIMEOUT = 120.0
+
+
+def _start(workers: int, port: int, directory: str, latency: float) -> subprocess.Popen:
+    env = {**os.environ, "BENCH_DIR": directory, "BENCH_LATENCY": str(latency), "WEB_CONCURRENCY": str(workers)}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def _ready(client, server: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("uvicorn did not become ready")
+
+
+async def _run(args, workers: int) -> dict:
+    import httpx
+
+    from index_version import INDEX_VERSION_POLL
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = _start(workers, args.port, directory, args.latency)
+        try:
+            concurrency = args.concurrency * workers
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None,
+                                         limits=limits) as client:
+                await _ready(client, server)
+                await _index(client, _corpus(args.pdfs))
+                # Readers reopen the store on their next version check
+                await asyncio.sleep(2 * INDEX_VERSION_POLL)
+                snapshot = (await client.get("/hvac-metrics/0")).json()
+                call = _call(args.endpoint, snapshot, args.cache)
+                warmup = await _drive(client, args.endpoint, call, concurrency, args.warmup)
+                if warmup["errors"]:
+                    raise RuntimeError(f"Warmup failed: {warmup['first_error']}")
+                result = await _drive(client, args.endpoint, call, concurrency, args.requests * workers)
+        finally:
+            server.terminate()
+            server.wait()
+    return {"workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts, each run in turn")
+    parser.add_argument("--endpoint", default="chat", choices=ENDPOINTS, help="endpoint driven")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients per worker")
+    parser.add_argument("--requests", type=int, default=400, help="timed requests per worker")
+    parser.add_argument("--warmup", type=int, default=40, help="untimed requests before each run")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call (s)")
+    parser.add_argument("--pdfs", type=int, default=4, help="PDFs in the seeded corpus")
+    parser.add_argument("--cache", action="store_true", help="repeat one snapshot so answer caches can hit")
+    parser.add_argument("--port", type=int, default=8765, help="port uvicorn listens on")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    started_at = time.time()
+    results = []
+    for workers in [int(n) for n in args.workers.split(",")]:
+        results.append(asyncio.run(_run(args, workers)))
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    baseline = results[0]["throughput_rps"] / results[0]["workers"]
+    for result in results:
+        result["speedup"] = round(result["throughput_rps"] / results[0]["throughput_rps"], 2)
+        result["efficiency"] = round(result["throughput_rps"] / (result["workers"] * baseline), 2)
+
+    report = {
+        "revision": _revision(),
+        "started_at": started_at,
+        "config": {
+            "endpoint": args.endpoint,
+            "latency_s": args.latency,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "pdfs": args.pdfs,
+            "cache": args.cache,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
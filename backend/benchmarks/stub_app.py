@@ -0,0 +1,15 @@
+"""The app with the stub LLM and hash embedder, for benchmarks that start real uvicorn workers.
+
+Every worker process imports this module, so the stores are isolated under
+BENCH_DIR and the clients stubbed before main is imported.
+
+    BENCH_DIR=/tmp/bench BENCH_LATENCY=0.2 uvicorn benchmarks.stub_app:app --workers 4
+"""
+import os
+
+from benchmarks.bench_endpoints import _isolate, _stub_clients
+
+_isolate(os.environ["BENCH_DIR"])
+_stub_clients(float(os.getenv("BENCH_LATENCY", "0.2")))
+
+from main import app  # noqa: E402
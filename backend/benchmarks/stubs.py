@@ -0,0 +1,134 @@
+"""Offline stand-ins for the OpenAI chat model, embeddings and the Chroma retriever."""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Characters that would end or escape a PDF string literal
+_PDF_UNSAFE = re.compile(r"[()\\]")
+
+STUB_COMPLIANCE_RESULT = [
+    {
+        "regulation": "Stub regulation",
+        "compliance_issues": "None",
+        "status": "compliant",
+        "next_steps": "No action required.",
+    }
+]
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that sleeps for `latency` seconds and returns a canned reply."""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if "Format your response as a JSON response" in prompt:
+            return json.dumps(STUB_COMPLIANCE_RESULT)
+        if "search query" in prompt:
+            return "HVAC flow sensor fault regulation"
+        return "Stub analysis of the provided data."
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words embedding: hashed word and character-trigram
+    features, L2-normalized. No model download, no network."""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        features = words + [word[i:i + 3] for word in words for i in range(max(1, len(word) - 2))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubVectorStore:
+    """Vector store returning a fixed set of regulation snippets."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.documents = [
+            Document(page_content=f"Regulation {i}: flow sensors must be inspected yearly.", metadata={"source": "stub.pdf"})
+            for i in range(3)
+        ]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        time.sleep(self.latency)
+        return self.documents[:k]
+
+    async def asimilarity_search(self, query: str, k: int = 4) -> List[Document]:
+        await asyncio.sleep(self.latency)
+        return self.documents[:k]
+
+
+def stub_retriever(latency: float = 0.05) -> SimpleNamespace:
+    """Object shaped like `Chroma(...).as_retriever()` as far as ComplianceChecker is concerned."""
+    return SimpleNamespace(vectorstore=StubVectorStore(latency))
+
+
+def fixture_pdf(pages: List[str]) -> bytes:
+    """Minimal text-only PDF, one page per string, readable by PyPDF2."""
+    out = b"%PDF-1.4\n"
+    offsets = []
+
+    def add(obj: str) -> None:
+        nonlocal out
+        offsets.append(len(out))
+        out += obj.encode("latin-1", "replace")
+
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    add("1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n")
+    add(f"2 0 obj<</Type/Pages/Kids[{kids}]/Count {len(pages)}>>endobj\n")
+    add("3 0 obj<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>endobj\n")
+    for i, text in enumerate(pages):
+        lines = " ".join(f"({_PDF_UNSAFE.sub('', line)}) '" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 50 780 Td 12 TL {lines} ET"
+        add(f"{4 + 2 * i} 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]"
+            f"/Resources<</Font<</F1 3 0 R>>>>/Contents {5 + 2 * i} 0 R>>endobj\n")
+        add(f"{5 + 2 * i} 0 obj<</Length {len(stream)}>>stream\n{stream}\nendstream endobj\n")
+    xref = len(out)
+    out += f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer<</Size {len(offsets) + 1}/Root 1 0 R>>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
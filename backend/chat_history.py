@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from tokens import count_tokens, truncate_to_tokens
+
+# Most recent turns (a user message and its reply) kept verbatim in the prompt
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "3"))
+# Tokens the summary plus the verbatim turns may take in a prompt
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1200"))
+# Tokens of the rolling summary of older turns
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+# Rolling summaries remembered across requests, by conversation prefix
+CHAT_SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_SUMMARY_CACHE_SIZE", "2048"))
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a facility manager and an HVAC compliance assistant.
+Fold the new messages into the current summary. Keep facts, numeric values, regulations cited, decisions and open questions; drop pleasantries.
+Answer with the updated summary only, at most {words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+REWRITE_PROMPT = """Rewrite the follow-up question so it can be understood without the conversation, resolving references such as "it" or "that" from the context.
+Keep it short and keep every number, clause and term it contains. Answer with the question only.
+
+Conversation:
+{history}
+
+Follow-up question: {question}
+Standalone question:"""
+
+# Words that point back into the conversation
+_REFERENCES = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|there|he|she|above|previous|same|also|else|more|"
+    r"again|why|how come|what about|and if|instead)\b",
+    re.IGNORECASE,
+)
+
+Message = Tuple[bool, str]  # (is user, content)
+
+
+@dataclass
+class CompactHistory:
+    summary: str = ""
+    recent: List[Message] = field(default_factory=list)
+    # Messages folded into the summary
+    summarized: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.summary or self.recent)
+
+    def format(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.recent:
+            parts.append("Recent messages:\n" + "\n".join(_line(message) for message in self.recent))
+        return "\n\n".join(parts)
+
+
+def _line(message: Message) -> str:
+    return f"{'User' if message[0] else 'Assistant'}: {message[1]}"
+
+
+def _tail(messages: List[Message], max_tokens: int) -> str:
+    """The newest messages that fit in `max_tokens`, oldest first.
+
+    Used when a cold summary cache leaves more to fold in than the summary
+    call can take: the messages right before the verbatim turns matter most.
+    """
+    lines: List[str] = []
+    used = 0
+    for message in reversed(messages):
+        line = _line(message)
+        used += count_tokens(line)
+        if used > max_tokens:
+            if not lines:
+                lines.append(truncate_to_tokens(line, max_tokens))
+            break
+        lines.append(line)
+    return "\n".join(reversed(lines))
+
+
+def needs_rewrite(question: str) -> bool:
+    """Whether a follow-up likely depends on earlier turns to be understood."""
+    return bool(_REFERENCES.search(question)) or len(question.split()) < 4
+
+
+class HistoryManager:
+    """Keeps chat prompts a bounded size however long the conversation gets.
+
+    The last few turns are kept verbatim and everything older is folded into
+    a rolling summary. Summaries are remembered by a hash of the conversation
+    prefix they cover, so each request only summarizes the messages that
+    newly fell out of the window instead of the whole history. The summary
+    and the verbatim turns together stay within the token budget.
+
+    Conversations passed with a `key`, such as a server-side session id,
+    only ever grow, so their prefix hashes are kept and each request hashes
+    just the messages added since the last one.
+    """
+
+    def __init__(self, llm: Any, recent_turns: int = CHAT_HISTORY_TURNS,
+                 token_budget: int = CHAT_HISTORY_TOKEN_BUDGET, summary_tokens: int = CHAT_SUMMARY_TOKENS,
+                 cache_size: int = CHAT_SUMMARY_CACHE_SIZE):
+        self.llm = llm
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_tokens = min(summary_tokens, token_budget // 2)
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        # Prefix hashes by conversation key, with the last message they cover
+        self._chains: "OrderedDict[str, Tuple[List[str], Optional[Message]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prefix_hashes(self, messages: Sequence[Message], key: Optional[str] = None) -> List[str]:
+        """Hash of every prefix of the conversation, hashes[i] covering messages[:i]."""
+        hashes = [hashlib.sha256(b"").hexdigest()]
+        if key is not None:
+            with self._lock:
+                chain, last = self._chains.pop(key, (hashes, None))
+            # A conversation that no longer starts with the hashed messages is hashed afresh
+            if len(chain) - 1 <= len(messages) and (last is None or messages[len(chain) - 2] == last):
+                hashes = chain[:]
+        for is_user, content in messages[len(hashes) - 1:]:
+            hashes.append(hashlib.sha256(f"{hashes[-1]}{int(is_user)}{content}".encode()).hexdigest())
+        if key is not None:
+            with self._lock:
+                self._chains[key] = (hashes, messages[-1] if messages else None)
+                while len(self._chains) > self.cache_size:
+                    self._chains.popitem(last=False)
+        return hashes
+
+    def forget(self, key: str) -> None:
+        """Drop the prefix hashes of a conversation that ended, so its key can start afresh."""
+        with self._lock:
+            self._chains.pop(key, None)
+
+    def _cached_summary(self, hashes: List[str], cut: int) -> Tuple[int, str]:
+        """Longest already summarized prefix up to `cut` and its summary."""
+        with self._lock:
+            for i in range(cut, 0, -1):
+                summary = self._summaries.get(hashes[i])
+                if summary is not None:
+                    self._summaries.move_to_end(hashes[i])
+                    return i, summary
+        return 0, ""
+
+    def _remember(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def _cut(self, messages: List[Message]) -> int:
+        """Index of the first message kept verbatim.
+
+        Walks back from the newest message, so only the messages that may be
+        kept are counted.
+        """
+        cut = len(messages) - 1
+        used = 0
+        for i in range(len(messages) - 1, max(0, len(messages) - 2 * self.recent_turns) - 1, -1):
+            used += count_tokens(_line(messages[i]))
+            if used > self.token_budget:
+                break
+            # Without older messages there is no summary to make room for
+            if used + (self.summary_tokens if i else 0) <= self.token_budget:
+                cut = i
+        return cut
+
+    async def acompact(self, messages: Sequence[Message], key: Optional[str] = None) -> CompactHistory:
+        """Summary plus verbatim tail of a conversation of (is user, content) messages.
+
+        `key` identifies a conversation that is only ever appended to.
+        """
+        messages = list(messages)
+        if not messages:
+            return CompactHistory()
+        cut = self._cut(messages)
+        recent = messages[cut:]
+        # A single message larger than the budget on its own is clipped
+        recent_budget = self.token_budget - (self.summary_tokens if cut else 0)
+        if len(recent) == 1 and count_tokens(_line(recent[0])) > recent_budget:
+            recent = [(recent[0][0], truncate_to_tokens(recent[0][1], recent_budget - 8))]
+        if not cut:
+            return CompactHistory(recent=recent)
+
+        hashes = self._prefix_hashes(messages[:cut], key)
+        done, summary = self._cached_summary(hashes, cut)
+        if done < cut:
+            updated = await self._summarize(summary, messages[done:cut])
+            if updated is not None:
+                summary = updated
+                self._remember(hashes[cut], summary)
+        return CompactHistory(summary=summary, recent=recent, summarized=cut)
+
+    async def _summarize(self, summary: str, messages: List[Message]) -> Optional[str]:
+        prompt = SUMMARY_PROMPT.format(
+            words=int(self.summary_tokens * 0.7),
+            summary=summary or "(empty)",
+            messages=_tail(messages, 4 * self.token_budget),
+        )
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return truncate_to_tokens(response.content.strip(), self.summary_tokens)
+        except Exception as e:
+            # The previous summary is used for this turn rather than failing it
+            logger.warning(f"History summarization failed: {e}")
+            return None
+
+    async def arewrite(self, question: str, history: CompactHistory) -> str:
+        """The question as a standalone search query, rewritten only when it
+        depends on earlier turns."""
+        if not history or not needs_rewrite(question):
+            return question
+        try:
+            response = await self.llm.ainvoke(REWRITE_PROMPT.format(history=history.format(), question=question))
+        except Exception as e:
+            logger.warning(f"Question rewrite failed: {e}")
+            return question
+        rewritten = response.content.strip().strip('"')
+        return rewritten or question
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from chat_history import Message
+
+# Seconds without a message after which a session leaves memory
+CHAT_SESSION_IDLE = float(os.getenv("CHAT_SESSION_IDLE", "1800"))
+# Sessions held in memory at once; the least recently used are evicted first
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+# SQLite file evicted sessions are spilled to and reloaded from; unset keeps memory only
+CHAT_SESSION_PATH = os.getenv("CHAT_SESSION_PATH")
+# Worker processes serving the app. uvicorn reads this for --workers but never sets it,
+# so multi-worker deployments must set it; with several, sessions must live on disk
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Read every turn from and write it through to the SQLite file, so any worker can continue a session
+CHAT_SESSION_SHARED = os.getenv("CHAT_SESSION_SHARED", str(WEB_CONCURRENCY > 1)).lower() in ("1", "true", "yes")
+# Session file used when sessions are shared but CHAT_SESSION_PATH is unset
+SHARED_SESSION_PATH = "./cache/chat_sessions.sqlite3"
+# Seconds a spilled session is kept before it is deleted
+CHAT_SESSION_RETENTION = float(os.getenv("CHAT_SESSION_RETENTION", str(7 * 86400)))
+
+# Idle sessions are looked for at most this often
+SWEEP_INTERVAL = 60.0
+
+
+class ChatSession:
+    __slots__ = ("messages", "stored", "last_used")
+
+    def __init__(self, messages: Optional[List[Message]] = None):
+        self.messages: List[Message] = messages or []
+        self.stored = len(self.messages)  # leading messages already in the spill file
+        self.last_used = time.time()
+
+
+class SessionStore:
+    """Conversation state kept server-side so clients only send the new message.
+
+    Sessions live in memory, least recently used first out once there are
+    more than `max_sessions` or they have been idle for `idle` seconds. With
+    a SQLite path, evicted sessions are spilled to disk and transparently
+    reloaded on their next message; without one they are dropped. Shared
+    stores, for multi-worker deployments, reload a session on every turn and
+    write each new message straight through, since the previous turn may
+    have been served by another process. The file holds one row per message
+    and is only ever appended to, so workers answering the same session at
+    once both keep their messages.
+    """
+
+    def __init__(self, path: Optional[str] = CHAT_SESSION_PATH, idle: float = CHAT_SESSION_IDLE,
+                 max_sessions: int = CHAT_SESSION_MAX, retention: float = CHAT_SESSION_RETENTION,
+                 shared: bool = CHAT_SESSION_SHARED):
+        if shared and not path:
+            path = SHARED_SESSION_PATH
+        self.shared = shared
+        self.idle = idle
+        self.max_sessions = max_sessions
+        self.retention = retention
+        self.evicted = 0
+        self.reloaded = 0
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._swept_at = time.time()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    is_user INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_messages_session ON chat_messages (session_id, id)"
+            )
+            self._conn.commit()
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = ChatSession()
+            self._evict()
+        return session_id
+
+    def _session(self, session_id: str) -> ChatSession:
+        """In-memory session, reloaded from the spill file or started empty."""
+        session = self._sessions.get(session_id)
+        if session is None or self.shared:
+            session = ChatSession(self._load(session_id))
+            self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        return session
+
+    def history(self, session_id: str) -> List[Message]:
+        """Messages of a session so far; an unknown id starts an empty session."""
+        with self._lock:
+            messages = list(self._session(session_id).messages)
+            self._evict()
+        return messages
+
+    def append(self, session_id: str, *messages: Message) -> None:
+        with self._lock:
+            session = self._session(session_id)
+            session.messages.extend(messages)
+            if self.shared:
+                # Appended as new rows, never rewriting what other workers stored meanwhile
+                self._spill([(session_id, session)])
+            self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+            if self._conn is not None:
+                cursor = self._conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+                self._conn.commit()
+                found = found or cursor.rowcount > 0
+        return found
+
+    def _load(self, session_id: str) -> List[Message]:
+        if self._conn is None:
+            return []
+        rows = self._conn.execute(
+            "SELECT is_user, content FROM chat_messages WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        if rows:
+            self.reloaded += 1
+        return [(bool(is_user), content) for is_user, content in rows]
+
+    def _spill(self, items: List) -> None:
+        """Append the messages of each session not yet in the file."""
+        rows = []
+        for session_id, session in items:
+            rows.extend((session_id, is_user, content, session.last_used)
+                        for is_user, content in session.messages[session.stored:])
+            session.stored = len(session.messages)
+        if self._conn is None or not rows:
+            return
+        self._conn.executemany(
+            "INSERT INTO chat_messages (session_id, is_user, content, created_at) VALUES (?, ?, ?, ?)", rows
+        )
+        self._conn.commit()
+
+    def _evict(self) -> None:
+        """Move sessions over the size limit, and every so often the idle ones, out of memory."""
+        evicted = []
+        while len(self._sessions) > self.max_sessions:
+            evicted.append(self._sessions.popitem(last=False))
+        now = time.time()
+        if now - self._swept_at >= SWEEP_INTERVAL:
+            self._swept_at = now
+            # Least recently used first, so the scan stops at the first active session
+            while self._sessions:
+                _, session = next(iter(self._sessions.items()))
+                if now - session.last_used < self.idle:
+                    break
+                evicted.append(self._sessions.popitem(last=False))
+            if self._conn is not None:
+                self._conn.execute(
+                    """DELETE FROM chat_messages WHERE session_id IN (
+                        SELECT session_id FROM chat_messages GROUP BY session_id HAVING MAX(created_at) < ?
+                    )""",
+                    (now - self.retention,),
+                )
+                self._conn.commit()
+        self._spill(evicted)
+        self.evicted += len(evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            spilled = (self._conn.execute("SELECT COUNT(DISTINCT session_id) FROM chat_messages").fetchone()[0]
+                       if self._conn is not None else 0)
+            return {
+                "sessions": len(self._sessions),
+                "spilled": spilled,
+                "evicted": self.evicted,
+                "reloaded": self.reloaded,
+                "persistent": self._conn is not None,
+                "shared": self.shared,
+            }
+
+    def close(self) -> None:
+        """Spill every session still in memory and close the file."""
+        with self._lock:
+            self._spill(list(self._sessions.items()))
+            self._sessions.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,136 @@
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from tokens import count_tokens
+
+# Target size of a chunk; sections longer than this are split, shorter ones kept whole
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "350"))
+# Tokens repeated at the start of the next chunk when a section is split
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "40"))
+# Sections smaller than this are merged into the following one
+INGEST_CHUNK_MIN_TOKENS = int(os.getenv("INGEST_CHUNK_MIN_TOKENS", "60"))
+
+# Lines that open a section or clause: "Section 4.2", "§ 12", "Article 7", "Annex B",
+# "4.2.1 Ventilation rates", "12. Inspections"
+_HEADING = re.compile(
+    r"^\s*(?:"
+    # Only a capitalised keyword starts a heading, or prose such as "section 5 of this regulation"
+    # and "Schedule a technician visit" would match
+    r"(?P<keyword>(?:Section|Sec\.|Article|Art\.|Chapter|Part|Clause|Annex|Appendix|Schedule"
+    r"|SECTION|ARTICLE|CHAPTER|PART|CLAUSE|ANNEX|APPENDIX|SCHEDULE|§)\s*"
+    r"(?P<keyword_id>[0-9]+(?:\.[0-9]+)*[a-z]?|[IVXLC]+|[A-Z]))\b"
+    # A title word of three letters or more, or wrapped body lines such as "15 litres per second"
+    # and "3 Pa across the filter" would match
+    r"|(?P<number>[0-9]{1,3}(?:\.[0-9]{1,3}){0,4})\.?\s+(?=[A-Z][a-z]{2,})"
+    r")",
+)
+_SENTENCE_END = re.compile(r"(?<=[.;:!?])\s+")
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: int  # 1-based
+    page_end: int
+    section: str  # id of the section the chunk starts in, "" before the first heading
+
+
+def section_id(line: str) -> Optional[str]:
+    """Id of the section a heading line opens ("4.2", "Article 7"), None for body text.
+
+    Numbered sections keep only their number, so "Section 4.2" and "4.2" agree.
+    """
+    match = _HEADING.match(line)
+    if match is None or len(line) > 200:
+        return None
+    if match.group("number"):
+        return match.group("number")
+    keyword = match.group("keyword").split()[0].rstrip(".").lower()
+    if keyword.startswith(("sec", "§")):
+        return match.group("keyword_id")
+    return f"{keyword.capitalize()} {match.group('keyword_id')}"
+
+
+def _pieces(line: str, max_tokens: int) -> List[str]:
+    """A line split at sentence ends, and at words if need be, into pieces within `max_tokens`."""
+    if count_tokens(line) <= max_tokens:
+        return [line]
+    pieces, current = [], ""
+    for part in _SENTENCE_END.split(line):
+        words = [part] if count_tokens(part) <= max_tokens else part.split()
+        for word in words:
+            candidate = f"{current} {word}" if current else word
+            if current and count_tokens(candidate) > max_tokens:
+                pieces.append(current)
+                candidate = word
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class StructuredChunker:
+    """Splits a stream of pages into chunks along section and clause boundaries.
+
+    A chunk never spans two sections unless the earlier one is under
+    `min_tokens`; sections over `max_tokens` are split between lines (or
+    sentences) with up to `overlap` tokens of trailing lines carried over and
+    the heading repeated, so each chunk still says which clause it belongs
+    to. Pages are consumed one at a time, the document text is never held
+    whole.
+    """
+
+    def __init__(self, max_tokens: int = INGEST_CHUNK_TOKENS, overlap: int = INGEST_CHUNK_OVERLAP,
+                 min_tokens: int = INGEST_CHUNK_MIN_TOKENS):
+        self.max_tokens = max_tokens
+        self.overlap = min(overlap, max_tokens // 4)
+        self.min_tokens = min(min_tokens, max_tokens // 2)
+
+    def chunks(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+        """Chunks of (1-based page number, page text) pairs, in order."""
+        lines: List[Tuple[int, str, int]] = []  # (page, line, tokens)
+        tokens = 0
+        carried = 0  # leading lines of `lines` repeated from the previous chunk
+        section, heading = "", ""
+
+        def emit(carry: bool) -> Iterator[Chunk]:
+            nonlocal lines, tokens, carried
+            if not lines:
+                return
+            yield Chunk("\n".join(line for _, line, _ in lines), lines[0][0], lines[-1][0], section)
+            kept: List[Tuple[int, str, int]] = []
+            if carry:
+                kept_tokens = 0
+                for entry in reversed(lines[1:]):
+                    if kept_tokens + entry[2] > self.overlap:
+                        break
+                    kept.insert(0, entry)
+                    kept_tokens += entry[2]
+                if heading and (not kept or not kept[0][1].startswith(heading)):
+                    kept.insert(0, (kept[0][0] if kept else lines[-1][0], heading, count_tokens(heading)))
+            lines, tokens, carried = kept, sum(entry[2] for entry in kept), len(kept)
+
+        for page, text in pages:
+            for raw in text.splitlines():
+                line = raw.strip()
+                if not line:
+                    continue
+                opened = section_id(line)
+                if opened is not None:
+                    if len(lines) == carried:
+                        # Overlap never crosses into the next section
+                        lines, tokens, carried = [], 0, 0
+                    elif tokens >= self.min_tokens:
+                        yield from emit(carry=False)
+                    if not lines:
+                        section = opened
+                    # Clause numbers often run into their text; repeat only the title
+                    heading = _SENTENCE_END.split(line, 1)[0][:80]
+                room = max(self.max_tokens - self.overlap - count_tokens(heading), self.max_tokens // 2)
+                for piece in _pieces(line, room):
+                    piece_tokens = count_tokens(piece)
+                    if lines and tokens + piece_tokens > self.max_tokens:
+                        yield from emit(carry=True)
+                    lines.append((page, piece, piece_tokens))
+                    tokens += piece_tokens
+        yield from emit(carry=False)
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from compliance_cache import ComplianceCache, snapshot_key
+from compliance_checker import ComplianceChecker
+from concurrency import run_blocking
+from device_telemetry import get_device_telemetry
+from index_version import current_index_version
+from observability import QUEUE_WAIT
+
+# LLM calls in flight at once across every batch job
+COMPLIANCE_BATCH_CONCURRENCY = int(os.getenv("COMPLIANCE_BATCH_CONCURRENCY", "8"))
+# LLM requests started per minute by batch jobs, 0 for no pacing
+COMPLIANCE_BATCH_RPM = float(os.getenv("COMPLIANCE_BATCH_RPM", "0"))
+# Significant digits snapshots are rounded to when grouping similar profiles
+COMPLIANCE_BATCH_PROFILE_DIGITS = int(os.getenv("COMPLIANCE_BATCH_PROFILE_DIGITS", "1"))
+# Devices accepted in one batch
+COMPLIANCE_BATCH_MAX_ITEMS = int(os.getenv("COMPLIANCE_BATCH_MAX_ITEMS", "2000"))
+# Finished jobs are kept this long (seconds) so clients can read their results
+COMPLIANCE_BATCH_JOB_TTL = 3600
+
+# Attempts of one LLM call that keeps getting rate limited
+RATE_LIMIT_ATTEMPTS = 6
+# Pause after a rate-limit response that does not say how long to wait
+DEFAULT_RETRY_AFTER = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait when `error` is a rate-limit (HTTP 429) response, else None."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for LLM calls that adapts to rate limiting.
+
+    A rate-limit response halves the limit and pauses new calls for the
+    advertised delay; every `limit` successful calls grow it back by one, up
+    to `max_concurrency` (additive increase, multiplicative decrease). An
+    optional requests-per-minute pace spaces out call starts as well.
+    """
+
+    def __init__(self, max_concurrency: int = COMPLIANCE_BATCH_CONCURRENCY,
+                 requests_per_minute: float = COMPLIANCE_BATCH_RPM):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.active = 0
+        self.rate_limited = 0
+        self.calls = 0
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        submitted = time.monotonic()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        now = time.monotonic()
+        start = max(now, self._next_start, self._paused_until)
+        self._next_start = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+        QUEUE_WAIT.observe(max(start, now) - submitted, queue="llm_batch")
+        self.calls += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def backoff(self, delay: float) -> None:
+        self.rate_limited += 1
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def succeeded(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_concurrency:
+            self.limit += 1
+            self._successes = 0
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class RateLimitedLLM:
+    """Chat model whose async calls go through an AdaptiveLimiter and are
+    retried after the advertised delay when rate limited."""
+
+    def __init__(self, llm: Any, limiter: AdaptiveLimiter, attempts: int = RATE_LIMIT_ATTEMPTS):
+        self.llm = llm
+        self.limiter = limiter
+        self.attempts = attempts
+
+    async def ainvoke(self, *args, **kwargs):
+        for attempt in range(self.attempts):
+            async with self.limiter:
+                try:
+                    response = await self.llm.ainvoke(*args, **kwargs)
+                except Exception as e:
+                    delay = retry_after(e)
+                    if delay is None or attempt == self.attempts - 1:
+                        raise
+                    logger.warning(f"LLM rate limited, retrying in {delay:.1f}s")
+                    self.limiter.backoff(delay)
+                    continue
+            self.limiter.succeeded()
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+@dataclass
+class BatchJob:
+    id: str
+    devices: List[str]
+    status: str = "queued"
+    done: int = 0
+    failed: int = 0
+    cached: int = 0
+    groups: int = 0
+    retrievals: int = 0
+    results: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    updated: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self, include_results: bool = False) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "devices_total": len(self.devices),
+            "done": self.done,
+            "failed": self.failed,
+            "cached": self.cached,
+            "groups": self.groups,
+            "retrievals": self.retrievals,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if include_results:
+            job["results"] = self.results
+        return job
+
+    def _record(self, result: Dict) -> None:
+        self.results.append(result)
+        if result["status"] == "failed":
+            self.failed += 1
+        else:
+            self.done += 1
+        # Wake every stream reader at once, later readers wait on a fresh event
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class ComplianceBatchRunner:
+    """Compliance checks for many devices at once.
+
+    Snapshots already in the compliance cache are answered from it and
+    identical snapshots are evaluated once. The rest are grouped into
+    profiles, same rule outcomes and the same readings at
+    COMPLIANCE_BATCH_PROFILE_DIGITS significant digits, and each group shares
+    one regulation retrieval; only the analysis and the final check run per
+    snapshot. The checker is shared with single checks; a batch's LLM calls
+    go through its model wrapped in the limiter.
+    """
+
+    def __init__(self, checker: ComplianceChecker, cache: ComplianceCache, limiter: AdaptiveLimiter,
+                 profile_digits: int = COMPLIANCE_BATCH_PROFILE_DIGITS):
+        self.checker = checker
+        self.llm = RateLimitedLLM(checker.llm, limiter)
+        self.cache = cache
+        self.limiter = limiter
+        self.profile_digits = profile_digits
+        self.jobs: Dict[str, BatchJob] = {}
+        self._tasks = set()
+
+    def submit(self, items: List[Dict]) -> BatchJob:
+        """Register a job for items of {device_id, sensor_data} and start it.
+
+        Items without sensor_data use the device's latest pushed reading.
+        """
+        if not items:
+            raise ValueError("No devices to check")
+        if len(items) > COMPLIANCE_BATCH_MAX_ITEMS:
+            raise ValueError(f"At most {COMPLIANCE_BATCH_MAX_ITEMS} devices per batch")
+        self._prune_jobs()
+        job = BatchJob(id=uuid.uuid4().hex, devices=[item["device_id"] for item in items])
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self.run(job, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _prune_jobs(self) -> None:
+        cutoff = time.time() - COMPLIANCE_BATCH_JOB_TTL
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[BatchJob]:
+        return self.jobs.get(job_id)
+
+    def profile(self, sensor_data: Dict, rule_results: List[Dict]) -> str:
+        outcome = ",".join(f"{result['regulation']}={result['status']}" for result in rule_results)
+        return snapshot_key(sensor_data, outcome, self.profile_digits)
+
+    async def run(self, job: BatchJob, items: List[Dict]) -> BatchJob:
+        job.status = "running"
+        try:
+            index_version = f"{current_index_version()}:{self.checker.rule_engine.version}"
+            # Cache key -> (snapshot, devices); identical snapshots are evaluated once
+            pending: Dict[str, tuple] = {}
+            keyed = []
+            for item in items:
+                sensor_data = item.get("sensor_data") or self._latest(item["device_id"])
+                if sensor_data is None:
+                    job._record({"device_id": item["device_id"], "status": "failed",
+                                 "error": "No sensor_data given and no pushed reading for this device"})
+                    continue
+                keyed.append((item, sensor_data, self.cache.key(sensor_data, index_version)))
+            # One lookup for the whole batch, off the event loop
+            found = await run_blocking(self.cache.get_many, [key for _, _, key in keyed])
+            for item, sensor_data, key in keyed:
+                cached = found.get(key)
+                if cached is not None:
+                    job.cached += 1
+                    job._record({"device_id": item["device_id"], "status": "done", "cached": True, "results": cached})
+                    continue
+                pending.setdefault(key, (sensor_data, []))[1].append(item["device_id"])
+
+            groups: Dict[str, List[str]] = {}
+            for key, (sensor_data, _) in pending.items():
+                rule_results = self.checker.rule_engine.evaluate_snapshot(sensor_data)
+                groups.setdefault(self.profile(sensor_data, rule_results), []).append(key)
+            job.groups = len(groups)
+
+            await asyncio.gather(*(
+                self._run_group(job, [(key, *pending[key]) for key in keys], index_version)
+                for keys in groups.values()
+            ))
+            job.status = "done"
+        except Exception as e:
+            logger.exception(f"Compliance batch {job.id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.updated.set()
+        return job
+
+    @staticmethod
+    def _latest(device_id: str) -> Optional[Dict]:
+        latest = get_device_telemetry().latest(device_id)
+        return None if latest is None else latest[2]
+
+    async def _run_group(self, job: BatchJob, members: List[tuple], index_version: str) -> None:
+        """One regulation retrieval for the group, then one check per distinct snapshot."""
+        try:
+            with self.checker.using(self.llm):
+                regulations = await self.checker.aretrieve_regulations(json.dumps(members[0][1]))
+            job.retrievals += 1
+        except Exception as e:
+            for _, _, devices in members:
+                for device_id in devices:
+                    job._record({"device_id": device_id, "status": "failed", "error": f"Retrieval failed: {e}"})
+            return
+        await asyncio.gather(*(
+            self._check(job, key, sensor_data, devices, regulations, index_version)
+            for key, sensor_data, devices in members
+        ))
+
+    async def _check(self, job: BatchJob, key: str, sensor_data: Dict, devices: List[str], regulations: str,
+                     index_version: str) -> None:
+        try:
+            state = await self.checker.arun(json.dumps(sensor_data), regulations=regulations, llm=self.llm)
+        except Exception as e:
+            for device_id in devices:
+                job._record({"device_id": device_id, "status": "failed", "error": str(e)})
+            return
+        await run_blocking(self.cache.put, key, index_version, state["results"])
+        for device_id in devices:
+            job._record({"device_id": device_id, "status": "done", "cached": False, "results": state["results"]})
+
+    async def results(self, job: BatchJob) -> AsyncIterator[Dict]:
+        """Per-device results as they complete, finished ones first."""
+        sent = 0
+        while True:
+            updated = job.updated
+            while sent < len(job.results):
+                yield job.results[sent]
+                sent += 1
+            if job.finished_at is not None:
+                return
+            await updated.wait()
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+COMPLIANCE_CACHE_PATH = os.getenv("COMPLIANCE_CACHE_PATH", "./cache/compliance_cache.sqlite3")
+# Significant digits numeric sensor values are rounded to before hashing, so
+# near-identical snapshots share an entry. Unset means exact matching.
+COMPLIANCE_CACHE_QUANTIZE = os.getenv("COMPLIANCE_CACHE_QUANTIZE")
+# Entries kept; the oldest are evicted first once the cache grows past this
+COMPLIANCE_CACHE_MAX_ENTRIES = int(os.getenv("COMPLIANCE_CACHE_MAX_ENTRIES", "10000"))
+
+# Writes between evictions, so a put does not pay for a table scan each time
+EVICT_EVERY = 100
+
+
+def _quantize(value: Any, digits: int) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(f"{value:.{digits}g}")
+    if isinstance(value, dict):
+        return {k: _quantize(v, digits) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_quantize(v, digits) for v in value]
+    return value
+
+
+def snapshot_key(sensor_data: Dict, index_version: str, quantize_digits: Optional[int] = None) -> str:
+    """Canonical hash of a (optionally quantized) sensor snapshot plus the index version."""
+    if quantize_digits is not None:
+        sensor_data = _quantize(sensor_data, quantize_digits)
+    canonical = json.dumps(sensor_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{index_version}\n{canonical}".encode()).hexdigest()
+
+
+class ComplianceCache:
+    """On-disk cache of compliance results keyed by sensor snapshot and index version.
+
+    Holds at most about `max_entries` results: every EVICT_EVERY writes the
+    oldest beyond the cap are deleted, whatever version they belong to.
+    """
+
+    def __init__(self, path: str = COMPLIANCE_CACHE_PATH, quantize_digits: Optional[int] = None,
+                 max_entries: int = COMPLIANCE_CACHE_MAX_ENTRIES):
+        if quantize_digits is None and COMPLIANCE_CACHE_QUANTIZE:
+            quantize_digits = int(COMPLIANCE_CACHE_QUANTIZE)
+        self.quantize_digits = quantize_digits
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS compliance_results (
+                key TEXT PRIMARY KEY,
+                index_version TEXT NOT NULL,
+                results TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS compliance_results_created_at ON compliance_results (created_at)"
+        )
+        self._evict()
+        self._conn.commit()
+
+    def key(self, sensor_data: Dict, index_version: str) -> str:
+        """Canonical hash of the (optionally quantized) snapshot plus the index version."""
+        return snapshot_key(sensor_data, index_version, self.quantize_digits)
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results FROM compliance_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[Dict]]:
+        """Results of every key found, in one query per 500 keys."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, results FROM compliance_results WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, json.loads(results)) for key, results in rows)
+            self.hits += sum(key in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+        return found
+
+    def put(self, key: str, index_version: str, results: List[Dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO compliance_results VALUES (?, ?, ?, ?)",
+                (key, index_version, json.dumps(results), time.time()),
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Delete the oldest entries beyond `max_entries`; the caller holds the lock (or is __init__) and commits."""
+        cursor = self._conn.execute(
+            "DELETE FROM compliance_results WHERE key IN ("
+            "SELECT key FROM compliance_results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self.evicted += cursor.rowcount
+
+    def purge(self, keep_version: str) -> int:
+        """Drop entries computed against any other index version.
+
+        Callers store "<index version>:<rule set version>", so only the part
+        before the colon is compared with `keep_version`.
+        """
+        prefix = f"{keep_version}:"
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM compliance_results WHERE index_version != ? AND substr(index_version, 1, ?) != ?",
+                (keep_version, len(prefix), prefix),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM compliance_results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "evicted": self.evicted,
+            "quantize_digits": self.quantize_digits,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
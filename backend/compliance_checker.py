@@ -6,132 +6,340 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
 from langchain_chroma.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
 import langgraph.graph as lg
-from langgraph.graph import END, StateGraph
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import Annotated, TypedDict
 from dotenv import load_dotenv
+from compliance_schema import parse_compliance_results
+from rule_engine import RuleEngine, get_rule_engine
+from hybrid_retrieval import HybridRetriever
+from observability import span
+import asyncio
+import contextlib
+import contextvars
 import logging
+import os
+import random
+import time
 
 load_dotenv()
 
+COMPLIANCE_MAX_ATTEMPTS = int(os.getenv("COMPLIANCE_MAX_ATTEMPTS", "3"))
+COMPLIANCE_RETRY_BACKOFF = float(os.getenv("COMPLIANCE_RETRY_BACKOFF", "0.5"))
+# Fused chunks whose best passages are packed into the compliance prompt
+COMPLIANCE_REGULATION_K = int(os.getenv("COMPLIANCE_REGULATION_K", "5"))
+
+
+# Model of the checks running in this context, when it differs from the checker's own
+_run_llm: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("compliance_llm", default=None)
+
+
+def _merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    return {**(left or {}), **(right or {})}
+
+
+class ComplianceState(TypedDict, total=False):
+    data: str
+    analysis: str
+    regulations: str
+    rule_results: List[Dict]
+    results: List[Dict]
+    # Parallel branches report into the same superstep, so timings are merged
+    timings: Annotated[Dict[str, float], _merge_timings]
+
+
+def _timed_node(name: str, output_key: str, func, afunc, *input_keys: str) -> RunnableLambda:
+    """Wrap a sync/async pair as a graph node that also records its wall time,
+    as a span so LLM calls inside are attributed to the node."""
+    def node(state: ComplianceState) -> ComplianceState:
+        started = time.perf_counter()
+        with span(f"compliance.{name}"):
+            output = func(*(state[key] for key in input_keys))
+        return {output_key: output, "timings": {name: time.perf_counter() - started}}
+
+    async def anode(state: ComplianceState) -> ComplianceState:
+        started = time.perf_counter()
+        with span(f"compliance.{name}"):
+            output = await afunc(*(state[key] for key in input_keys))
+        return {output_key: output, "timings": {name: time.perf_counter() - started}}
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+
 class ComplianceChecker:
-    def __init__(self, llm: ChatOpenAI, embeddings: OpenAIEmbeddings, retriever: Chroma, collection: Any):
+    def __init__(self, llm: ChatOpenAI, embeddings: Embeddings, retriever: Chroma, collection: Any,
+                 max_attempts: int = COMPLIANCE_MAX_ATTEMPTS, retry_backoff: float = COMPLIANCE_RETRY_BACKOFF,
+                 rule_engine: Optional[RuleEngine] = None, regulation_retriever: Optional[HybridRetriever] = None):
         self.llm = llm
         self.embeddings = embeddings
         self.retriever = retriever
         self.collection = collection
+        # Bounded retries for check_compliance, with exponential backoff between attempts
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        # Numeric checks settled locally; the LLM only covers what the rules cannot
+        self.rule_engine = rule_engine or get_rule_engine()
+        # Hybrid keyword + vector search packed into a token budget
+        self.regulation_retriever = regulation_retriever or HybridRetriever(retriever.vectorstore, collection)
         self.logger = logging.getLogger(__name__)
+        # Compiled once; per-run models come in through `using`, a reopened store through `use_store`
+        self.graph = self._build_graph()
+        # Same pipeline for callers that already retrieved the regulations, e.g. once per batch group
+        self.shared_regulations_graph = self._build_graph(retrieve=False)
+
+    @property
+    def model(self) -> Any:
+        """LLM of the current run: the one given to `using`, else the checker's own."""
+        return _run_llm.get() or self.llm
+
+    @contextlib.contextmanager
+    def using(self, llm: Optional[Any]):
+        """Run the checks started inside the block, including their graph nodes, with `llm`.
+
+        Without an `llm` the model in effect is kept.
+        """
+        if llm is None:
+            yield self
+            return
+        token = _run_llm.set(llm)
+        try:
+            yield self
+        finally:
+            _run_llm.reset(token)
+
+    def use_store(self, retriever: Any, collection: Any, regulation_retriever: HybridRetriever) -> None:
+        """Search a reopened vector store from now on, without recompiling the graphs."""
+        self.retriever = retriever
+        self.collection = collection
+        self.regulation_retriever = regulation_retriever
+
+    def _build_graph(self, retrieve: bool = True):
+        """analyze_data, retrieve_regulations and evaluate_rules only need the raw
+        data, so they run concurrently and are joined in check_compliance.
+        Without `retrieve`, the regulations are expected in the input state."""
+        graph = StateGraph(ComplianceState)
+        graph.add_node("analyze_data", _timed_node(
+            "analyze_data", "analysis", self.analyze_data, self.aanalyze_data, "data"))
+        if retrieve:
+            graph.add_node("retrieve_regulations", _timed_node(
+                "retrieve_regulations", "regulations", self.retrieve_regulations, self.aretrieve_regulations, "data"))
+        graph.add_node("evaluate_rules", _timed_node(
+            "evaluate_rules", "rule_results", self.evaluate_rules, self.aevaluate_rules, "data"))
+        graph.add_node("check_compliance", _timed_node(
+            "check_compliance", "results", self._check_with_retries, self._acheck_with_retries,
+            "analysis", "regulations", "rule_results"))
+
+        joined = ["analyze_data", "retrieve_regulations", "evaluate_rules"] if retrieve else ["analyze_data", "evaluate_rules"]
+        for node in joined:
+            graph.add_edge(START, node)
+        graph.add_edge(joined, "check_compliance")
+        graph.add_edge("check_compliance", END)
+        return graph.compile()
+
+    def _analysis_messages(self, data_json: str):
+        # If data is a list (multiple rows)
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a data analysis expert. Analyze the provided JSON data and provide insights about:
+            1. The structure of the data (tabular, nested, flat, etc.)
+            2. Key insights about the data
+            3. Factual interpretation of data, including what the data is measuring and what the data is trying to tell you
+            4. Implications of data and conclusions that can be drawn from the data
+            
+            Format your response as a simple string with clear sections for insights. No markdown, no formatting.
+            """),
+            ("user", "Please analyze this data:\n\n {data}")
+        ])
+
+        return prompt.format_messages(data=data_json)
 
     def analyze_data(self, data_json: str) -> str:
         """Analyze tabular data provided as JSON string."""
         self.logger.info(f"Analyzing data: {data_json}")
         try:
-            # If data is a list (multiple rows)
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are a data analysis expert. Analyze the provided JSON data and provide insights about:
-                1. The structure of the data (tabular, nested, flat, etc.)
-                2. Key insights about the data
-                3. Factual interpretation of data, including what the data is measuring and what the data is trying to tell you
-                4. Implications of data and conclusions that can be drawn from the data
-                
-                Format your response as a simple string with clear sections for insights. No markdown, no formatting.
-                """),
-                ("user", "Please analyze this data:\n\n {data}")
-            ])
-
-            messages = prompt.format_messages(data=data_json)
-
             # Get analysis from OpenAI
-            response = self.llm.invoke(messages)
+            response = self.model.invoke(self._analysis_messages(data_json))
+            
+            return response.content
+        except Exception as e:
+            return f"Error analyzing data: {str(e)}"
+
+    async def aanalyze_data(self, data_json: str) -> str:
+        """Async variant of analyze_data."""
+        self.logger.info(f"Analyzing data: {data_json}")
+        try:
+            response = await self.model.ainvoke(self._analysis_messages(data_json))
             
             return response.content
         except Exception as e:
             return f"Error analyzing data: {str(e)}"
     
 
-    def retrieve_regulations(self, tabular_data: str) -> str:
-        """Node to retrieve relevant regulations based on the query and data."""
-        # Generate a search query based on the data
+    def _query_messages(self, tabular_data: str):
         query_prompt = ChatPromptTemplate.from_messages([
             ("system", "Based on the tabular data, generate a search query to find relevant compliance regulations."),
             ("user", "Data: {tabular_data} \nGenerate a focused search query for compliance regulations in less than 15 words.")
         ])
 
-        messages = query_prompt.format_messages(tabular_data=tabular_data)
-        query = self.llm.invoke(messages).content
+        return query_prompt.format_messages(tabular_data=tabular_data)
+
+    def retrieve_regulations(self, tabular_data: str) -> str:
+        """Node to retrieve relevant regulations based on the query and data."""
+        # Generate a search query based on the data
+        query = self.model.invoke(self._query_messages(tabular_data)).content
         
         # Search regulations
         return self.search_regulations(query)
 
+    async def aretrieve_regulations(self, tabular_data: str) -> str:
+        """Async variant of retrieve_regulations."""
+        query = (await self.model.ainvoke(self._query_messages(tabular_data))).content
+
+        return await self.asearch_regulations(query)
+
 
     def search_regulations(self, query: str) -> str:
         """Search compliance regulations database with the given query."""
         self.logger.info(f"Searching for regulations with query: {query}")
-        results = self.retriever.vectorstore.similarity_search(query, k=3)
-        formatted_results = []
-        for i, doc in enumerate(results):
-            formatted_results.append(f"Document {i+1}:\n{doc.page_content}\n")
-        return "\n".join(formatted_results)
+        return self.regulation_retriever.search(query, k=COMPLIANCE_REGULATION_K)
+
+    async def asearch_regulations(self, query: str) -> str:
+        """Async variant of search_regulations."""
+        self.logger.info(f"Searching for regulations with query: {query}")
+        return await self.regulation_retriever.asearch(query, k=COMPLIANCE_REGULATION_K)
+
+
+    def evaluate_rules(self, data: str) -> List[Dict]:
+        """Settle the numeric checks encoded as rules, without an LLM call."""
+        return self.rule_engine.evaluate_snapshot(json.loads(data))
+
+    async def aevaluate_rules(self, data: str) -> List[Dict]:
+        # Microseconds of NumPy work, not worth a thread hop
+        return self.evaluate_rules(data)
+
+    @staticmethod
+    def _settled_checks(rule_results: Optional[List[Dict]]) -> str:
+        if not rule_results:
+            return "None"
+        return "\n".join(f"- {result['regulation']}: {result['status']}" for result in rule_results)
+
+    def _compliance_messages(self, data_analysis: str, regulations: str, rule_results: Optional[List[Dict]] = None):
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """
+            You are a compliance expert who forwarded a data analysis report along with a list of regulations. `Carefully study the data analysis and the list of regulations. Now, compare the data analysis with regulations to find compliance issues.
 
+            Your task:
+            1. Identify the regulations that are relevant to the data analysis.
+            2. Compare the data analysis with the relevant regulations to find compliance issues.
+            3. Provide a detailed report of the compliance issues, if any. The report should contain next_steps which are specific actionable steps to resolve the compliance issues. Refrain from providing general next steps.
 
-    def check_compliance(self, data_analysis: str, regulations: str) -> List[Dict]:
-        """Compare data analysis with regulations to find compliance issues."""
+            Format your response as a JSON response. No markdown, no formatting. The following is an example of the format you should follow:
+            [
+                    {{
+                        "regulation": "Regulation description",
+                        "compliance_issues": "Compliance issues",
+                        "status": "compliant",
+                        "next_steps": "Since your heating system is faulty, you should call a technician to fix it."
+                    }},
+                    {{
+                        "regulation": "Regulation description",
+                        "compliance_issues": "Compliance issues",
+                        "status": "non-Compliant",
+                        "next_steps": "Since your system is running since long without reset, make sure to reset it refularly to prevent breakdown of operation."
+                    }},
+                    {{
+                        "regulation": "Regulation description",
+                        "compliance_issues": "Compliance issues",
+                        "status": "compliant",
+                        "next_steps": "Since your system is running since long without reset, make sure to reset it refularly to prevent breakdown of operation."
+                    }}
+            ]
+            """),
+            ("user", "Please compare this data with regulations to find compliance issues:\n\n {data_analysis} \n\n {regulations}"
+                     "\n\nThese checks were already settled by deterministic rules. Do not report them again, only regulations they do not cover:\n{settled_checks}")
+        ])
+
+        return prompt.format_messages(
+            data_analysis=data_analysis, regulations=regulations, settled_checks=self._settled_checks(rule_results)
+        )
+
+    def check_compliance(self, data_analysis: str, regulations: str,
+                         rule_results: Optional[List[Dict]] = None) -> List[Dict]:
+        """Compare data analysis with regulations to find compliance issues.
+
+        Checks already in `rule_results` are excluded from the prompt and merged
+        in front of the model's findings. Raises ComplianceOutputError when the
+        output does not validate, even after repair.
+        """
         self.logger.info(f"Checking compliance with data analysis and regulations")
-        try:
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """
-                You are a compliance expert who forwarded a data analysis report along with a list of regulations. `Carefully study the data analysis and the list of regulations. Now, compare the data analysis with regulations to find compliance issues.
-
-                Your task:
-                1. Identify the regulations that are relevant to the data analysis.
-                2. Compare the data analysis with the relevant regulations to find compliance issues.
-                3. Provide a detailed report of the compliance issues, if any. The report should contain next_steps which are specific actionable steps to resolve the compliance issues. Refrain from providing general next steps.
-
-                Format your response as a JSON response. No markdown, no formatting. The following is an example of the format you should follow:
-                [
-                        {{
-                            "regulation": "Regulation description",
-                            "compliance_issues": "Compliance issues",
-                            "status": "compliant",
-                            "next_steps": "Since your heating system is faulty, you should call a technician to fix it."
-                        }},
-                        {{
-                            "regulation": "Regulation description",
-                            "compliance_issues": "Compliance issues",
-                            "status": "non-Compliant",
-                            "next_steps": "Since your system is running since long without reset, make sure to reset it refularly to prevent breakdown of operation."
-                        }},
-                        {{
-                            "regulation": "Regulation description",
-                            "compliance_issues": "Compliance issues",
-                            "status": "compliant",
-                            "next_steps": "Since your system is running since long without reset, make sure to reset it refularly to prevent breakdown of operation."
-                        }}
-                ]
-                """),
-                ("user", "Please compare this data with regulations to find compliance issues:\n\n {data_analysis} \n\n {regulations}")
-            ])
-
-            messages = prompt.format_messages(data_analysis=data_analysis, regulations=regulations)
-            response = self.llm.invoke(messages)
-            
-            return json.loads(response.content)
-        except Exception as e:
-            return 100
+        response = self.model.invoke(self._compliance_messages(data_analysis, regulations, rule_results))
         
+        return (rule_results or []) + parse_compliance_results(response.content)
 
-    def compliance_check(self, data: str):
-        analysis_results = self.analyze_data(data)
+    async def acheck_compliance(self, data_analysis: str, regulations: str,
+                                rule_results: Optional[List[Dict]] = None) -> List[Dict]:
+        """Async variant of check_compliance."""
+        self.logger.info(f"Checking compliance with data analysis and regulations")
+        response = await self.model.ainvoke(self._compliance_messages(data_analysis, regulations, rule_results))
+        
+        return (rule_results or []) + parse_compliance_results(response.content)
 
-        regulations = self.retrieve_regulations(data)
+    def _backoff(self, attempt: int) -> float:
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
 
-        compliance_results = self.check_compliance(analysis_results, regulations)
-        
-        while isinstance(compliance_results, int):
-            compliance_results = self.check_compliance(analysis_results, regulations)
+    def _check_with_retries(self, analysis_results: str, regulations: str, rule_results: List[Dict]) -> List[Dict]:
+        for attempt in range(self.max_attempts):
+            try:
+                return self.check_compliance(analysis_results, regulations, rule_results)
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                self.logger.warning(f"Compliance check attempt {attempt + 1}/{self.max_attempts} failed: {e}")
+                time.sleep(self._backoff(attempt))
 
-        return compliance_results
+    async def _acheck_with_retries(self, analysis_results: str, regulations: str,
+                                   rule_results: List[Dict]) -> List[Dict]:
+        for attempt in range(self.max_attempts):
+            try:
+                return await self.acheck_compliance(analysis_results, regulations, rule_results)
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                self.logger.warning(f"Compliance check attempt {attempt + 1}/{self.max_attempts} failed: {e}")
+                await asyncio.sleep(self._backoff(attempt))
 
+    def run(self, data: str, regulations: Optional[str] = None, llm: Optional[Any] = None) -> ComplianceState:
+        """Run the compliance graph and return its final state, including per-node timings.
 
-    
-    
\ No newline at end of file
+        Passing `regulations` skips the retrieval step and uses them instead;
+        passing `llm` uses that model for this run only.
+        """
+        started = time.perf_counter()
+        with self.using(llm):
+            if regulations is None:
+                state = self.graph.invoke({"data": data, "timings": {}})
+            else:
+                state = self.shared_regulations_graph.invoke(
+                    {"data": data, "regulations": regulations, "timings": {}})
+        state["timings"]["total"] = time.perf_counter() - started
+        return state
+
+    async def arun(self, data: str, regulations: Optional[str] = None, llm: Optional[Any] = None) -> ComplianceState:
+        """Async variant of run."""
+        started = time.perf_counter()
+        with self.using(llm):
+            if regulations is None:
+                state = await self.graph.ainvoke({"data": data, "timings": {}})
+            else:
+                state = await self.shared_regulations_graph.ainvoke(
+                    {"data": data, "regulations": regulations, "timings": {}})
+        state["timings"]["total"] = time.perf_counter() - started
+        return state
+
+    def compliance_check(self, data: str):
+        return self.run(data)["results"]
+
+    async def acompliance_check(self, data: str):
+        """Async variant of compliance_check that never blocks the event loop."""
+        return (await self.arun(data))["results"]
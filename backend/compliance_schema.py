@@ -0,0 +1,104 @@
+import json
+import re
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
+
+COMPLIANCE_STATUSES = ("compliant", "non-compliant", "in-progress")
+
+
+class ComplianceOutputError(ValueError):
+    """The model's compliance output could not be parsed or validated."""
+
+
+class ComplianceResult(BaseModel):
+    regulation: str
+    compliance_issues: str
+    status: str
+    next_steps: str
+
+    @field_validator("status")
+    @classmethod
+    def normalize_status(cls, value: str) -> str:
+        status = value.strip().lower().replace(" ", "-").replace("_", "-")
+        if status == "noncompliant":
+            status = "non-compliant"
+        if status not in COMPLIANCE_STATUSES:
+            raise ValueError(f"status must be one of {COMPLIANCE_STATUSES}, got {value!r}")
+        return status
+
+
+_results_adapter = TypeAdapter(List[ComplianceResult])
+
+_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+
+
+def _cut_to_last_complete_item(text: str) -> str:
+    """Drop a truncated trailing element from a top-level JSON array and close it."""
+    depth = 0
+    in_string = False
+    escaped = False
+    last_complete = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 1:
+                last_complete = i + 1
+            elif depth == 0:
+                return text[:i + 1]
+    if last_complete is None:
+        return text
+    return text[:last_complete] + "]"
+
+
+def _repair(text: str) -> str:
+    """Cheap, local fixes for the usual ways a model mangles JSON."""
+    text = text.strip()
+    fenced = _FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if starts:
+        text = text[min(starts):]
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    if text.startswith("["):
+        text = _cut_to_last_complete_item(text)
+    return text
+
+
+def _as_list(payload: Any) -> Any:
+    if isinstance(payload, dict):
+        lists = [value for value in payload.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+        return [payload]
+    return payload
+
+
+def parse_compliance_results(text: str) -> List[Dict]:
+    """Parse and validate the regulation/compliance_issues/status/next_steps list.
+
+    Tries the raw text first, then a repaired version, before giving up with a
+    ComplianceOutputError so the caller can decide whether to pay for a retry.
+    """
+    last_error: Exception = ComplianceOutputError("empty response")
+    for candidate in (text, _repair(text)):
+        try:
+            results = _results_adapter.validate_python(_as_list(json.loads(candidate)))
+            return [result.model_dump() for result in results]
+        except (json.JSONDecodeError, ValidationError) as e:
+            last_error = e
+    raise ComplianceOutputError(str(last_error))
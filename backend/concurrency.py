@@ -0,0 +1,35 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from observability import QUEUE_WAIT
+
+# Blocking work (PDF parsing, Chroma calls without an async API, sync LLM
+# helpers) runs on this pool so it never stalls the event loop.
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the bounded executor and await its result.
+
+    The caller's context, and with it the current span, carries over to the
+    worker thread; the time spent waiting for a free worker is recorded.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def call():
+        QUEUE_WAIT.observe(time.perf_counter() - submitted, queue="blocking")
+        return context.run(func, *args, **kwargs)
+
+    return await loop.run_in_executor(_executor, call)
+
+
+def shutdown_executor() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
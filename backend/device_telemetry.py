@@ -0,0 +1,324 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from telemetry_rollup import ROLLUP_COLUMNS, ROLLUP_TIERS, RollupTier, pick_tier, raw_series, rollup_series
+from telemetry_store import HVAC_COLUMNS, hvac_metrics_payload
+
+# Readings kept per device; older ones are overwritten in place
+TELEMETRY_RETENTION = int(os.getenv("TELEMETRY_RETENTION", "8640"))
+# Upper bound on distinct devices, so memory stays fixed at devices x retention. Each device
+# takes about 2.8 MB at the default retention (raw ring plus rollups), in every worker
+TELEMETRY_MAX_DEVICES = int(os.getenv("TELEMETRY_MAX_DEVICES", "100"))
+
+# Pushed measurements are kept as sent: flags as bools, every other column as
+# float64, even those the CSV replay stores as integers
+DEVICE_COLUMNS = {name: np.bool_ if dtype is np.bool_ else np.float64 for name, dtype in HVAC_COLUMNS.items()}
+
+
+class TelemetryIngestError(ValueError):
+    """A reading or batch that cannot be stored."""
+
+
+def _timestamp(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    raise TelemetryIngestError(f"Invalid timestamp {value!r}")
+
+
+def flatten_reading(reading: Mapping) -> Dict:
+    """Flat column -> value mapping of a reading.
+
+    Accepts the flat CSV column layout as well as the nested HVAC_Metrics
+    payload served by /hvac-metrics; unknown keys are ignored.
+    """
+    if HVAC_COLUMNS.keys() <= reading.keys():
+        # Already flat, the common case for pushed readings
+        return reading
+    flat = {}
+    stack = [reading]
+    while stack:
+        node = stack.pop()
+        for key, value in node.items():
+            if isinstance(value, Mapping):
+                stack.append(value)
+            elif key in HVAC_COLUMNS or key == "timestamp":
+                flat[key] = value
+    missing = [name for name in HVAC_COLUMNS if name not in flat]
+    if missing:
+        raise TelemetryIngestError(f"Reading is missing {', '.join(missing)}")
+    return flat
+
+
+def _is_flag(value) -> bool:
+    return isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _column_values(flat: List[Mapping]) -> Dict[str, np.ndarray]:
+    """One DEVICE_COLUMNS array per column of flat readings.
+
+    Values are checked rather than cast, so "False" is not taken for a true
+    flag nor 12.7 truncated: flags must be JSON booleans and measurements
+    JSON numbers.
+    """
+    values = {}
+    for name, dtype in DEVICE_COLUMNS.items():
+        column = [r[name] for r in flat]
+        valid, expected = (_is_flag, "true or false") if dtype is np.bool_ else (_is_number, "a number")
+        for value in column:
+            if not valid(value):
+                raise TelemetryIngestError(f"{name} must be {expected}, got {value!r}")
+        values[name] = np.asarray(column, dtype=dtype)
+    return values
+
+
+def parse_readings(body: bytes, content_type: str) -> Tuple[List, Optional[str]]:
+    """Readings and default device of an ingest body.
+
+    NDJSON bodies carry one reading per line. JSON bodies are either
+    {"device_id": ..., "readings": [...]}, a list of readings or a single one.
+    """
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            return [json.loads(line) for line in body.splitlines() if line.strip()], None
+        payload = json.loads(body)
+    except ValueError as e:
+        raise TelemetryIngestError(f"Malformed JSON: {e}") from e
+    if isinstance(payload, list):
+        return payload, None
+    if isinstance(payload, dict) and "readings" in payload:
+        if not isinstance(payload["readings"], list):
+            raise TelemetryIngestError("readings must be a list")
+        return payload["readings"], payload.get("device_id")
+    return [payload], None
+
+
+def prepare_batch(readings: List[Mapping]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Timestamps and DEVICE_COLUMNS arrays of readings, raising on the first invalid one."""
+    flat = [flatten_reading(reading) for reading in readings]
+    timestamps = np.fromiter((_timestamp(r.get("timestamp")) for r in flat), dtype=np.float64, count=len(flat))
+    return timestamps, _column_values(flat)
+
+
+class DeviceRingBuffer:
+    """Fixed-capacity columnar time series for one device.
+
+    One preallocated array per HVAC column plus a timestamp array. Appends
+    write at the head and wrap around, so memory never grows and both append
+    and latest-reading lookup are O(1). Every reading is also folded into the
+    minute/hour/day rollups, which outlive the raw retention.
+    """
+
+    def __init__(self, capacity: int = TELEMETRY_RETENTION):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in DEVICE_COLUMNS.items()}
+        self.head = 0  # next slot to write
+        self.size = 0
+        self.total = 0  # readings ever appended
+        self.rollups = {name: RollupTier(seconds, size) for name, (seconds, size) in ROLLUP_TIERS.items()}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, reading: Mapping) -> None:
+        flat = flatten_reading(reading)
+        timestamp = _timestamp(flat.get("timestamp"))
+        values = _column_values([flat])
+        vector = np.array([values[name][0] for name in ROLLUP_COLUMNS], dtype=np.float64)
+        with self._lock:
+            slot = self.head
+            self.timestamps[slot] = timestamp
+            for name, array in self.columns.items():
+                array[slot] = values[name][0]
+            self.head = (slot + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.total += 1
+            for tier in self.rollups.values():
+                tier.add(timestamp, vector)
+
+    def append_many(self, readings: List[Mapping]) -> int:
+        """Append a batch with one vectorized write per column."""
+        if not readings:
+            return 0
+        return self.write(prepare_batch(readings))
+
+    def write(self, batch: Tuple[np.ndarray, Dict[str, np.ndarray]]) -> int:
+        """Append a batch already checked by `prepare_batch`."""
+        timestamps, values = batch
+        matrix = np.column_stack([values[name].astype(np.float64) for name in ROLLUP_COLUMNS])
+        # Only the newest `capacity` readings of an oversized batch survive in the raw ring
+        kept = slice(-self.capacity, None)
+
+        with self._lock:
+            slots = (self.head + np.arange(len(timestamps[kept]))) % self.capacity
+            self.timestamps[slots] = timestamps[kept]
+            for name, array in self.columns.items():
+                array[slots] = values[name][kept]
+            self.head = (self.head + len(slots)) % self.capacity
+            self.size = min(self.size + len(slots), self.capacity)
+            self.total += len(timestamps)
+            for tier in self.rollups.values():
+                tier.add_many(timestamps, matrix)
+        return len(timestamps)
+
+    def _slot(self, index: int) -> int:
+        """Ring slot of the index-th retained reading, 0 being the oldest."""
+        return (self.head - self.size + index) % self.capacity
+
+    def reading(self, index: int) -> Tuple[float, dict]:
+        with self._lock:
+            if index < 0 or index >= self.size:
+                raise IndexError(index)
+            slot = self._slot(index)
+            return float(self.timestamps[slot]), hvac_metrics_payload(self.columns, slot)
+
+    def latest(self) -> Optional[Tuple[float, dict]]:
+        with self._lock:
+            if not self.size:
+                return None
+            slot = (self.head - 1) % self.capacity
+            return float(self.timestamps[slot]), hvac_metrics_payload(self.columns, slot)
+
+    def _ordered(self, names: Iterable[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        order = self._slot(0) + np.arange(self.size)
+        order %= self.capacity
+        return self.timestamps[order], {name: self.columns[name][order] for name in names}
+
+    def snapshot(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Oldest-first copies of the timestamps and every column."""
+        with self._lock:
+            return self._ordered(self.columns)
+
+    def range(self, start: float, end: float, names: List[str], points: int, method: str = "lttb",
+              tier: str = "auto") -> Dict:
+        """Series of `names` between two timestamps, reduced to about `points` points.
+
+        `tier` is "raw", a rollup tier name or "auto", which picks the finest
+        source that still holds `start` within the source budget. Raw samples
+        are downsampled with `method`; rollups return the bucket mean with its
+        min/max envelope.
+        """
+        with self._lock:
+            if tier == "auto":
+                # While slots 0..size-1 fill up they hold every reading, after that all slots do
+                tier = pick_tier(self.rollups, self.timestamps[:self.size], self.total > self.size, start, end)
+            if tier == "raw":
+                timestamps, columns = self._ordered(names)
+            else:
+                buckets = self.rollups[tier].range(start, end)
+
+        if tier != "raw":
+            return {"tier": tier, "series": rollup_series(buckets, names, points)}
+        selected = (timestamps >= start) & (timestamps <= end)
+        timestamps = timestamps[selected]
+        order = np.argsort(timestamps, kind="stable")  # late readings arrive out of order
+        columns = {name: values[selected][order] for name, values in columns.items()}
+        return {"tier": "raw", "series": raw_series(timestamps[order], columns, names, points, method)}
+
+
+class DeviceTelemetry:
+    """Ring buffers of pushed readings, one per device."""
+
+    def __init__(self, retention: int = TELEMETRY_RETENTION, max_devices: int = TELEMETRY_MAX_DEVICES):
+        self.retention = retention
+        self.max_devices = max_devices
+        self._buffers: Dict[str, DeviceRingBuffer] = {}
+        self._lock = threading.Lock()
+        self._last_device: Optional[str] = None
+
+    def buffer(self, device_id: str, create: bool = False) -> Optional[DeviceRingBuffer]:
+        buffer = self._buffers.get(device_id)
+        if buffer is None and create:
+            buffer = self._create([device_id])[device_id]
+        return buffer
+
+    def _create(self, device_ids: List[str]) -> Dict[str, DeviceRingBuffer]:
+        """Buffers of `device_ids`, creating the missing ones only if all of them fit."""
+        with self._lock:
+            missing = [device_id for device_id in device_ids if device_id not in self._buffers]
+            if len(self._buffers) + len(missing) > self.max_devices:
+                raise TelemetryIngestError(f"Device limit of {self.max_devices} reached")
+            for device_id in missing:
+                self._buffers[device_id] = DeviceRingBuffer(self.retention)
+            return {device_id: self._buffers[device_id] for device_id in device_ids}
+
+    def ingest(self, readings: Iterable[Mapping], default_device: Optional[str] = None) -> Dict[str, int]:
+        """Store readings, grouped by their `device_id` (or `default_device`).
+
+        The whole batch is checked before anything is stored, so a rejected
+        batch leaves every device untouched. Returns the number of readings
+        accepted per device.
+        """
+        grouped: Dict[str, List[Mapping]] = {}
+        for reading in readings:
+            if not isinstance(reading, Mapping):
+                raise TelemetryIngestError("Each reading must be a JSON object")
+            device_id = reading.get("device_id", default_device)
+            if not device_id:
+                raise TelemetryIngestError("Reading has no device_id")
+            grouped.setdefault(str(device_id), []).append(reading)
+
+        prepared = {device_id: prepare_batch(batch) for device_id, batch in grouped.items()}
+        buffers = self._create(list(prepared))
+        accepted = {}
+        for device_id, batch in prepared.items():
+            accepted[device_id] = buffers[device_id].write(batch)
+            self._last_device = device_id
+        return accepted
+
+    def latest(self, device_id: Optional[str] = None) -> Optional[Tuple[str, float, dict]]:
+        """(device_id, timestamp, HVAC_Metrics payload) of the newest reading.
+
+        Without a device_id, the device that reported most recently is used.
+        """
+        device_id = device_id or self._last_device
+        buffer = self._buffers.get(device_id) if device_id else None
+        latest = buffer.latest() if buffer is not None else None
+        if latest is None:
+            return None
+        return (device_id, *latest)
+
+    def devices(self) -> List[Dict]:
+        devices = []
+        for device_id, buffer in list(self._buffers.items()):
+            latest = buffer.latest()
+            devices.append({
+                "device_id": device_id,
+                "readings": len(buffer),
+                "total_readings": buffer.total,
+                "latest_timestamp": latest[0] if latest else None,
+            })
+        return devices
+
+
+_device_telemetry: Optional[DeviceTelemetry] = None
+_device_telemetry_lock = threading.Lock()
+
+
+def get_device_telemetry() -> DeviceTelemetry:
+    """Shared per-device telemetry, created on first use."""
+    global _device_telemetry
+    with _device_telemetry_lock:
+        if _device_telemetry is None:
+            _device_telemetry = DeviceTelemetry()
+        return _device_telemetry
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from observability import span
+
+# "openai" or "local" (sentence-transformers on CPU). Switching backends changes
+# the vector space, so the Chroma collection has to be re-indexed afterwards.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run in batched CPU inference."""
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-memory LRU in front of a SQLite store.
+
+    Entries are keyed by a hash of the model namespace, the kind (document or
+    query) and the text, so a vector is computed at most once per model.
+    """
+
+    def __init__(self, underlying: Embeddings, namespace: str, path: str = EMBEDDING_CACHE_PATH,
+                 max_size: int = EMBEDDING_CACHE_SIZE):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{text}".encode()).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            missing = [key for key in keys if key not in found]
+            # SQLite caps bound parameters, so look up in slices
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+        return found
+
+    def _store(self, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        with span("embedding", kind=kind, texts=len(texts)) as embedding_span:
+            keys = [self._key(kind, text) for text in texts]
+            found = self._lookup(keys)
+            # Compute each distinct missing text once, in a single batch
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found:
+                    missing.setdefault(key, text)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            embedding_span.set(computed=len(missing))
+
+            if missing:
+                if kind == "query":
+                    computed = [self.underlying.embed_query(text) for text in missing.values()]
+                else:
+                    computed = self.underlying.embed_documents(list(missing.values()))
+                new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, computed)}
+                self._store(new)
+                found.update(new)
+            return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """Shared, cached embedding backend selected by EMBEDDING_BACKEND."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            if EMBEDDING_BACKEND == "local":
+                underlying = LocalEmbeddings()
+                namespace = f"local:{underlying.model_name}"
+            elif EMBEDDING_BACKEND == "openai":
+                from langchain_openai import OpenAIEmbeddings
+
+                underlying = OpenAIEmbeddings()
+                namespace = f"openai:{underlying.model}"
+            else:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND!r}")
+            _embeddings = CachedEmbeddings(underlying, namespace)
+        return _embeddings
@@ -0,0 +1,282 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from concurrency import run_blocking
+from index_version import current_index_version
+from observability import span
+from tokens import count_tokens, truncate_to_tokens
+
+# Candidates taken from each of the vector and keyword searches before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Tokens of regulation text packed into a prompt
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500"))
+# Characters per passage the packer selects from (chunks themselves are ~8000)
+RETRIEVAL_PASSAGE_CHARS = int(os.getenv("RETRIEVAL_PASSAGE_CHARS", "600"))
+# CPU cross-encoder for passage reranking, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2; empty disables it
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words, and clause/standard numbers such as 4.2.1, EN-14511 or 2010/31
+_TERM = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def _stem(term: str) -> str:
+    # Plural folding only ("readings" -> "reading"), enough for regulation text
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss") and term.isalpha():
+        return term[:-1]
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, plural-folded terms; compound terms are also indexed by their parts."""
+    terms = []
+    for term in _TERM.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        terms.append(_stem(term))
+        if not term.isalnum():
+            terms.extend(part for part in re.split(r"[./\-]", term) if part and part not in _STOPWORDS)
+    return terms
+
+
+def _doc_key(doc: Document) -> str:
+    return getattr(doc, "id", None) or hashlib.sha256(doc.page_content.encode()).hexdigest()
+
+
+class KeywordIndex:
+    """In-memory BM25 inverted index over the indexed chunks."""
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Optional[dict]]):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = [metadata or {} for metadata in metadatas]
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(len(self.texts))
+        for i, text in enumerate(self.texts):
+            terms = Counter(tokenize(text))
+            lengths[i] = sum(terms.values())
+            for term, tf in terms.items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(i)
+                tfs.append(tf)
+
+        n = len(self.texts)
+        average = lengths.mean() if n else 1.0
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (average or 1.0))
+        self.idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, (docs, _) in postings.items()}
+        self.postings = {
+            term: (np.asarray(docs, dtype=np.int64), np.asarray(tfs, dtype=np.float64))
+            for term, (docs, tfs) in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """(document index, BM25 score) of the best k matches."""
+        scores = np.zeros(len(self.texts))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            scores[docs] += self.idf[term] * tfs * (BM25_K1 + 1) / (tfs + self._norm[docs])
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=self.metadatas[i], id=self.ids[i])
+
+    def passage_score(self, query_terms: set, text: str) -> float:
+        """Sum of the idf of the query terms a passage contains."""
+        return sum(self.idf.get(term, 0.0) for term in query_terms.intersection(tokenize(text)))
+
+
+class CrossEncoderReranker:
+    """sentence-transformers cross-encoder scoring (query, passage) pairs on CPU."""
+
+    def __init__(self, model_name: str = RERANKER_MODEL):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        return self.model.predict([(query, passage) for passage in passages]).tolist()
+
+
+def split_passages(text: str, max_chars: int = RETRIEVAL_PASSAGE_CHARS) -> List[str]:
+    """Paragraph-aligned passages of at most max_chars characters."""
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n|\n(?=\s*(?:\d+(?:\.\d+)*|[A-Z][A-Z ]{3,})\b)", text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            passages.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+class HybridRetriever:
+    """Regulation search combining vector similarity with BM25 keyword matches.
+
+    Both result lists are fused with reciprocal rank fusion, so exact clause
+    numbers and terms found by the keyword index are not lost to the
+    embedding. The fused chunks are cut into passages, ranked (by the
+    cross-encoder when RERANKER_MODEL is set, otherwise by query-term idf)
+    and packed into a token budget instead of pasting whole chunks.
+    """
+
+    def __init__(self, vectorstore: Any, collection: Any = None, candidates: int = RETRIEVAL_CANDIDATES,
+                 token_budget: int = RETRIEVAL_TOKEN_BUDGET, reranker_model: str = RERANKER_MODEL):
+        self.vectorstore = vectorstore
+        self.collection = collection
+        self.candidates = candidates
+        self.token_budget = token_budget
+        self.reranker_model = reranker_model
+        self._reranker: Optional[CrossEncoderReranker] = None
+        self._index: Optional[KeywordIndex] = None
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def keyword_index(self) -> KeywordIndex:
+        """BM25 index of the collection, rebuilt when the index version changes."""
+        version = current_index_version()
+        if self._index is None or self._index_version != version:
+            with self._lock:
+                if self._index is None or self._index_version != version:
+                    if self.collection is None:
+                        self._index = KeywordIndex([], [], [])
+                    else:
+                        docs = self.collection.get(include=["documents", "metadatas"])
+                        self._index = KeywordIndex(docs["ids"], docs["documents"], docs["metadatas"])
+                    self._index_version = version
+        return self._index
+
+    def reranker(self) -> Optional[CrossEncoderReranker]:
+        if self.reranker_model and self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    self._reranker = CrossEncoderReranker(self.reranker_model)
+        return self._reranker
+
+    def _fuse(self, query: str, vector_docs: List[Document], k: int) -> List[Document]:
+        with span("keyword_search"):
+            index = self.keyword_index()
+            keyword_docs = [index.document(i) for i, _ in index.search(query, self.candidates)]
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranking in (vector_docs, keyword_docs):
+            for rank, doc in enumerate(ranking):
+                key = _doc_key(doc)
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ordered = sorted(scores, key=scores.get, reverse=True)
+        return [docs[key] for key in ordered[:k]]
+
+    def retrieve(self, query: str, k: int = 5) -> List[Document]:
+        """Top k chunks by reciprocal rank fusion of vector and keyword results."""
+        with span("vector_search"):
+            vector_docs = self.vectorstore.similarity_search(query, k=self.candidates)
+        return self._fuse(query, vector_docs, k)
+
+    async def aretrieve(self, query: str, k: int = 5) -> List[Document]:
+        with span("vector_search"):
+            vector_docs = await self.vectorstore.asimilarity_search(query, k=self.candidates)
+        return await run_blocking(self._fuse, query, vector_docs, k)
+
+    def pack(self, query: str, docs: List[Document], token_budget: Optional[int] = None) -> str:
+        """Best passages of the retrieved chunks within the token budget,
+        grouped back by document and kept in reading order."""
+        with span("context_packing"):
+            return self._pack(query, docs, self.token_budget if token_budget is None else token_budget)
+
+    def _pack(self, query: str, docs: List[Document], budget: int) -> str:
+        passages = [(d, p, text) for d, doc in enumerate(docs) for p, text in enumerate(split_passages(doc.page_content))]
+        if not passages:
+            return ""
+
+        reranker = self.reranker()
+        if reranker is not None:
+            scores = reranker.score(query, [text for _, _, text in passages])
+        else:
+            index, terms = self.keyword_index(), set(tokenize(query))
+            scores = [index.passage_score(terms, text) for _, _, text in passages]
+        # Ties (e.g. no term overlap) keep the fused document order
+        ranked = sorted(range(len(passages)), key=lambda i: (-scores[i], passages[i][0], passages[i][1]))
+
+        labels = [self._label(doc) for doc in docs]
+        selected, used, opened = [], 0, set()
+        for i in ranked:
+            d, p, text = passages[i]
+            # The document header counts against the budget with its first passage
+            tokens = count_tokens(text) + (0 if d in opened else count_tokens(labels[d]))
+            if used + tokens > budget:
+                if not selected:
+                    # The best passage alone is over budget: keep its head, which then fills the budget
+                    label_tokens = count_tokens(labels[d])
+                    text = truncate_to_tokens(text, budget - label_tokens)
+                    selected.append((d, p, text))
+                    opened.add(d)
+                    used = count_tokens(text) + label_tokens
+                continue
+            selected.append((d, p, text))
+            opened.add(d)
+            used += tokens
+
+        by_document: Dict[int, List[Tuple[int, str]]] = {}
+        for d, p, text in selected:
+            by_document.setdefault(d, []).append((p, text))
+        formatted = []
+        for n, d in enumerate(sorted(by_document), start=1):
+            body = "\n[...]\n".join(text for _, text in sorted(by_document[d]))
+            formatted.append(f"Document {n} {labels[d]}\n{body}\n")
+        return "\n".join(formatted)
+
+    @staticmethod
+    def _label(doc: Document) -> str:
+        metadata = doc.metadata or {}
+        label = os.path.basename(str(metadata.get("source", "unknown")))
+        if "page" in metadata:
+            page, page_end = metadata["page"], metadata.get("page_end", metadata["page"])
+            label += f", page {page}" if page_end == page else f", pages {page}-{page_end}"
+        section = str(metadata.get("section") or "")
+        if section:
+            label += f", section {section}" if section[0].isdigit() else f", {section}"
+        return f"({label}):"
+
+    def search(self, query: str, k: int = 5, token_budget: Optional[int] = None) -> str:
+        return self.pack(query, self.retrieve(query, k), token_budget)
+
+    async def asearch(self, query: str, k: int = 5, token_budget: Optional[int] = None) -> str:
+        docs = await self.aretrieve(query, k)
+        return await run_blocking(self.pack, query, docs, token_budget)
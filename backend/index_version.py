@@ -0,0 +1,71 @@
+import fcntl
+import os
+import uuid
+
+# Directory of the persistent Chroma collection and its version stamp
+CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
+INDEX_VERSION_FILE = os.path.join(CHROMA_DIR, "index_version")
+WRITER_LOCK_FILE = os.path.join(CHROMA_DIR, "writer.lock")
+# Seconds between checks for index changes made by another worker process
+INDEX_VERSION_POLL = float(os.getenv("INDEX_VERSION_POLL", "1.0"))
+
+
+def current_index_version() -> str:
+    """Version stamp of the Chroma collection, changed on every upload or delete."""
+    try:
+        with open(INDEX_VERSION_FILE) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_index_version() -> str:
+    """Record that the indexed documents changed and return the new stamp."""
+    os.makedirs(CHROMA_DIR, exist_ok=True)
+    version = uuid.uuid4().hex
+    tmp_path = f"{INDEX_VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    # Atomic rename so readers never see a half-written stamp
+    os.replace(tmp_path, INDEX_VERSION_FILE)
+    return version
+
+
+class IndexWriterLock:
+    """Inter-process lock electing the one worker that writes the Chroma index.
+
+    Embedded Chroma has no coordination between processes, so with several
+    workers only the holder of this lock ingests or deletes documents. The
+    lock is an flock held for the life of the process; the OS releases it
+    when the holder exits, and another worker can then take over.
+    """
+
+    def __init__(self, path: str = WRITER_LOCK_FILE):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if no other process holds it, without blocking."""
+        if self._fd is not None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
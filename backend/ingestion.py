@@ -0,0 +1,381 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from chunking import StructuredChunker
+
+# Where uploaded PDFs are saved before extraction
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+# Upper bound on estimated tokens sent to the embedding model per add_texts call
+INGEST_EMBED_TOKEN_BUDGET = int(os.getenv("INGEST_EMBED_TOKEN_BUDGET", "50000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+# Fewest pages handed to one extraction task, each task opens and parses the PDF once
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+# SQLite queue of ingestion jobs, shared by every worker process of the app
+INGEST_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "./cache/ingestion_jobs.sqlite3")
+# Finished jobs are kept this long (seconds) so clients can read their final status
+INGEST_JOB_TTL = 3600
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text, good enough for batching
+    return len(text) // 4 + 1
+
+
+def _page_count(file_path: str) -> int:
+    with open(file_path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def _extract_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) of a PDF. Runs in a worker process."""
+    with open(file_path, "rb") as f:
+        pdf = PdfReader(f)
+        return [pdf.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    files: List[str]
+    # "index" adds `files` to the collection, "delete" empties it
+    kind: str = "index"
+    status: str = "queued"
+    files_done: int = 0
+    files_skipped: int = 0
+    chunks_total: int = 0
+    chunks_indexed: int = 0
+    chunks_skipped: int = 0
+    chunks_deleted: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = asdict(self)
+        job["job_id"] = job.pop("id")
+        job["files_total"] = len(self.files)
+        return job
+
+
+class IngestionJobStore:
+    """Ingestion jobs kept in SQLite so every worker process sees the same queue.
+
+    Any worker queues jobs and reports their progress; only the one holding
+    the index writer lock claims and runs them. The store also records which
+    files were indexed completely, by content hash.
+    """
+
+    def __init__(self, path: str = INGEST_JOBS_PATH):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                job TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS indexed_files (
+                file_hash TEXT PRIMARY KEY,
+                indexed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def save(self, job: IngestionJob) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingestion_jobs VALUES (?, ?, ?, ?, ?)",
+                (job.id, job.status, job.created_at, job.finished_at, json.dumps(asdict(job))),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else IngestionJob(**json.loads(row[0]))
+
+    def claim(self) -> Optional[IngestionJob]:
+        """Oldest queued job, marked running, or None when the queue is empty."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job FROM ingestion_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job = IngestionJob(**json.loads(row[0]))
+            job.status = "running"
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET status = ?, job = ? WHERE id = ?",
+                (job.status, json.dumps(asdict(job)), job.id),
+            )
+            self._conn.commit()
+        return job
+
+    def fail_running(self, error: str) -> int:
+        """Fail the jobs left running by a writer that exited mid-job; their files can be uploaded again."""
+        with self._lock:
+            rows = self._conn.execute("SELECT job FROM ingestion_jobs WHERE status = 'running'").fetchall()
+            now = time.time()
+            for (data,) in rows:
+                job = IngestionJob(**json.loads(data))
+                job.status, job.error, job.finished_at = "failed", error, now
+                self._conn.execute(
+                    "UPDATE ingestion_jobs SET status = ?, finished_at = ?, job = ? WHERE id = ?",
+                    (job.status, job.finished_at, json.dumps(asdict(job)), job.id),
+                )
+            self._conn.commit()
+        return len(rows)
+
+    def mark_indexed(self, file_hashes: List[str]) -> None:
+        """Record files whose every chunk is in the collection."""
+        if not file_hashes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO indexed_files VALUES (?, ?)", [(file_hash, now) for file_hash in file_hashes]
+            )
+            self._conn.commit()
+
+    def is_indexed(self, file_hash: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM indexed_files WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row is not None
+
+    def clear_indexed(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM indexed_files")
+            self._conn.commit()
+
+    def prune(self, ttl: float = INGEST_JOB_TTL) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ingestion_jobs WHERE finished_at < ?", (time.time() - ttl,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionPipeline:
+    """Background PDF ingestion with file/chunk de-duplication and batched embedding.
+
+    Files are identified by content hash and chunks by text hash (used as the
+    Chroma id), so re-uploading a PDF or overlapping content never pays for
+    embedding twice. Chunks from all files in a job are embedded together in
+    batches capped at `token_budget` estimated tokens. Jobs are queued in an
+    IngestionJobStore and run by whichever worker is the index writer.
+    """
+
+    def __init__(self, vectorstore: Any, on_indexed: Optional[Callable[[], None]] = None,
+                 upload_dir: str = UPLOAD_DIR, token_budget: int = INGEST_EMBED_TOKEN_BUDGET,
+                 workers: int = INGEST_WORKERS, write_lock: Optional[threading.Lock] = None,
+                 jobs_path: str = INGEST_JOBS_PATH):
+        self.vectorstore = vectorstore
+        self.on_indexed = on_indexed
+        self.upload_dir = upload_dir
+        self.token_budget = token_budget
+        self.chunker = StructuredChunker()
+        self.jobs = IngestionJobStore(jobs_path)
+        self.logger = logging.getLogger(__name__)
+        self._workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Shared with every other writer of the collection
+        self._write_lock = write_lock or threading.Lock()
+
+    @property
+    def collection(self):
+        return self.vectorstore._collection
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._workers)
+        return self._pool
+
+    def save_uploads(self, files: List[Tuple[str, bytes]]) -> IngestionJob:
+        """Write uploaded files to disk and register a queued job for them.
+
+        Each job gets a directory of its own, so uploads sharing a filename
+        never overwrite each other before their jobs have read them.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.upload_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        saved_files = []
+        for filename, content in files:
+            file_path = os.path.join(job_dir, os.path.basename(filename))
+            with open(file_path, "wb") as buffer:
+                buffer.write(content)
+            saved_files.append(file_path)
+
+        return self._queue(IngestionJob(id=job_id, files=saved_files))
+
+    def _source(self, file_path: str) -> str:
+        """`source` metadata of an uploaded file: its name under the upload directory, without the job directory."""
+        return os.path.join(self.upload_dir, os.path.basename(file_path))
+
+    def queue_delete(self) -> IngestionJob:
+        """Register a queued job removing every document from the collection."""
+        return self._queue(IngestionJob(id=uuid.uuid4().hex, files=[], kind="delete"))
+
+    def _queue(self, job: IngestionJob) -> IngestionJob:
+        self.jobs.prune()
+        self.jobs.save(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def claim(self) -> Optional[IngestionJob]:
+        """Next queued job to run; only the index writer may call this."""
+        return self.jobs.claim()
+
+    def _file_indexed(self, file_hash: str) -> bool:
+        """Whether the file was indexed to the end; a file cut short by a failed job is not.
+
+        Re-running such a file only embeds the chunks that are missing, the
+        others are found by id in _flush.
+        """
+        return self.jobs.is_indexed(file_hash)
+
+    def _pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """(1-based page number, text) of every page, in order.
+
+        Page ranges are extracted in parallel by the process pool, one range
+        per worker plus one queued ahead in flight, so pages stream to the
+        chunker without the whole document text being held at once.
+        """
+        pages = _page_count(file_path)
+        # Every task re-parses the PDF, so long documents get longer ranges
+        # rather than more tasks: about four per worker at most
+        per_task = max(INGEST_PAGES_PER_TASK, -(-pages // (4 * self._workers)))
+        ranges = deque((start, min(start + per_task, pages)) for start in range(0, pages, per_task))
+        pool = self._process_pool()
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) <= self._workers:
+                start, stop = ranges.popleft()
+                in_flight.append((start, pool.submit(_extract_pages, file_path, start, stop)))
+            start, future = in_flight.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+
+    def _flush(self, job: IngestionJob, batch: List[Tuple[str, str, Dict]]) -> None:
+        if not batch:
+            return
+        ids = [chunk_id for chunk_id, _, _ in batch]
+        with self._write_lock:
+            existing = set(self.collection.get(ids=ids, include=[])["ids"])
+            new = [item for item in batch if item[0] not in existing]
+            if new:
+                self.vectorstore.add_texts(
+                    texts=[text for _, text, _ in new],
+                    metadatas=[metadata for _, _, metadata in new],
+                    ids=[chunk_id for chunk_id, _, _ in new],
+                )
+        job.chunks_indexed += len(new)
+        job.chunks_skipped += len(batch) - len(new)
+        batch.clear()
+
+    def _delete_all(self, job: IngestionJob) -> None:
+        with self._write_lock:
+            ids = self.collection.get(include=[])["ids"]
+            if ids:
+                self.collection.delete(ids=ids)
+            self.jobs.clear_indexed()
+        job.chunks_deleted = len(ids)
+
+    def run(self, job: IngestionJob) -> IngestionJob:
+        """Process a job to completion. Blocking, meant for a background thread.
+
+        Progress is saved to the job store after every file, so any worker
+        can report it.
+        """
+        job.status = "running"
+        seen_files = set()
+        seen_chunks = set()
+        batch: List[Tuple[str, str, Dict]] = []
+        batch_tokens = 0
+        # Files read to the end whose last chunks may still be waiting in `batch`
+        chunked: List[str] = []
+        try:
+            if job.kind == "delete":
+                self._delete_all(job)
+            for file_path in job.files:
+                with open(file_path, "rb") as f:
+                    file_hash = _sha256(f.read())
+                if file_hash in seen_files or self._file_indexed(file_hash):
+                    job.files_skipped += 1
+                    job.files_done += 1
+                    continue
+                seen_files.add(file_hash)
+
+                for chunk in self.chunker.chunks(self._pages(file_path)):
+                    job.chunks_total += 1
+                    text = chunk.text
+                    chunk_id = _sha256(text.encode())
+                    if chunk_id in seen_chunks:
+                        job.chunks_skipped += 1
+                        continue
+                    seen_chunks.add(chunk_id)
+
+                    tokens = _estimate_tokens(text)
+                    if batch and batch_tokens + tokens > self.token_budget:
+                        self._flush(job, batch)
+                        batch_tokens = 0
+                        self.jobs.mark_indexed(chunked)
+                        chunked.clear()
+                    batch.append((chunk_id, text, {
+                        "source": self._source(file_path),
+                        "file_hash": file_hash,
+                        "page": chunk.page_start,
+                        "page_end": chunk.page_end,
+                        "section": chunk.section,
+                    }))
+                    batch_tokens += tokens
+                job.files_done += 1
+                chunked.append(file_hash)
+                self.jobs.save(job)
+            self._flush(job, batch)
+            self.jobs.mark_indexed(chunked)
+            job.status = "done"
+        except Exception as e:
+            self.logger.exception(f"Ingestion job {job.id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            if (job.chunks_indexed or job.kind == "delete") and self.on_indexed is not None:
+                self.on_indexed()
+            self.jobs.save(job)
+        return job
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self.jobs.close()
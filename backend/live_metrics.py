@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from device_telemetry import get_device_telemetry
+from telemetry_store import HVAC_METRIC_GROUPS, get_telemetry_store
+
+# Seconds between steps of the CSV replay, the pace the dashboard used to poll at
+LIVE_METRICS_INTERVAL = float(os.getenv("LIVE_METRICS_INTERVAL", "2.5"))
+# Seconds between checks of a device's ring buffer for a newer reading
+LIVE_METRICS_POLL = float(os.getenv("LIVE_METRICS_POLL", "0.5"))
+# Idle subscribers get an SSE comment this often so proxies keep the stream open
+LIVE_METRICS_HEARTBEAT = float(os.getenv("LIVE_METRICS_HEARTBEAT", "15"))
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_GROUP_OF = {name: group for group, names in HVAC_METRIC_GROUPS.items() for name in names}
+
+# Returns (marker, HVAC_Metrics payload) or None; an unchanged marker means no new reading
+Source = Callable[[], Optional[Tuple[Any, dict]]]
+
+
+def _nested(values: Dict[str, Any]) -> dict:
+    metrics: Dict[str, dict] = {}
+    for name, value in values.items():
+        metrics.setdefault(_GROUP_OF[name], {})[name] = value
+    return {"HVAC_Metrics": metrics}
+
+
+class MetricsChannel:
+    """One producer fanned out to any number of subscribers.
+
+    The producer keeps the current value of every field and the version in
+    which it last changed. A subscriber only remembers the last version it
+    sent, so whenever it is ready it gets exactly the fields that changed
+    since then: slow clients receive one coalesced delta instead of a
+    backlog, and no per-subscriber queue exists. Encoded messages are shared
+    by every subscriber that is at the same version.
+    """
+
+    def __init__(self, source: Source, interval: float, on_idle: Optional[Callable[[], None]] = None):
+        self.source = source
+        self.interval = interval
+        self.on_idle = on_idle
+        self.version = 0
+        self.timestamp = 0.0
+        self.values: Dict[str, Any] = {}
+        self.changed_at: Dict[str, int] = {}
+        self.subscribers = 0
+        self._marker: Any = None
+        self._wakeup = asyncio.Event()
+        self._encoded: Dict[int, bytes] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._woken_at = time.monotonic()
+
+    def publish(self, marker: Any, payload: dict) -> bool:
+        """Record a reading; returns whether any field changed."""
+        if marker is not None and marker == self._marker:
+            return False
+        self._marker = marker
+        changed = {}
+        for group in payload["HVAC_Metrics"].values():
+            for name, value in group.items():
+                if self.values.get(name, _MISSING) != value:
+                    changed[name] = value
+        if not changed:
+            return False
+
+        self.version += 1
+        self.timestamp = time.time()
+        self.values.update(changed)
+        for name in changed:
+            self.changed_at[name] = self.version
+        self._encoded.clear()
+        self._wake()
+        return True
+
+    def _wake(self) -> None:
+        # Wake every waiting subscriber at once, later waiters use the fresh event
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+        self._woken_at = time.monotonic()
+
+    def message(self, since: int) -> bytes:
+        """SSE message bringing a subscriber from version `since` to the current one."""
+        encoded = self._encoded.get(since)
+        if encoded is None:
+            if since == 0:
+                event, values = "snapshot", self.values
+            else:
+                event = "delta"
+                values = {name: self.values[name] for name, version in self.changed_at.items() if version > since}
+            data = {"version": self.version, "timestamp": self.timestamp, **_nested(values)}
+            encoded = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+            self._encoded[since] = encoded
+        return encoded
+
+    async def _produce(self) -> None:
+        while True:
+            try:
+                reading = self.source()
+                if reading is not None:
+                    self.publish(*reading)
+            except Exception as e:
+                logger.warning(f"Live metrics source error: {e}")
+            # A wakeup without a new version makes idle subscribers send a heartbeat
+            if time.monotonic() - self._woken_at >= LIVE_METRICS_HEARTBEAT:
+                self._wake()
+            await asyncio.sleep(self.interval)
+
+    async def subscribe(self):
+        """Async iterator of encoded SSE messages for one client."""
+        self.subscribers += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._produce())
+        try:
+            seen = 0
+            while True:
+                if self.version == seen:
+                    # One shared event, no per-subscriber timer or queue
+                    await self._wakeup.wait()
+                    if self.version == seen:
+                        yield b": keep-alive\n\n"
+                    continue
+                since, seen = seen, self.version
+                yield self.message(since)
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers:
+                self.close()
+                if self.on_idle is not None:
+                    self.on_idle()
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def replay_source() -> Source:
+    """Steps through data_points.csv in order, wrapping around at the end."""
+    telemetry = get_telemetry_store()
+    step = 0
+
+    def read():
+        nonlocal step
+        step = (step + 1) % len(telemetry)
+        return step, telemetry.hvac_metrics(step)
+
+    return read
+
+
+def device_source(device_id: str) -> Source:
+    """Latest pushed reading of a device, keyed by its timestamp."""
+    devices = get_device_telemetry()
+
+    def read():
+        latest = devices.latest(device_id)
+        return None if latest is None else (latest[1], latest[2])
+
+    return read
+
+
+class LiveMetrics:
+    """Channels by source, created on first subscriber and dropped after the last."""
+
+    def __init__(self):
+        self.channels: Dict[str, MetricsChannel] = {}
+
+    def channel(self, device_id: Optional[str] = None) -> MetricsChannel:
+        key = f"device:{device_id}" if device_id else "replay"
+        channel = self.channels.get(key)
+        if channel is None:
+            if device_id:
+                source, interval = device_source(device_id), LIVE_METRICS_POLL
+            else:
+                source, interval = replay_source(), LIVE_METRICS_INTERVAL
+            channel = MetricsChannel(source, interval, on_idle=lambda: self._drop(key, channel))
+            self.channels[key] = channel
+        return channel
+
+    def _drop(self, key: str, channel: MetricsChannel) -> None:
+        if self.channels.get(key) is channel:
+            del self.channels[key]
+
+    def stats(self) -> Dict:
+        return {
+            key: {"subscribers": channel.subscribers, "version": channel.version}
+            for key, channel in self.channels.items()
+        }
+
+    def close(self) -> None:
+        for channel in self.channels.values():
+            channel.close()
+        self.channels.clear()
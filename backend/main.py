@@ -1,39 +1,44 @@
+import asyncio
+import base64
+import logging
+import time
+from collections import Counter
+from functools import partial
+from typing import Optional
+from contextlib import asynccontextmanager
 import uvicorn
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, Query, Request, UploadFile
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.chat_models import ChatOpenAI
 from langchain.chains import RetrievalQA
-import shutil
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import pandas as pd
 import json
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import tempfile
-from report_generator import (
-    preprocess_data,
-    generate_query,
-    search_regulations,
-    generate_report
-)
+from report_jobs import ReportService, ReportStore
 from compliance_checker import ComplianceChecker
+from compliance_schema import ComplianceOutputError
+from rule_engine import get_rule_engine
+from compliance_cache import ComplianceCache
+from compliance_batch import AdaptiveLimiter, ComplianceBatchRunner
+from semantic_cache import CacheSlot, SemanticCache
+from chat_history import CompactHistory, HistoryManager
+from chat_sessions import SessionStore
+from index_version import INDEX_VERSION_POLL, IndexWriterLock, bump_index_version, current_index_version
+from telemetry_store import HVAC_COLUMNS, get_telemetry_store
+from device_telemetry import TelemetryIngestError, get_device_telemetry, parse_readings
+from live_metrics import LiveMetrics
+from telemetry_rollup import DOWNSAMPLING_METHODS, ROLLUP_TIERS, step_range
+from concurrency import run_blocking, shutdown_executor
+from ingestion import IngestionPipeline
+from resources import Resources, close_resources, get_resources, mark_index_version, on_reopen, refresh_resources
+from observability import REGISTRY, TracingMiddleware, configure_logging, recent_traces, span
 load_dotenv()
-app = FastAPI()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust this in production!
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+configure_logging()
+logger = logging.getLogger("complimo")
 
 # Define request body models
 class HistoryMessage(BaseModel):
@@ -44,6 +49,8 @@ class ChatWithHistoryRequest(BaseModel):
     query: str
     conversation_history: list[HistoryMessage] = []
     sensor_data: dict = {}  # Add sensor data field
+    device_id: Optional[str] = None  # Device whose latest pushed reading is used
+    session_id: Optional[str] = None  # Server-side conversation, used when no history is sent
 
 # Add this new response model above existing endpoints
 class HVACMetricsResponse(BaseModel):
@@ -52,309 +59,750 @@ class HVACMetricsResponse(BaseModel):
 class SensorDataRequest(BaseModel):
     sensor_data: dict
 
-# Initialize components (moved outside endpoint for efficiency)
-@app.on_event("startup")
-def startup_db_client():
-    global rag_chain, llm, retriever, collection, embedding_model
-    
-    # Initialize embedding model
-    embedding_model = OpenAIEmbeddings()
-    
-    # Load persisted ChromaDB
-    retriever = Chroma(
-        persist_directory="./chroma_db", 
-        embedding_function=embedding_model
-    ).as_retriever()
-
-    # Print all documents in ChromaDB
-    collection = Chroma(
-        persist_directory="./chroma_db",
-        embedding_function=embedding_model
-    )._collection
-    
-    docs = collection.get()
-    print("Documents in ChromaDB:")
-    for doc, metadata in zip(docs['documents'], docs['metadatas']):
-        print(f"Content: {doc[:100]}...")  # Show first 100 chars
-        print(f"Metadata: {metadata}")
-        print("-" * 50)
+class BatchComplianceItem(BaseModel):
+    device_id: str
+    sensor_data: dict = {}  # Empty uses the device's latest pushed reading
+
+class BatchComplianceRequest(BaseModel):
+    items: list[BatchComplianceItem]
+
+# Only the worker holding this lock writes to the vector index, see _index_writer
+index_writer_lock = IndexWriterLock()
+# Set when a job is queued, so a writer in this process starts it without waiting for the next poll
+ingestion_wakeup = asyncio.Event()
+# Interval at which /delete-documents polls its job (s)
+JOB_POLL_INTERVAL = 0.1
+
+# Push channels behind /hvac-metrics/stream, one producer per source
+live_metrics = LiveMetrics()
+
+# Answers of /chat and /chat/stream reused for paraphrased questions on the same readings
+chat_cache = SemanticCache()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared store and clients once, release them on shutdown.
+
+    Handlers read the store and clients from get_resources() on every
+    request rather than from module globals: with several uvicorn workers
+    the store is reopened whenever another worker changed the index.
+    """
+    global rag_chain, compliance_cache, compliance_checker, ingestion_pipeline, history_manager, chat_sessions, compliance_batches, report_service
     
-    # Initialize LLM
-    llm = ChatOpenAI(model_name="gpt-4o", temperature=0.1)
+    # One Chroma handle, embedding model and LLM shared with every module
+    resources = await run_blocking(get_resources)
+
+    logger.info(f"Documents in ChromaDB: {await run_blocking(resources.collection.count)}")
     
-    # Create RAG chain
+    # Create RAG chain; only its "stuff" prompt is used, retrieval goes through get_resources()
     rag_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=retriever,
+        llm=resources.llm,
+        retriever=resources.retriever,
         chain_type="stuff"
     )
 
+    # Older turns folded into a rolling summary so prompts stay within budget
+    history_manager = HistoryManager(resources.llm)
+
+    # Conversations kept server-side, clients send only the new message
+    chat_sessions = SessionStore()
+
+    # Compliance results cache, entries from older index versions are unreachable
+    compliance_cache = ComplianceCache()
+    compliance_cache.purge(keep_version=current_index_version())
+
+    # One checker, its graphs compiled once, for single and batch checks
+    compliance_checker = ComplianceChecker(
+        llm=resources.llm, retriever=resources.retriever, embeddings=resources.embeddings,
+        collection=resources.collection, regulation_retriever=resources.regulations
+    )
+
+    # Batch compliance jobs run the checker with a concurrency and rate-limit bounded LLM
+    compliance_batches = ComplianceBatchRunner(compliance_checker, compliance_cache, AdaptiveLimiter())
+
+    # Reports generated in the background, stored by data range and index version
+    report_service = ReportService(ReportStore())
+
+    # Background PDF ingestion into the same vector store the retriever reads
+    ingestion_pipeline = IngestionPipeline(
+        resources.vectorstore, on_indexed=_documents_changed, write_lock=resources.write_lock
+    )
+
+    on_reopen(_index_reopened)
+    index_writer = asyncio.create_task(_index_writer())
+
+    yield
+
+    index_writer.cancel()
+    index_writer_lock.release()
+    live_metrics.close()
+    ingestion_pipeline.shutdown()
+    compliance_batches.shutdown()
+    report_service.shutdown()
+    report_service.store.close()
+    compliance_cache.close()
+    chat_sessions.close()
+    close_resources()
+    shutdown_executor()
+
+app = FastAPI(lifespan=lifespan)
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this in production!
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Cache"],
+)
+# Root span per request; stage spans, LLM tokens and queue waits nest under it
+app.add_middleware(TracingMiddleware)
+
+def _documents_changed():
+    """Invalidate everything derived from the indexed documents.
+
+    Runs in the index writer. Other workers notice the new version within
+    INDEX_VERSION_POLL seconds and reopen their store, see _index_reopened.
+    """
+    version = bump_index_version()
+    mark_index_version(version)
+    compliance_cache.purge(keep_version=version)
+    chat_cache.purge(keep_version=version)
+
+def _index_reopened(resources: Resources):
+    """Move the long-lived consumers of the store to the one reopened after another worker's write."""
+    ingestion_pipeline.vectorstore = resources.vectorstore
+    compliance_checker.use_store(resources.retriever, resources.collection, resources.regulations)
+    chat_cache.purge(keep_version=resources.index_version)
+
+async def _index_writer():
+    """Watch the index version and, while this worker is the index writer, run ingestion jobs.
+
+    Every worker competes for the writer lock on each poll; the one that
+    holds it claims jobs from the shared queue, so when it exits another
+    takes over. Jobs it left running are failed rather than retried.
+    """
+    while True:
+        ingestion_wakeup.clear()
+        try:
+            if not index_writer_lock.held and await run_blocking(index_writer_lock.try_acquire):
+                orphaned = await run_blocking(ingestion_pipeline.jobs.fail_running, "Index writer exited mid-job")
+                logger.info(f"Worker {os.getpid()} is the index writer, {orphaned} orphaned jobs failed")
+            # After taking the lock, so a new writer starts from the previous writer's last change
+            await run_blocking(refresh_resources)
+            while index_writer_lock.held:
+                job = await run_blocking(ingestion_pipeline.claim)
+                if job is None:
+                    break
+                await run_blocking(ingestion_pipeline.run, job)
+        except Exception:
+            logger.exception("Index writer loop failed")
+        try:
+            await asyncio.wait_for(ingestion_wakeup.wait(), INDEX_VERSION_POLL)
+        except asyncio.TimeoutError:
+            pass
+
+def _current_sensor_data(request: ChatWithHistoryRequest) -> tuple:
+    """Sensor data for a chat turn: the request's own snapshot, else the latest
+    pushed reading, else a random step of the CSV replay.
+
+    Also returns whether the replay fallback was used.
+    """
+    if request.sensor_data:
+        return request.sensor_data, False
+    latest = get_device_telemetry().latest(request.device_id)
+    if latest is not None:
+        return latest[2], False
+    telemetry = get_telemetry_store()
+    return telemetry.hvac_metrics(telemetry.random_step()), True
+
+async def _chat_turn(request: ChatWithHistoryRequest):
+    """Session, sensor data, compacted history, standalone question and cache slot of a chat turn.
+
+    A request carrying conversation_history is answered from it without a
+    session. Otherwise the history is the server-side session's, which is
+    started when the request has no session_id yet. Turns answered from a
+    random replay step get no cache slot: the cache is scoped by the
+    readings, so each would land in a scope of its own and never hit.
+    """
+    session_id = None
+    if request.conversation_history:
+        messages = [(msg.isUser, msg.content) for msg in request.conversation_history]
+    else:
+        # Session calls may read or write the SQLite file, so they stay off the event loop
+        session_id = request.session_id or await run_blocking(chat_sessions.create)
+        messages = await run_blocking(chat_sessions.history, session_id)
+    sensor_data, replayed = _current_sensor_data(request)
+    with span("chat.history_compaction", messages=len(messages)):
+        history = await history_manager.acompact(messages, key=session_id)
+    with span("chat.question_rewrite"):
+        question = await history_manager.arewrite(request.query, history)
+    slot = None if replayed else await _chat_cache_slot(question, sensor_data)
+    return session_id, sensor_data, history, question, slot
+
+async def _record_turn(session_id: Optional[str], query: str, answer: str) -> None:
+    if session_id:
+        await run_blocking(chat_sessions.append, session_id, (True, query), (False, answer))
+
+async def _chat_cache_slot(question: str, sensor_data: dict) -> CacheSlot:
+    """Semantic cache slot of a chat turn, keyed on its standalone question."""
+    index_version = current_index_version()
+    with span("chat.cache_lookup"):
+        embedding = await run_blocking(get_resources().embeddings.embed_query, question)
+    return CacheSlot(chat_cache.scope(sensor_data, index_version), index_version, embedding)
+
+async def _chat_messages(question: str, enhanced_query: str):
+    """Retrieved documents and "stuff" prompt messages of a chat turn.
+
+    Retrieval searches the standalone question alone; history and sensor
+    data only go into the prompt.
+    """
+    with span("vector_search"):
+        docs = await get_resources().retriever.ainvoke(question)
+    # Reuse the RetrievalQA "stuff" prompt so both chat endpoints answer alike
+    prompt = rag_chain.combine_documents_chain.llm_chain.prompt
+    messages = prompt.format_messages(
+        context="\n\n".join(doc.page_content for doc in docs),
+        question=enhanced_query
+    )
+    return docs, messages
+
+def _build_enhanced_query(request: ChatWithHistoryRequest, sensor_data: dict, history: CompactHistory) -> str:
+    # Get the current query and conversation history
+    query = request.query
+
+    logger.debug("Chat request: %s", request)
+    
+    # Format sensor data as context
+    sensor_context = "\n".join(
+        [f"{k}: {v}" for k, v in sensor_data.items()]
+    ) if sensor_data else "No sensor data available"
+    
+    # Build enhanced query with both conversation history and sensor data
+    context_parts = []
+    if history:
+        context_parts.append("Previous conversation:\n" + history.format())
+    
+    context_parts.append(f"Current sensor data:\n{sensor_context}")
+    context = "\n\n".join(context_parts)
+    
+    enhanced_query = f"""
+    {context}
+    
+    Your task:
+    - Use the sensor data only when needed to answer the user's query. Organize the answer in a way that is easy to understand and follow up on. Reference key metrics and numeric values when appropriate.
+    - Use the conversation history to understand the user's query and respond accordingly.
+    Based on this conversation history and sensor data, please respond to the user's query: {query}
+
+    Format your responses properly. Add newlines and lists when appropriate.
+    
+    """
+    logger.debug("Enhanced query:\n%s", enhanced_query)
+    return enhanced_query
+
 @app.post("/chat")
 async def chat(request: ChatWithHistoryRequest):
     try:
-        # Get the current query and conversation history
-        query = request.query
-        conversation_history = request.conversation_history
-
-        print(request)
-
-        df = pd.read_csv("data_points.csv")
-
-        # Choose a random row from the dataframe
-        row = df.sample(n=1).iloc[0].to_dict()
-
-        sensor_data = {
-            "HVAC_Metrics": {
-                "Power_Consumption": {"Absolute_Power_W": row["Absolute_Power_W"]},
-                "Temperature_Differential": {
-                    "Delta_Temperature_K": row["Delta_Temperature_K"],
-                    "Setpoint_Delta_T_K": row["Setpoint_Delta_T_K"],
-                    "Temperature_1_Remote_K": row["Temperature_1_Remote_K"],
-                    "Temperature_2_Embedded_K": row["Temperature_2_Embedded_K"]
-                },
-                "Flow_Performance": {
-                    "Relative_Flow_Percentage": row["Relative_Flow_Percentage"],
-                    "Absolute_Flow_m3_s": row["Absolute_Flow_m3_s"],
-                    "Flow_Volume_Total_m3": row["Flow_Volume_Total_m3"]
-                },
-                "Energy_Consumption": {
-                    "Cooling_Energy_J": row["Cooling_Energy_J"],
-                    "Heating_Energy_J": row["Heating_Energy_J"]
-                },
-                "Operational_Metrics": {
-                    "Operating_Time_h": row["Operating_Time_h"],
-                    "Active_Time_h": row["Active_Time_h"]
-                },
-                "System_Status": {
-                    "Flow_Signal_Faulty": bool(row["Flow_Signal_Faulty"])
-                }
-            }
-        }
-        
-        # Format sensor data as context
-        sensor_context = "\n".join(
-            [f"{k}: {v}" for k, v in sensor_data.items()]
-        ) if sensor_data else "No sensor data available"
-        
-        # Build enhanced query with both conversation history and sensor data
-        context_parts = []
-        if conversation_history:
-            context_parts.append("Previous conversation:\n" + "\n".join(
-                f"{'User' if msg.isUser else 'Assistant'}: {msg.content}" 
-                for msg in conversation_history
-            ))
-        
-        context_parts.append(f"Current sensor data:\n{sensor_context}")
-        
-        enhanced_query = f"""
-        {''.join(context_parts)}
-        
-        Your task:
-        - Use the sensor data only when needed to answer the user's query. Organize the answer in a way that is easy to understand and follow up on. Reference key metrics and numeric values when appropriate.
-        - Use the conversation history to understand the user's query and respond accordingly.
-        Based on this conversation history and sensor data, please respond to the user's query: {query}
+        session_id, sensor_data, history, question, slot = await _chat_turn(request)
+        cached = chat_cache.get(slot.scope, slot.embedding) if slot else None
+        if cached is not None:
+            await _record_turn(session_id, request.query, cached)
+            return JSONResponse(
+                content={"response": cached, "session_id": session_id}, headers={"X-Cache": "hit"}
+            )
 
-        Format your responses properly. Add newlines and lists when appropriate.
-        
-        """
-        print('\n\n****************', enhanced_query, '\n\n****************')
-        response = rag_chain.run(enhanced_query)
-        return {"response": response}
+        enhanced_query = _build_enhanced_query(request, sensor_data, history)
+        _, messages = await _chat_messages(question, enhanced_query)
+        with span("chat.answer"):
+            response = (await get_resources().llm.ainvoke(messages)).content
+        if slot:
+            chat_cache.put(slot.scope, slot.index_version, slot.embedding, question, response)
+        await _record_turn(session_id, request.query, response)
+        return JSONResponse(
+            content={"response": response, "session_id": session_id},
+            headers={"X-Cache": "miss" if slot else "bypass"}
+        )
     
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Chat failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatWithHistoryRequest):
+    """Same answer as /chat, sent as Server-Sent Events while it is generated.
+
+    Events: `session` with the session_id for session-based requests,
+    `retrieval` once the context documents are known, one `token` per
+    streamed chunk, then `done` with the full response (or `error`). A cached
+    answer arrives as a single `token` followed by `done` with `cached` set.
+    """
+    async def events():
+        try:
+            session_id, sensor_data, history, question, slot = await _chat_turn(request)
+            if session_id:
+                yield _sse("session", {"session_id": session_id})
+            cached = chat_cache.get(slot.scope, slot.embedding) if slot else None
+            if cached is not None:
+                await _record_turn(session_id, request.query, cached)
+                yield _sse("token", {"token": cached})
+                yield _sse("done", {"response": cached, "cached": True})
+                return
+
+            enhanced_query = _build_enhanced_query(request, sensor_data, history)
+            docs, messages = await _chat_messages(question, enhanced_query)
+            yield _sse("retrieval", {
+                "documents": len(docs),
+                "sources": sorted({doc.metadata.get("source", "unknown") for doc in docs})
+            })
+
+            response = []
+            with span("chat.answer"):
+                async for chunk in get_resources().llm.astream(messages):
+                    if chunk.content:
+                        response.append(chunk.content)
+                        yield _sse("token", {"token": chunk.content})
+            answer = "".join(response)
+            if slot:
+                chat_cache.put(slot.scope, slot.index_version, slot.embedding, question, answer)
+            await _record_turn(session_id, request.query, answer)
+            yield _sse("done", {"response": answer})
+        except Exception as e:
+            logger.exception("Chat stream failed")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies, LLM calls and tokens, queue waits."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def traces(limit: int = Query(20, ge=1, le=200)):
+    """Most recent finished request traces, newest first."""
+    return recent_traces(limit)
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
 
-@app.post("/index-pdf")
+@app.post("/index-pdf", status_code=202)
 async def index_pdf(files: list[UploadFile] = File(...)):
+    """Queue PDFs for background indexing and return a job id to poll."""
     try:
-        # Create upload directory if it doesn't exist
-        upload_dir = "./uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save files to upload directory
-        saved_files = []
-        for file in files:
-            file_path = os.path.join(upload_dir, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            saved_files.append(file_path)
-        
-        # PDF processing and indexing
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=8000,
-            chunk_overlap=500
-        )
-        embeddings = OpenAIEmbeddings()
-        
-        # Process each PDF file
-        for file_path in saved_files:
-            # Extract text from PDF
-            with open(file_path, "rb") as f:
-                pdf = PdfReader(f)
-                text = "\n".join([page.extract_text() for page in pdf.pages])
-                
-            # Split text into chunks
-            chunks = text_splitter.split_text(text)
-            
-            # Create and persist Chroma collection
-            Chroma.from_texts(
-                texts=chunks,
-                embedding=embeddings,
-                persist_directory="./chroma_db",
-                metadatas=[{"source": file_path}] * len(chunks)
-            ).persist()
-        
+        uploads = [(file.filename, await file.read()) for file in files]
+        job = await run_blocking(ingestion_pipeline.save_uploads, uploads)
+
+        # Extraction and embedding run in the index writer, the request returns immediately
+        ingestion_wakeup.set()
+
         return {
-            "message": "PDFs indexed successfully",
-            "indexed_files": [f.filename for f in files]
+            "message": "PDFs queued for indexing",
+            "indexed_files": [f.filename for f in files],
+            **job.to_dict()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/index-pdf/{job_id}")
+async def index_pdf_status(job_id: str):
+    job = await run_blocking(ingestion_pipeline.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job.to_dict()
+
+DOCUMENT_FIELDS = {"id", "content", "source", "metadata"}
+MAX_DOCUMENTS_PAGE = 500
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/documents")
-async def get_documents():
+async def get_documents(
+    limit: int = Query(50, ge=1, le=MAX_DOCUMENTS_PAGE),
+    cursor: Optional[str] = None,
+    fields: str = "id,source,content",
+    snippet: Optional[int] = Query(None, ge=0),
+    source: Optional[str] = None
+):
+    """Page through indexed chunks.
+
+    `fields` projects the response (id, content, source, metadata); chunk text
+    is only read from Chroma when `content` is requested, and `snippet`
+    truncates it. `source` filters on the metadata source, `cursor` is the
+    `next_cursor` of the previous page.
+    """
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - DOCUMENT_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    offset = _decode_cursor(cursor) if cursor else 0
+
     try:
-        # Initialize Chroma connection
-        embedding_model = OpenAIEmbeddings()
-        chroma = Chroma(
-            persist_directory="./chroma_db",
-            embedding_function=embedding_model
+        include = []
+        if "content" in requested:
+            include.append("documents")
+        if requested & {"source", "metadata"}:
+            include.append("metadatas")
+
+        # Fetch one extra row to know whether another page exists
+        docs = await run_blocking(
+            get_resources().collection.get,
+            where={"source": source} if source else None,
+            limit=limit + 1,
+            offset=offset,
+            include=include
         )
         
-        # Get all documents and metadata
-        collection = chroma._collection
-        docs = collection.get()
-        
         # Format documents with metadata
         documents = []
-        for content, metadata in zip(docs['documents'], docs['metadatas']):
-            documents.append({
-                "content": content,
-                "source": metadata.get('source', 'unknown')
-            })
+        for i, doc_id in enumerate(docs['ids'][:limit]):
+            document = {}
+            if "id" in requested:
+                document["id"] = doc_id
+            if "content" in requested:
+                content = docs['documents'][i]
+                document["content"] = content[:snippet] if snippet is not None else content
+            if requested & {"source", "metadata"}:
+                metadata = docs['metadatas'][i] or {}
+                if "source" in requested:
+                    document["source"] = metadata.get('source', 'unknown')
+                if "metadata" in requested:
+                    document["metadata"] = metadata
+            documents.append(document)
         
+        has_more = len(docs['ids']) > limit
         return {
             "count": len(documents),
-            "documents": documents
+            "documents": documents,
+            "next_cursor": _encode_cursor(offset + limit) if has_more else None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/documents/sources")
+async def get_document_sources():
+    """Distinct document sources with their chunk counts, read from metadata only."""
+    try:
+        docs = await run_blocking(get_resources().collection.get, include=["metadatas"])
+        chunks = Counter((metadata or {}).get('source', 'unknown') for metadata in docs['metadatas'])
+        return {
+            "count": len(chunks),
+            "sources": [{"source": name, "chunks": count} for name, count in sorted(chunks.items())]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/telemetry/ingest")
+async def ingest_telemetry(request: Request):
+    """Push HVAC readings into the per-device ring buffers.
+
+    Accepts a JSON batch or NDJSON (`Content-Type: application/x-ndjson`).
+    Each reading uses the flat CSV columns or the HVAC_Metrics layout, plus
+    an optional `timestamp` (epoch seconds or ISO 8601) and `device_id`.
+    """
+    body = await request.body()
+    try:
+        readings, default_device = parse_readings(body, request.headers.get("content-type", ""))
+        accepted = await run_blocking(get_device_telemetry().ingest, readings, default_device)
+    except TelemetryIngestError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"accepted": sum(accepted.values()), "devices": accepted}
+
+@app.get("/telemetry/devices")
+async def telemetry_devices():
+    return {"devices": get_device_telemetry().devices()}
+
+@app.get("/hvac-metrics/stream")
+async def stream_hvac_metrics(device_id: Optional[str] = None):
+    """Live HVAC metrics as Server-Sent Events.
+
+    The first `snapshot` event carries every field, each following `delta`
+    event only the fields that changed since the last event this client got.
+    Without a device_id the CSV replay is streamed, otherwise that device's
+    pushed readings.
+    """
+    return StreamingResponse(
+        live_metrics.channel(device_id).subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/hvac-metrics/stream-stats")
+async def hvac_metrics_stream_stats():
+    return live_metrics.stats()
+
+@app.get("/hvac-metrics/range")
+async def get_hvac_metrics_range(
+    device_id: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    columns: Optional[str] = None,
+    points: int = Query(500, ge=2, le=10000),
+    method: str = "lttb",
+    tier: str = "auto"
+):
+    """Downsampled HVAC series over a range, for charts and reports.
+
+    With a device_id, `start`/`end` are epoch seconds (default: the last 24 h)
+    and `tier` selects raw readings or the minute/hour/day rollups; "auto"
+    takes the finest one that still covers the range. Without a device_id the
+    CSV replay is used and `start`/`end` are step indices. Raw samples are
+    reduced to `points` with LTTB or per-bucket min/max (`method`), rollups
+    return the bucket mean with a min/max envelope.
+    """
+    names = [name.strip() for name in columns.split(",") if name.strip()] if columns else list(HVAC_COLUMNS)
+    unknown = [name for name in names if name not in HVAC_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    if method not in DOWNSAMPLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(DOWNSAMPLING_METHODS)}")
+    if tier not in ("auto", "raw", *ROLLUP_TIERS):
+        raise HTTPException(status_code=400, detail=f"tier must be auto, raw or one of {', '.join(ROLLUP_TIERS)}")
+
+    if device_id is None:
+        if tier not in ("auto", "raw"):
+            raise HTTPException(status_code=400, detail="Rollup tiers need a device_id")
+        telemetry = get_telemetry_store()
+        start = int(start or 0)
+        end = int(end if end is not None else len(telemetry) - 1)
+        query = partial(step_range, telemetry)
+    else:
+        buffer = get_device_telemetry().buffer(device_id)
+        if buffer is None:
+            raise HTTPException(status_code=404, detail="Unknown device")
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 86400
+        query = partial(buffer.range, tier=tier)
+
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    result = await run_blocking(query, start, end, names, points, method)
+    return {"device_id": device_id, "start": start, "end": end, "method": method, **result}
+
+@app.get("/hvac-metrics/latest", response_model=HVACMetricsResponse)
+async def get_latest_hvac_metrics(device_id: Optional[str] = None):
+    """Newest pushed reading of a device, or of the device that reported last."""
+    latest = get_device_telemetry().latest(device_id)
+    if latest is None:
+        raise HTTPException(status_code=404, detail="No readings ingested for this device")
+    return latest[2]
+
 @app.get("/hvac-metrics/{step}", response_model=HVACMetricsResponse)
-async def get_hvac_metrics(step: int):
+async def get_hvac_metrics(step: int, device_id: Optional[str] = None):
     """
     Returns mock HVAC metrics from CSV for a given step index
     Example CSV format:
     Absolute_Power_W,Delta_Temperature_K,Setpoint_Delta_T_K,Temperature_1_Remote_K,... 
     12500,6.5,7.0,289.5,283.0,75,0.03,14500,4200000000,2800000000,2500,1900,False
+
+    With a device_id, the step indexes that device's retained readings instead
+    (0 is the oldest still in its ring buffer).
     """
+    if device_id is not None:
+        buffer = get_device_telemetry().buffer(device_id)
+        if buffer is None:
+            raise HTTPException(status_code=404, detail="Unknown device")
+        try:
+            return buffer.reading(step)[1]
+        except IndexError:
+            raise HTTPException(status_code=400, detail="Invalid step index")
+
     try:
-        # Read CSV file (create this file in your project root)
-        df = pd.read_csv("data_points.csv")
+        telemetry = get_telemetry_store()
         
         # Validate step parameter
-        if step < 0 or step >= len(df):
+        if step < 0 or step >= len(telemetry):
             raise HTTPException(status_code=400, detail="Invalid step index")
             
-        # Get row for requested step
-        row = df.iloc[step].to_dict()
-        
         # Structure response according to required format
-        return {
-            "HVAC_Metrics": {
-                "Power_Consumption": {"Absolute_Power_W": row["Absolute_Power_W"]},
-                "Temperature_Differential": {
-                    "Delta_Temperature_K": row["Delta_Temperature_K"],
-                    "Setpoint_Delta_T_K": row["Setpoint_Delta_T_K"],
-                    "Temperature_1_Remote_K": row["Temperature_1_Remote_K"],
-                    "Temperature_2_Embedded_K": row["Temperature_2_Embedded_K"]
-                },
-                "Flow_Performance": {
-                    "Relative_Flow_Percentage": row["Relative_Flow_Percentage"],
-                    "Absolute_Flow_m3_s": row["Absolute_Flow_m3_s"],
-                    "Flow_Volume_Total_m3": row["Flow_Volume_Total_m3"]
-                },
-                "Energy_Consumption": {
-                    "Cooling_Energy_J": row["Cooling_Energy_J"],
-                    "Heating_Energy_J": row["Heating_Energy_J"]
-                },
-                "Operational_Metrics": {
-                    "Operating_Time_h": row["Operating_Time_h"],
-                    "Active_Time_h": row["Active_Time_h"]
-                },
-                "System_Status": {
-                    "Flow_Signal_Faulty": bool(row["Flow_Signal_Faulty"])
-                }
-            }
-        }
+        return telemetry.hvac_metrics(step)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Metrics data not found")
 
 @app.post("/check-compliance")
-async def check_compliance_endpoint(request: SensorDataRequest):
+async def check_compliance_endpoint(request: SensorDataRequest, rules_only: bool = False):
     try:
-        
+        rule_engine = get_rule_engine()
+        if rules_only:
+            # Deterministic numeric checks only, no LLM round-trip
+            return rule_engine.evaluate_snapshot(request.sensor_data)
+
+        # Identical snapshots against an unchanged index and rule set reuse the stored results
+        index_version = f"{current_index_version()}:{rule_engine.version}"
+        cache_key = compliance_cache.key(request.sensor_data, index_version)
+        cached_results = await run_blocking(compliance_cache.get, cache_key)
+        if cached_results is not None:
+            return JSONResponse(content=cached_results, headers={"X-Cache": "hit"})
+
         # Convert sensor data dict to JSON string
         sensor_data = json.dumps(request.sensor_data)
         
         # Call compliance checker
-        compliance_checker = ComplianceChecker(llm=llm, retriever=retriever, embeddings=embedding_model, collection=collection)
-
-        compliance_results = compliance_checker.compliance_check(sensor_data)
+        state = await compliance_checker.arun(sensor_data)
+        await run_blocking(compliance_cache.put, cache_key, index_version, state["results"])
         
-        return compliance_results
+        # Per-node timings travel as response metadata, the body stays the plain results list
+        server_timing = ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in state["timings"].items()
+        )
+        return JSONResponse(
+            content=state["results"],
+            headers={"Server-Timing": server_timing, "X-Cache": "miss"}
+        )
+    except ComplianceOutputError as e:
+        logger.warning(f"Compliance check returned invalid output: {e}")
+        raise HTTPException(status_code=502, detail=f"Invalid compliance output from model: {str(e)}")
     except Exception as e:
-        print(f"Compliance check error: {str(e)}")
+        logger.exception("Compliance check failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/check-compliance/batch", status_code=202)
+async def check_compliance_batch(request: BatchComplianceRequest):
+    """Queue compliance checks for many devices and return a job id.
+
+    Results are read per device from /check-compliance/batch/{job_id}/stream
+    as they complete, or all at once from /check-compliance/batch/{job_id}.
+    """
+    try:
+        job = compliance_batches.submit([item.model_dump() for item in request.items])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job.to_dict()
+
+@app.get("/check-compliance/batch/{job_id}")
+async def check_compliance_batch_status(job_id: str):
+    job = compliance_batches.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown compliance batch")
+    return {**job.to_dict(include_results=True), "limiter": compliance_batches.limiter.stats()}
+
+@app.get("/check-compliance/batch/{job_id}/stream")
+async def stream_compliance_batch(job_id: str):
+    """Server-Sent Events: one `result` per device as it completes, then `done` with the job summary."""
+    job = compliance_batches.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown compliance batch")
+
+    async def events():
+        async for result in compliance_batches.results(job):
+            yield _sse("result", result)
+        yield _sse("done", job.to_dict())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/check-compliance/cache-stats")
+async def compliance_cache_stats():
+    return await run_blocking(compliance_cache.stats)
+
+@app.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not await run_blocking(chat_sessions.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    history_manager.forget(session_id)
+    return {"message": "Session deleted"}
+
+@app.get("/chat/session-stats")
+async def chat_session_stats():
+    return await run_blocking(chat_sessions.stats)
+
+@app.get("/chat/cache-stats")
+async def chat_cache_stats():
+    return chat_cache.stats()
+
+@app.get("/embeddings/cache-stats")
+async def embedding_cache_stats():
+    return get_resources().embeddings.stats()
+
 # Endpoint to delete all documents from ChromaDB
 @app.get("/delete-documents")
 async def delete_documents():
+    """Delete every document, through the index writer's job queue, once the jobs queued before it ran."""
     try:
-        global rag_chain
-        embedding_model = OpenAIEmbeddings()
-        
-        # Delete existing collection
-        chroma = Chroma(
-            persist_directory="./chroma_db",
-            embedding_function=embedding_model
-        )
-        # chroma.delete_collection()
-        # Fetch all documents
-        docs = collection.get()
-
-        # Delete fetched documents
-        collection.delete(ids=docs['ids'])
+        job = await run_blocking(ingestion_pipeline.queue_delete)
+        ingestion_wakeup.set()
+        while job.status not in ("done", "failed"):
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            job = await run_blocking(ingestion_pipeline.get_job, job.id)
+        if job.status == "failed":
+            raise RuntimeError(job.error)
 
-        return {"message": "All documents deleted successfully"}
+        return {"message": "All documents deleted successfully", "chunks_deleted": job.chunks_deleted}
     except Exception as e:  
         raise HTTPException(status_code=500, detail=str(e))
 
+def _report_response(job) -> HTMLResponse:
+    return HTMLResponse(
+        content=job.html,
+        headers={
+            'Content-Disposition': 'inline; filename="report.html"',
+            'X-Cache': "hit" if job.mode == "cached" else "miss",
+        }
+    )
+
 @app.get("/generate-report", response_class=HTMLResponse)
-async def generate_report_endpoint():
-    """Generate compliance report from uploaded CSV data"""
-    try: 
-        temp_path = "data_points.csv"
-        # Process data and generate report
-        df = preprocess_data(temp_path)
-        similarity_search_query = generate_query(df)
-        requirements = search_regulations(similarity_search_query)
-        report_html = generate_report(requirements, df['columns'], df['data'])
-        
-        return HTMLResponse(
-            content=report_html,
-            headers={'Content-Disposition': 'inline; filename="report.html"'}
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Report generation failed: {str(e)}")
+async def generate_report_endpoint(wait: bool = True):
+    """Compliance report of the telemetry data.
+
+    Served from the report store when neither the data nor the documents
+    changed; otherwise generated in the background. With wait=false the
+    job is returned right away (202) for polling instead.
+    """
+    job = await report_service.submit()
+    if job.status != "done" and not wait:
+        return JSONResponse(job.to_dict(), status_code=202)
+    await job.finished.wait()
+    if job.status == "failed":
+        raise HTTPException(500, f"Report generation failed: {job.error}")
+    return _report_response(job)
+
+@app.post("/generate-report", status_code=202)
+async def start_report():
+    """Start generating a report of the current data and return the job to poll."""
+    job = await report_service.submit()
+    return job.to_dict()
+
+@app.get("/generate-report/store-stats")
+async def report_store_stats():
+    return await run_blocking(report_service.store.stats)
+
+@app.get("/generate-report/{job_id}")
+async def report_status(job_id: str):
+    job = report_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    return job.to_dict()
+
+@app.get("/generate-report/{job_id}/html", response_class=HTMLResponse)
+async def report_html(job_id: str):
+    job = report_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    return _report_response(job)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvicorn needs the import string to start several workers; WEB_CONCURRENCY sets how many
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
 
 
     
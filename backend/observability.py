@@ -0,0 +1,362 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tokens import count_tokens
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Fraction of DEBUG/INFO records emitted; warnings and errors are always logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Finished traces kept in memory for /traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items()]
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket = _format_labels(self.label_names, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {n}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("complimo_stage_seconds", "Wall time of pipeline stages (spans).", ["stage"])
+STAGE_ERRORS = Counter("complimo_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+LLM_CALLS = Counter("complimo_llm_calls_total", "LLM calls by calling stage and outcome.", ["stage", "model", "status"])
+LLM_SECONDS = Histogram("complimo_llm_seconds", "LLM call latency.", ["stage", "model"])
+LLM_TOKENS = Counter("complimo_llm_tokens_total", "Prompt and completion tokens of LLM calls.", ["stage", "model", "kind"])
+QUEUE_WAIT = Histogram("complimo_queue_wait_seconds", "Time work waited for a worker thread or an LLM slot.",
+                       ["queue"], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+HTTP_SECONDS = Histogram("complimo_http_request_seconds", "HTTP request latency until the response starts.",
+                         ["method", "route", "status"])
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "started_at", "duration", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_open_traces: Dict[str, List[Span]] = {}
+_traces: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_traces_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_stage() -> str:
+    span = _current_span.get()
+    return span.name if span is not None else "unknown"
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a stage as a child of the current span; the duration also lands
+    in the complimo_stage_seconds histogram."""
+    parent = _current_span.get()
+    current = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None,
+                   attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned async generator
+            _current_span.set(parent)
+        STAGE_SECONDS.observe(current.duration, stage=name)
+        _finish(current)
+
+
+def _finish(finished: Span) -> None:
+    with _traces_lock:
+        spans = _open_traces.setdefault(finished.trace_id, [])
+        spans.append(finished)
+        if finished.parent_id is None:
+            del _open_traces[finished.trace_id]
+            _traces.append(spans)
+        elif len(_open_traces) > 4 * TRACE_BUFFER_SIZE:
+            # Spans of background tasks that outlive their root never complete a trace
+            del _open_traces[next(iter(_open_traces))]
+
+
+def traced(name: str):
+    """Decorator running a sync or async function inside a span."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def recent_traces(limit: int = 20) -> List[List[Dict[str, Any]]]:
+    """Newest finished traces first, each a list of spans in finishing order."""
+    with _traces_lock:
+        traces = list(_traces)[-limit:]
+    return [[s.to_dict() for s in trace] for trace in reversed(traces)]
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """LangChain callback recording latency and token counts of every LLM
+    call, labelled with the stage (span) that made it.
+
+    Token counts come from the provider's usage report; only when it is
+    missing (e.g. streamed responses without usage) is the prompt or the
+    output counted with tokens.py, so the prompt is kept but not tokenized
+    until the call ends.
+    """
+
+    run_inline = True  # keep the caller's context, and with it the current span
+
+    def __init__(self):
+        # run id -> (started, stage, model, prompts as strings or message batches)
+        self._runs: Dict[Any, Tuple[float, str, str, list]] = {}
+
+    def _start(self, serialized: Optional[dict], run_id: Any, prompts: list, kwargs: dict) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name", "unknown")
+        self._runs[run_id] = (time.perf_counter(), current_stage(), str(model), prompts)
+
+    @staticmethod
+    def _prompt_tokens(prompts: list) -> int:
+        """Local estimate of the prompt, for when the provider reports no usage."""
+        return count_tokens("\n".join(
+            "\n".join(str(message.content) for message in prompt) if isinstance(prompt, list) else prompt
+            for prompt in prompts
+        ))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(serialized, run_id, messages, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start(serialized, run_id, prompts, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, stage, model, prompts = run
+        LLM_SECONDS.observe(time.perf_counter() - started, stage=stage, model=model)
+        LLM_CALLS.inc(stage=stage, model=model, status="ok")
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None or completion_tokens is None:
+            generation = response.generations[0][0] if response.generations and response.generations[0] else None
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            if prompt_tokens is None:
+                prompt_tokens = metadata.get("input_tokens")
+            if completion_tokens is None:
+                completion_tokens = metadata.get("output_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = self._prompt_tokens(prompts)
+        if completion_tokens is None:
+            completion_tokens = sum(count_tokens(g.text) for gs in response.generations for g in gs)
+        LLM_TOKENS.inc(prompt_tokens, stage=stage, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, stage=stage, model=model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_CALLS.inc(stage=run[1], model=run[2], status="error")
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of every HTTP request.
+
+    Unlike BaseHTTPMiddleware it wraps the whole response, streamed bodies
+    included, so spans opened while streaming stay in the request's trace.
+    Latency to the start of the response goes to complimo_http_request_seconds,
+    labelled by route template rather than raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+
+        with span("http", method=scope["method"], path=scope["path"]) as request_span:
+            async def send_with_metrics(message):
+                if message["type"] == "http.response.start":
+                    route = getattr(scope.get("route"), "path", "unmatched")
+                    request_span.set(route=route, status=message["status"])
+                    HTTP_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route,
+                                         status=str(message["status"]))
+                await send(message)
+
+            await self.app(scope, receive, send_with_metrics)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes every WARNING and above, and a `rate` fraction of the rest.
+    Also stamps records with the current trace id."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace_id = span.trace_id[:16] if span is not None else "-"
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+_logging_configured = False
+
+
+def configure_logging(level: str = LOG_LEVEL, sample_rate: float = LOG_SAMPLE_RATE) -> None:
+    """Route application logs through one leveled, sampled handler."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    _logging_configured = True
@@ -1,48 +1,47 @@
-import pandas as pd
-from dotenv import load_dotenv
+import logging
+import os
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_chroma.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-from dotenv import load_dotenv
+from observability import traced
+from telemetry_store import get_telemetry_store
+from resources import get_resources
+from telemetry_summary import format_digest, summarize_telemetry
 
-load_dotenv()
+# Importing this module has no side effects: the LLM and vector store come from
+# the shared registry the first time a function needs them.
 
-def preprocess_data(file_path: str) -> pd.DataFrame:
-    df = pd.read_csv(file_path)
-    columns = df.columns.tolist()
-    return { "columns": columns, "data": df.values.tolist() }
+# Tokens of regulation text in the report prompt, more than a single check gets
+REPORT_REGULATION_TOKEN_BUDGET = int(os.getenv("REPORT_REGULATION_TOKEN_BUDGET", "3000"))
 
+logger = logging.getLogger(__name__)
 
-# Define LLM
-llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+def preprocess_data(file_path: str) -> dict:
+    telemetry = get_telemetry_store(file_path)
+    return { "columns": telemetry.column_names, "data": telemetry.rows() }
 
-# Initialize Chroma client
-embeddings = OpenAIEmbeddings()
 
-# # Load persisted ChromaDB
-retriever = Chroma(
-    persist_directory="./chroma_db", 
-    embedding_function=embeddings
-).as_retriever()
+@traced("report.summarize")
+def summarize_data(file_path: str) -> dict:
+    """Like preprocess_data, but `data` is a statistical digest whose size does
+    not grow with the number of rows, so it is safe to put in a prompt."""
+    telemetry = get_telemetry_store(file_path)
+    digest = format_digest(summarize_telemetry(telemetry))
+    return { "columns": telemetry.column_names, "data": digest }
 
-      
-# Print all documents in ChromaDB
-collection = Chroma(
-    persist_directory="./chroma_db",
-    embedding_function=embeddings
-)._collection
 
+@traced("report.render")
+def generate_report(requirements_data: str, data_columns_description: str, timeseries_data: str,
+                    raise_errors: bool = False) -> str:
+    """Analyze tabular data provided as JSON string.
 
-def generate_report(requirements_data: str, data_columns_description: str, timeseries_data: str) -> str:
-    """Analyze tabular data provided as JSON string."""
+    Failures come back as an error message in place of the report unless
+    `raise_errors` is set.
+    """
     try:
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
-
         prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a data analysis expert creating a formal PDF report for an Heating, Ventilation and Air conditioning (HVAC) insurance company who wants to know if a building is complying with the insurance requirements and is eligible to make claims. The columns are as follows-\n\n{data_columns_description}.\n\n
 
-         The time series data is as follows-\n\n{timeseries_data}.\n\n
+         The time series data (statistics computed over every sample, indexed by step) is as follows-\n\n{timeseries_data}.\n\n
          
          Analyze the provided time series data and provide insights about:
             1. The trends in the data including the peaks and troughs, deviation from the norm and the exact time period of such deviations.
@@ -61,21 +60,23 @@ def generate_report(requirements_data: str, data_columns_description: str, times
         messages = prompt.format_messages(requirements_data=requirements_data, timeseries_data=timeseries_data, data_columns_description=data_columns_description)
 
 
-        # print length of prompt
-        print(len(prompt.format_messages(requirements_data=requirements_data, timeseries_data=timeseries_data, data_columns_description=data_columns_description)[0].content))
-
-        print(messages)
+        # Lazy arguments: large prompts are only formatted when DEBUG is enabled
+        logger.debug("Report prompt: %d characters", len(messages[0].content))
+        logger.debug("Report messages: %s", messages)
 
         # Get analysis from OpenAI
-        response = llm.invoke(messages)
+        response = get_resources().llm.invoke(messages)
         
         return response.content
     except Exception as e:
+        if raise_errors:
+            raise
         return f"Error analyzing data: {str(e)}"
     
 
 
-def generate_query(data: dict) -> str:
+@traced("report.query")
+def generate_query(data: dict, raise_errors: bool = False) -> str:
     columns = data["columns"]
     data = data["data"]
 
@@ -89,19 +90,18 @@ def generate_query(data: dict) -> str:
         messages = prompt.format_messages(data=data, columns=columns)
 
         # Get analysis from OpenAI
-        response = llm.invoke(messages)
+        response = get_resources().llm.invoke(messages)
         
         return response.content
     except Exception as e:
+        if raise_errors:
+            raise
         return f"Error generating query: {str(e)}"
 
+@traced("report.retrieval")
 def search_regulations(query: str) -> str:
     """Search compliance regulations database with the given query."""
-    results = retriever.vectorstore.similarity_search(query, k=10)
-    formatted_results = []
-    for i, doc in enumerate(results):
-        formatted_results.append(f"Document {i+1}:\n{doc.page_content}\n")
-    return "\n".join(formatted_results)
+    return get_resources().regulations.search(query, k=10, token_budget=REPORT_REGULATION_TOKEN_BUDGET)
 
 def analyze_data(data: dict) -> str:
     try:
@@ -119,7 +119,7 @@ def analyze_data(data: dict) -> str:
         messages = prompt.format_messages(data=data['data'], data_columns_description=data['columns'])
 
         # Get analysis from OpenAI
-        response = llm.invoke(messages)
+        response = get_resources().llm.invoke(messages)
         
     except Exception as e:
         return f"Error analyzing data: {str(e)}"
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from concurrency import run_blocking
+from index_version import current_index_version
+from observability import span
+from report_generator import generate_query, generate_report, search_regulations
+from telemetry_store import DATA_POINTS_PATH, TelemetryStore, get_telemetry_store
+from telemetry_summary import accumulate_totals, format_digest, format_totals, summarize_telemetry
+
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH", "./cache/reports.sqlite3")
+# Reports kept in the store, newest first; older ones only serve as incremental bases
+REPORT_STORE_KEEP = int(os.getenv("REPORT_STORE_KEEP", "50"))
+# Finished jobs are kept this long (seconds) so clients can read their results
+REPORT_JOB_TTL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class StoredReport(NamedTuple):
+    key: str
+    data_hash: str
+    index_version: str
+    rows: int
+    html: str
+    # Carried forward to later reports: running totals, digest, query and regulations
+    state: Dict[str, Any]
+    created_at: float
+
+
+class ReportStore:
+    """On-disk store of generated reports keyed by data-range hash and index version."""
+
+    def __init__(self, path: str = REPORT_STORE_PATH, keep: int = REPORT_STORE_KEEP):
+        self.keep = keep
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS reports (
+                key TEXT PRIMARY KEY,
+                data_hash TEXT NOT NULL,
+                index_version TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                html TEXT NOT NULL,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(data_hash: str, index_version: str) -> str:
+        return f"{data_hash}:{index_version}"
+
+    @staticmethod
+    def _report(row: tuple) -> StoredReport:
+        return StoredReport(*row[:5], json.loads(row[5]), row[6])
+
+    def get(self, key: str) -> Optional[StoredReport]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM reports WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._report(row)
+
+    def candidates(self) -> List[StoredReport]:
+        """Every stored report, the ones covering the most rows first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM reports ORDER BY rows DESC, created_at DESC").fetchall()
+        return [self._report(row) for row in rows]
+
+    def put(self, report: StoredReport) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*report[:5], json.dumps(report.state), report.created_at),
+            )
+            self._conn.execute(
+                "DELETE FROM reports WHERE key NOT IN (SELECT key FROM reports ORDER BY created_at DESC LIMIT ?)",
+                (self.keep,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "reports": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class ReportJob:
+    id: str
+    key: str
+    rows: int
+    data_hash: str
+    index_version: str
+    status: str = "queued"
+    # "cached", "full", "incremental" or "regulations" (same data, documents changed)
+    mode: Optional[str] = None
+    new_rows: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    html: Optional[str] = field(default=None, repr=False)
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "rows": self.rows,
+            "new_rows": self.new_rows,
+            "index_version": self.index_version,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+        self.finished.set()
+
+
+class ReportService:
+    """Telemetry compliance reports generated in the background.
+
+    Reports are stored by the hash of the rows they cover plus the index
+    version, so unchanged data and documents are served straight from the
+    store, and concurrent requests for the same data share one job. When rows
+    were only appended since an earlier report, just the new window is
+    summarized: the earlier report's running totals are carried forward, and
+    its search query, plus its regulations if the documents are unchanged,
+    are reused, leaving a single LLM call to render the report.
+    """
+
+    def __init__(self, store: ReportStore, path: str = DATA_POINTS_PATH):
+        self.store = store
+        self.path = path
+        self.jobs: Dict[str, ReportJob] = {}
+        # Data key -> job generating it
+        self._running: Dict[str, ReportJob] = {}
+        self._tasks = set()
+
+    def _current(self) -> tuple:
+        telemetry = get_telemetry_store(self.path)
+        rows = len(telemetry)
+        return rows, telemetry.range_hash(rows), current_index_version()
+
+    async def submit(self) -> ReportJob:
+        """Job for a report of the current data; already done when it was stored."""
+        rows, data_hash, index_version = await run_blocking(self._current)
+        key = self.store.key(data_hash, index_version)
+        running = self._running.get(key)
+        if running is not None:
+            return running
+
+        self._prune_jobs()
+        job = ReportJob(id=uuid.uuid4().hex, key=key, rows=rows, data_hash=data_hash, index_version=index_version)
+        self.jobs[job.id] = job
+        stored = await run_blocking(self.store.get, key)
+        if stored is not None:
+            job.mode = "cached"
+            job.html = stored.html
+            job._finish("done")
+            return job
+
+        self._running[key] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _prune_jobs(self) -> None:
+        cutoff = time.time() - REPORT_JOB_TTL
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: ReportJob) -> None:
+        job.status = "running"
+        try:
+            job.html = await run_blocking(self._generate, job)
+            status = "done"
+        except Exception as e:
+            logger.exception(f"Report job {job.id} failed")
+            job.error = str(e)
+            status = "failed"
+        finally:
+            self._running.pop(job.key, None)
+        job._finish(status)
+
+    def _base(self, telemetry: TelemetryStore, job: ReportJob) -> Optional[StoredReport]:
+        """Stored report whose rows are an unchanged prefix of the current data."""
+        for report in self.store.candidates():
+            if report.rows <= job.rows and report.data_hash == telemetry.range_hash(report.rows):
+                return report
+        return None
+
+    def _generate(self, job: ReportJob) -> str:
+        with span("report.job", rows=job.rows) as job_span:
+            telemetry = get_telemetry_store(self.path)
+            columns = telemetry.column_names
+            base = self._base(telemetry, job)
+            regulations = None
+            if base is None:
+                job.mode = "full"
+                job.new_rows = job.rows
+                totals = accumulate_totals(telemetry, stop=job.rows)
+                digest = format_digest(summarize_telemetry(telemetry, stop=job.rows))
+                query = generate_query({"columns": columns, "data": digest}, raise_errors=True)
+            elif base.rows == job.rows:
+                job.mode = "regulations"
+                totals, digest, query = base.state["totals"], base.state["digest"], base.state["query"]
+            else:
+                job.mode = "incremental"
+                job.new_rows = job.rows - base.rows
+                totals = accumulate_totals(telemetry, base.rows, job.rows, previous=base.state["totals"])
+                window = format_digest(summarize_telemetry(telemetry, start=base.rows, stop=job.rows))
+                digest = f"Whole history:\n{format_totals(totals)}\n\nNew since the previous report:\n{window}"
+                query = base.state["query"]
+                if base.index_version == job.index_version:
+                    regulations = base.state["regulations"]
+            job_span.set(mode=job.mode, new_rows=job.new_rows)
+
+            if regulations is None:
+                regulations = search_regulations(query)
+            html = generate_report(regulations, columns, digest, raise_errors=True)
+            self.store.put(StoredReport(
+                key=job.key, data_hash=job.data_hash, index_version=job.index_version, rows=job.rows, html=html,
+                state={"totals": totals, "digest": digest, "query": query, "regulations": regulations},
+                created_at=time.time(),
+            ))
+            return html
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,124 @@
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, List, Optional
+
+from chromadb.api.client import SharedSystemClient
+from dotenv import load_dotenv
+from langchain_chroma.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI
+
+from embeddings import get_embeddings
+from hybrid_retrieval import HybridRetriever
+from observability import LLMMetricsHandler
+from index_version import CHROMA_DIR, current_index_version
+
+LLM_MODEL = "gpt-4o"
+
+
+@dataclass
+class Resources:
+    """Process-wide handles shared by every module.
+
+    Chroma's client is safe for concurrent reads; anything that writes to the
+    collection (ingestion, deletes) must hold `write_lock`. Only the worker
+    holding the index writer lock writes; the others reopen the store when
+    the index version moves past `index_version`.
+    """
+
+    embeddings: Embeddings
+    vectorstore: Chroma
+    llm: ChatOpenAI
+    write_lock: threading.Lock
+    regulations: HybridRetriever
+    # Index version the vector store was opened at, or last written at by this process
+    index_version: str = "0"
+
+    @property
+    def collection(self) -> Any:
+        return self.vectorstore._collection
+
+    @property
+    def retriever(self):
+        return self.vectorstore.as_retriever()
+
+
+_resources: Optional[Resources] = None
+_resources_lock = threading.Lock()
+_reopen_listeners: List[Callable[[Resources], None]] = []
+
+
+def _open_vectorstore(embeddings: Embeddings) -> Chroma:
+    return Chroma(persist_directory=CHROMA_DIR, embedding_function=embeddings)
+
+
+def get_resources() -> Resources:
+    """Open the shared store and clients on first use and return them."""
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                load_dotenv()
+                # Read before opening, so a write racing the open is picked up by the next check
+                index_version = current_index_version()
+                embeddings = get_embeddings()
+                vectorstore = _open_vectorstore(embeddings)
+                _resources = Resources(
+                    embeddings=embeddings,
+                    vectorstore=vectorstore,
+                    # Usage is also requested on streams so token metrics cover /chat/stream
+                    llm=ChatOpenAI(model=LLM_MODEL, temperature=0.1, stream_usage=True,
+                                   callbacks=[LLMMetricsHandler()]),
+                    write_lock=threading.Lock(),
+                    regulations=HybridRetriever(vectorstore, vectorstore._collection),
+                    index_version=index_version,
+                )
+    return _resources
+
+
+def refresh_resources() -> Resources:
+    """Reopen the vector store if the index changed since this process opened it.
+
+    The HNSW index of an embedded Chroma lives in process memory, so writes
+    made by another process are only visible after a reopen. Callers holding
+    the previous Resources keep a consistent, if stale, view until they
+    finish; listeners registered with on_reopen run after the swap.
+    """
+    global _resources
+    with _resources_lock:
+        current = _resources
+        version = current_index_version()
+        if current is None or version == current.index_version:
+            return current
+        # Chroma keeps one client per path; dropping it makes the reopen read the index from disk
+        SharedSystemClient.clear_system_cache()
+        vectorstore = _open_vectorstore(current.embeddings)
+        _resources = replace(
+            current,
+            vectorstore=vectorstore,
+            regulations=HybridRetriever(vectorstore, vectorstore._collection),
+            index_version=version,
+        )
+        reopened = _resources
+    for listener in list(_reopen_listeners):
+        listener(reopened)
+    return reopened
+
+
+def on_reopen(listener: Callable[[Resources], None]) -> None:
+    """Call `listener` with the new Resources whenever the store is reopened."""
+    _reopen_listeners.append(listener)
+
+
+def mark_index_version(version: str) -> None:
+    """Record that this process wrote the index up to `version`, so it does not reopen for its own writes."""
+    with _resources_lock:
+        if _resources is not None:
+            _resources.index_version = version
+
+
+def close_resources() -> None:
+    global _resources
+    with _resources_lock:
+        _resources = None
+        _reopen_listeners.clear()
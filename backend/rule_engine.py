@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+COMPLIANCE_RULES_PATH = os.getenv("COMPLIANCE_RULES_PATH", "compliance_rules.json")
+
+_OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+@dataclass
+class Rule:
+    """A numeric check settled locally instead of by the LLM.
+
+    The checked quantity is `metric`, optionally minus the `minus` column and
+    optionally taken as an absolute value. It is compared with `op` against a
+    constant `value` or against another column `other`. For `between`, `value`
+    is an inclusive [low, high] pair.
+    """
+
+    id: str
+    regulation: str
+    metric: str
+    op: str
+    next_steps: str
+    value: Any = None
+    other: Optional[str] = None
+    minus: Optional[str] = None
+    abs: bool = False
+
+    def __post_init__(self):
+        if self.op != "between" and self.op not in _OPERATORS:
+            raise ValueError(f"Rule {self.id}: unknown operator {self.op!r}")
+        if (self.value is None) == (self.other is None):
+            raise ValueError(f"Rule {self.id}: exactly one of value/other is required")
+
+    @property
+    def columns(self) -> List[str]:
+        return [name for name in (self.metric, self.minus, self.other) if name]
+
+    def describe(self) -> str:
+        quantity = f"{self.metric} - {self.minus}" if self.minus else self.metric
+        if self.abs:
+            quantity = f"|{quantity}|"
+        if self.op == "between":
+            return f"{self.value[0]} <= {quantity} <= {self.value[1]}"
+        return f"{quantity} {self.op} {self.other or json.dumps(self.value)}"
+
+    def violations(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Boolean array, True where a sample breaks the rule."""
+        quantity = columns[self.metric]
+        if self.minus:
+            quantity = quantity - columns[self.minus]
+        if self.abs:
+            quantity = np.abs(quantity)
+        if self.op == "between":
+            low, high = self.value
+            return (quantity < low) | (quantity > high)
+        reference = columns[self.other] if self.other else self.value
+        return ~_OPERATORS[self.op](quantity, reference)
+
+
+def flatten_snapshot(sensor_data: Mapping) -> Dict[str, np.ndarray]:
+    """Nested HVAC_Metrics payload to one single-sample array per column."""
+    columns = {}
+    stack = [sensor_data]
+    while stack:
+        node = stack.pop()
+        for key, value in node.items():
+            if isinstance(value, Mapping):
+                stack.append(value)
+            elif isinstance(value, (bool, int, float)):
+                columns[key] = np.asarray([value])
+    return columns
+
+
+class RuleEngine:
+    def __init__(self, rules: List[Rule], version: str = ""):
+        self.rules = rules
+        self.version = version
+
+    @classmethod
+    def from_file(cls, path: str = COMPLIANCE_RULES_PATH) -> "RuleEngine":
+        with open(path, "rb") as f:
+            raw = f.read()
+        rules = [Rule(**rule) for rule in json.loads(raw)]
+        return cls(rules, version=hashlib.sha256(raw).hexdigest()[:12])
+
+    def applicable(self, columns: Mapping[str, np.ndarray]) -> List[Rule]:
+        return [rule for rule in self.rules if all(name in columns for name in rule.columns)]
+
+    def evaluate(self, columns: Mapping[str, np.ndarray]) -> List[Dict]:
+        """Evaluate every applicable rule over whole column arrays.
+
+        Results use the same regulation/compliance_issues/status/next_steps
+        schema as the LLM check so both can be merged.
+        """
+        results = []
+        for rule in self.applicable(columns):
+            violations = rule.violations(columns)
+            failed = int(np.count_nonzero(violations))
+            samples = violations.size
+            if failed:
+                issue = (f"Rule {rule.describe()} is violated in {failed} of {samples} "
+                         f"sample{'s' if samples != 1 else ''}.")
+                status, next_steps = "non-compliant", rule.next_steps
+            else:
+                issue = f"Rule {rule.describe()} holds for all {samples} sample{'s' if samples != 1 else ''}."
+                status, next_steps = "compliant", "No action required."
+            results.append({
+                "regulation": rule.regulation,
+                "compliance_issues": issue,
+                "status": status,
+                "next_steps": next_steps,
+            })
+        return results
+
+    def evaluate_snapshot(self, sensor_data: Any) -> List[Dict]:
+        if not isinstance(sensor_data, Mapping):
+            return []
+        return self.evaluate(flatten_snapshot(sensor_data))
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_rule_engine() -> RuleEngine:
+    """Shared RuleEngine loaded from COMPLIANCE_RULES_PATH on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RuleEngine.from_file()
+        return _engine
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from compliance_cache import snapshot_key
+
+# Cosine similarity a new question needs with a cached one to reuse its answer
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.95"))
+# Cached answers kept in total; the least recently used ones go first
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "20000"))
+# Seconds an answer stays valid, sensor-driven answers age quickly
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+# Significant digits sensor values are rounded to when scoping entries
+CHAT_CACHE_QUANTIZE = int(os.getenv("CHAT_CACHE_QUANTIZE", "3"))
+# Dimensions of the random projection scanned before the exact check
+CHAT_CACHE_PROBE_DIM = int(os.getenv("CHAT_CACHE_PROBE_DIM", "128"))
+
+# Approximate candidates confirmed with the full vectors
+PROBE_CANDIDATES = 16
+
+
+class _Entry:
+    __slots__ = ("scope", "row", "question", "answer", "created_at")
+
+    def __init__(self, scope: str, row: int, question: str, answer: str, created_at: float):
+        self.scope = scope
+        self.row = row
+        self.question = question
+        self.answer = answer
+        self.created_at = created_at
+
+
+class _ScopeBlock:
+    """Vectors of the entries sharing one scope, rows grown by doubling."""
+
+    def __init__(self, index_version: str, dimensions: int, probe_dimensions: int):
+        self.index_version = index_version
+        self.vectors = np.empty((16, dimensions), dtype=np.float16)
+        self.probes = np.empty((16, probe_dimensions), dtype=np.float32)
+        self.created = np.empty(16, dtype=np.float64)
+        self.keys: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: int, vector: np.ndarray, probe: np.ndarray, created_at: float) -> int:
+        row = len(self.keys)
+        if row == len(self.created):
+            self.vectors = np.resize(self.vectors, (2 * row, self.vectors.shape[1]))
+            self.probes = np.resize(self.probes, (2 * row, self.probes.shape[1]))
+            self.created = np.resize(self.created, 2 * row)
+        self.vectors[row] = vector
+        self.probes[row] = probe
+        self.created[row] = created_at
+        self.keys.append(key)
+        return row
+
+    def remove(self, row: int) -> Optional[int]:
+        """Swap-remove a row; returns the key that moved into it, if any."""
+        last = len(self.keys) - 1
+        moved = None
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.probes[row] = self.probes[last]
+            self.created[row] = self.created[last]
+            moved = self.keys[row] = self.keys[last]
+        self.keys.pop()
+        return moved
+
+
+class SemanticCache:
+    """In-memory answer cache keyed on question embedding similarity.
+
+    Entries are partitioned by scope, the quantized sensor snapshot plus the
+    index version, since an answer only carries over to a paraphrased question
+    asked against the same readings and documents. A lookup scans only its
+    scope: first a low-dimensional random projection of every vector, then an
+    exact cosine check of the best few candidates against the full vectors, so
+    it stays well under a millisecond at tens of thousands of entries even
+    with 1536-dimensional embeddings. Eviction is LRU over all scopes plus a
+    TTL.
+    """
+
+    def __init__(self, threshold: float = CHAT_CACHE_THRESHOLD, capacity: int = CHAT_CACHE_SIZE,
+                 ttl: float = CHAT_CACHE_TTL, quantize_digits: Optional[int] = CHAT_CACHE_QUANTIZE,
+                 probe_dimensions: int = CHAT_CACHE_PROBE_DIM):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.quantize_digits = quantize_digits
+        self.probe_dimensions = probe_dimensions
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lookup_seconds = 0.0
+        self._blocks: Dict[str, _ScopeBlock] = {}
+        self._entries: Dict[int, _Entry] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._projection: Optional[np.ndarray] = None
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def scope(self, sensor_data: Dict, index_version: str) -> str:
+        return snapshot_key(sensor_data, index_version, self.quantize_digits)
+
+    def _prepare(self, embedding: Sequence[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        if self._projection is None or self._projection.shape[0] != len(vector):
+            if self._projection is not None:
+                self._clear()  # a different embedding model, nothing cached is comparable
+            probe = min(self.probe_dimensions, len(vector))
+            rng = np.random.default_rng(0)
+            self._projection = (rng.standard_normal((len(vector), probe)) / np.sqrt(probe)).astype(np.float32)
+        return vector, vector @ self._projection
+
+    def get(self, scope: str, embedding: Sequence[float]) -> Optional[str]:
+        """Cached answer of the most similar question in `scope`, if close enough."""
+        started = time.perf_counter()
+        with self._lock:
+            try:
+                block = self._blocks.get(scope)
+                if block is None or not len(block):
+                    self.misses += 1
+                    return None
+                vector, probe = self._prepare(embedding)
+                n = len(block)
+                approximate = block.probes[:n] @ probe
+                # Expired rows are never served, LRU eviction reclaims them later
+                approximate[block.created[:n] < time.time() - self.ttl] = -np.inf
+                if n > PROBE_CANDIDATES:
+                    candidates = np.argpartition(-approximate, PROBE_CANDIDATES)[:PROBE_CANDIDATES]
+                else:
+                    candidates = np.arange(n)
+                candidates = candidates[np.isfinite(approximate[candidates])]
+                if not len(candidates):
+                    self.misses += 1
+                    return None
+                exact = block.vectors[candidates].astype(np.float32) @ vector
+                best = int(exact.argmax())
+                if exact[best] < self.threshold:
+                    self.misses += 1
+                    return None
+                key = block.keys[int(candidates[best])]
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._entries[key].answer
+            finally:
+                self._lookup_seconds += time.perf_counter() - started
+
+    def put(self, scope: str, index_version: str, embedding: Sequence[float], question: str, answer: str) -> None:
+        with self._lock:
+            vector, probe = self._prepare(embedding)
+            block = self._blocks.get(scope)
+            if block is None:
+                block = self._blocks[scope] = _ScopeBlock(index_version, len(vector), len(probe))
+            now = time.time()
+            key = self._next_key
+            self._next_key += 1
+            row = block.add(key, vector, probe, now)
+            self._entries[key] = _Entry(scope, row, question, answer, now)
+            self._lru[key] = None
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        while self._lru:
+            oldest = next(iter(self._lru))
+            if len(self._lru) <= self.capacity and self._entries[oldest].created_at >= now - self.ttl:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        self._lru.pop(key, None)
+        block = self._blocks[entry.scope]
+        moved = block.remove(entry.row)
+        if moved is not None:
+            self._entries[moved].row = entry.row
+        if not len(block):
+            del self._blocks[entry.scope]
+
+    def purge(self, keep_version: str) -> int:
+        """Drop entries answered against any other index version."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if self._blocks[entry.scope].index_version != keep_version]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def _clear(self) -> None:
+        self._blocks.clear()
+        self._entries.clear()
+        self._lru.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "scopes": len(self._blocks),
+            "evictions": self.evictions,
+            "mean_lookup_ms": self._lookup_seconds * 1000 / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+class CacheSlot(NamedTuple):
+    """Where a chat turn's answer is looked up and stored."""
+    scope: str
+    index_version: str
+    embedding: List[float]
@@ -0,0 +1,225 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from telemetry_store import HVAC_COLUMNS
+
+# Buckets kept per tier and device: two days of minutes, 90 days of hours, two years of days
+ROLLUP_TIERS = {
+    "minute": (60, int(os.getenv("TELEMETRY_ROLLUP_MINUTES", "2880"))),
+    "hour": (3600, int(os.getenv("TELEMETRY_ROLLUP_HOURS", "2160"))),
+    "day": (86400, int(os.getenv("TELEMETRY_ROLLUP_DAYS", "730"))),
+}
+# Most source samples or buckets a range query reads before picking a coarser tier
+RANGE_SOURCE_BUDGET = int(os.getenv("TELEMETRY_RANGE_SOURCE_BUDGET", "20000"))
+
+ROLLUP_COLUMNS = list(HVAC_COLUMNS)
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `points` samples that keep
+    the visual shape of the series, peaks included. First and last are kept."""
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        # No middle buckets: just the end points (the first alone for a single point)
+        return np.array([0, n - 1][:max(points, 1)], dtype=np.int64)
+    every = (n - 2) / (points - 2)
+    edges = (np.arange(points - 1) * every).astype(np.int64) + 1
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of points/2 equal buckets, in order."""
+    n = len(y)
+    if points >= n or points < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, points // 2 + 1).astype(np.int64)
+    picks = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            bucket = y[start:stop]
+            picks.extend((start + int(bucket.argmin()), start + int(bucket.argmax())))
+    return np.unique(picks)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int, method: str = "lttb") -> np.ndarray:
+    if method == "minmax":
+        return minmax_indices(y, points)
+    return lttb_indices(x, y, points)
+
+
+class RollupTier:
+    """Fixed-size count/sum/min/max buckets of every column at one resolution.
+
+    Slots are addressed by bucket number modulo capacity, so appends, late
+    readings for a still-retained bucket and gaps in the data are all O(1)
+    and memory never grows; a slot is reset when a newer bucket claims it.
+    """
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.bucket_ids = np.full(capacity, -1, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        width = len(ROLLUP_COLUMNS)
+        self.sums = np.zeros((capacity, width))
+        self.mins = np.full((capacity, width), np.inf)
+        self.maxs = np.full((capacity, width), -np.inf)
+        self.first_id: Optional[int] = None
+        self.latest_id = -1
+
+    def _seen(self, lowest: int, highest: int) -> None:
+        self.latest_id = max(self.latest_id, highest)
+        self.first_id = lowest if self.first_id is None else min(self.first_id, lowest)
+
+    def _reset(self, slots, ids) -> None:
+        self.bucket_ids[slots] = ids
+        self.counts[slots] = 0
+        self.sums[slots] = 0.0
+        self.mins[slots] = np.inf
+        self.maxs[slots] = -np.inf
+
+    def add(self, timestamp: float, values: np.ndarray) -> None:
+        bucket_id = int(timestamp // self.seconds)
+        self._seen(bucket_id, bucket_id)
+        slot = bucket_id % self.capacity
+        held = int(self.bucket_ids[slot])
+        if held > bucket_id:
+            return  # the bucket already fell out of the retained window
+        if held < bucket_id:
+            self._reset(slot, bucket_id)
+        self.counts[slot] += 1
+        self.sums[slot] += values
+        np.minimum(self.mins[slot], values, out=self.mins[slot])
+        np.maximum(self.maxs[slot], values, out=self.maxs[slot])
+
+    def add_many(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Fold a (readings, columns) batch in with one reduction per bucket."""
+        ids = (timestamps // self.seconds).astype(np.int64)
+        order = np.argsort(ids, kind="stable")
+        ids, values = ids[order], values[order]
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        ids = ids[starts]
+        counts = np.diff(np.append(starts, len(order)))
+        sums = np.add.reduceat(values, starts, axis=0)
+        mins = np.minimum.reduceat(values, starts, axis=0)
+        maxs = np.maximum.reduceat(values, starts, axis=0)
+
+        # Buckets older than the retained window of this batch would collide on slots
+        keep = ids > ids[-1] - self.capacity
+        ids, counts, sums, mins, maxs = ids[keep], counts[keep], sums[keep], mins[keep], maxs[keep]
+        self._seen(int(ids[0]), int(ids[-1]))
+        slots = ids % self.capacity
+        held = self.bucket_ids[slots]
+        stale = held < ids
+        self._reset(slots[stale], ids[stale])
+        retained = held <= ids
+        slots = slots[retained]
+        self.counts[slots] += counts[retained]
+        self.sums[slots] += sums[retained]
+        self.mins[slots] = np.minimum(self.mins[slots], mins[retained])
+        self.maxs[slots] = np.maximum(self.maxs[slots], maxs[retained])
+
+    def covers(self, start: float) -> bool:
+        """Whether no bucket at or after `start` has been overwritten yet."""
+        if self.first_id is None:
+            return True
+        oldest = self.latest_id - self.capacity + 1
+        return self.first_id >= oldest or int(start // self.seconds) >= oldest
+
+    def range(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """Buckets with data between start and end, oldest first."""
+        first = max(int(start // self.seconds), self.latest_id - self.capacity + 1)
+        last = min(int(end // self.seconds), self.latest_id)
+        ids = np.arange(first, last + 1, dtype=np.int64) if last >= first else np.empty(0, dtype=np.int64)
+        slots = ids % self.capacity
+        present = (self.bucket_ids[slots] == ids) & (self.counts[slots] > 0)
+        ids, slots = ids[present], slots[present]
+        return {
+            "t": ids * self.seconds,
+            "count": self.counts[slots],
+            "sum": self.sums[slots],
+            "min": self.mins[slots],
+            "max": self.maxs[slots],
+        }
+
+
+def _merge_buckets(buckets: Dict[str, np.ndarray], points: int) -> Dict[str, np.ndarray]:
+    """Combine adjacent buckets exactly (counts and sums add, extremes extend)
+    until at most `points` remain."""
+    n = len(buckets["t"])
+    if n <= points:
+        return buckets
+    starts = np.flatnonzero(np.diff(np.arange(n) * points // n, prepend=-1))
+    return {
+        "t": buckets["t"][starts],
+        "count": np.add.reduceat(buckets["count"], starts),
+        "sum": np.add.reduceat(buckets["sum"], starts, axis=0),
+        "min": np.minimum.reduceat(buckets["min"], starts, axis=0),
+        "max": np.maximum.reduceat(buckets["max"], starts, axis=0),
+    }
+
+
+def raw_series(x: np.ndarray, columns: Dict[str, np.ndarray], names: List[str], points: int,
+               method: str) -> Dict[str, Dict[str, list]]:
+    """Per-column downsampled (t, v) series; each column keeps its own peaks."""
+    series = {}
+    for name in names:
+        y = columns[name].astype(np.float64)
+        picked = downsample(x, y, points, method)
+        series[name] = {"t": x[picked].tolist(), "v": y[picked].tolist()}
+    return series
+
+
+def rollup_series(buckets: Dict[str, np.ndarray], names: List[str], points: int) -> Dict[str, Dict[str, list]]:
+    """Per-column mean with min/max envelope, so peaks survive the rollup."""
+    buckets = _merge_buckets(buckets, points)
+    counts = buckets["count"][:, None]
+    means = np.divide(buckets["sum"], counts, out=np.zeros_like(buckets["sum"]), where=counts > 0)
+    times = buckets["t"].astype(np.float64).tolist()
+    series = {}
+    for name in names:
+        i = ROLLUP_COLUMNS.index(name)
+        series[name] = {
+            "t": times,
+            "v": means[:, i].tolist(),
+            "min": buckets["min"][:, i].tolist(),
+            "max": buckets["max"][:, i].tolist(),
+        }
+    return series
+
+
+def pick_tier(rollups: Dict[str, RollupTier], timestamps: np.ndarray, raw_dropped: bool,
+              start: float, end: float) -> str:
+    """Finest source that still holds `start` and stays within the source budget."""
+    in_range = int(np.count_nonzero((timestamps >= start) & (timestamps <= end)))
+    raw_covers = not raw_dropped or (len(timestamps) > 0 and timestamps.min() <= start)
+    if raw_covers and in_range <= RANGE_SOURCE_BUDGET:
+        return "raw"
+    for name, tier in rollups.items():
+        if tier.covers(start) and (end - start) / tier.seconds <= RANGE_SOURCE_BUDGET:
+            return name
+    return list(rollups)[-1]
+
+
+def step_range(store, start: int, end: int, names: List[str], points: int, method: str) -> Dict:
+    """Downsampled slice of a TelemetryStore, with the step index as x."""
+    stop = min(end + 1, len(store))
+    steps = np.arange(max(start, 0), stop, dtype=np.float64)
+    columns = {name: store.column(name)[max(start, 0):stop] for name in names}
+    return {"tier": "raw", "series": raw_series(steps, columns, names, points, method)}
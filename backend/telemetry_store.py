@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+from typing import Dict, List, Mapping, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from observability import span
+
+DATA_POINTS_PATH = os.getenv("DATA_POINTS_PATH", "data_points.csv")
+
+# The 13 HVAC columns of data_points.csv and the dtype each one is kept in
+HVAC_COLUMNS = {
+    "Absolute_Power_W": np.int64,
+    "Delta_Temperature_K": np.float64,
+    "Setpoint_Delta_T_K": np.float64,
+    "Temperature_1_Remote_K": np.float64,
+    "Temperature_2_Embedded_K": np.float64,
+    "Relative_Flow_Percentage": np.int64,
+    "Absolute_Flow_m3_s": np.float64,
+    "Flow_Volume_Total_m3": np.int64,
+    "Cooling_Energy_J": np.int64,
+    "Heating_Energy_J": np.int64,
+    "Operating_Time_h": np.int64,
+    "Active_Time_h": np.int64,
+    "Flow_Signal_Faulty": np.bool_,
+}
+
+# How the columns are grouped in the HVAC_Metrics payload
+HVAC_METRIC_GROUPS = {
+    "Power_Consumption": ("Absolute_Power_W",),
+    "Temperature_Differential": (
+        "Delta_Temperature_K",
+        "Setpoint_Delta_T_K",
+        "Temperature_1_Remote_K",
+        "Temperature_2_Embedded_K",
+    ),
+    "Flow_Performance": (
+        "Relative_Flow_Percentage",
+        "Absolute_Flow_m3_s",
+        "Flow_Volume_Total_m3",
+    ),
+    "Energy_Consumption": ("Cooling_Energy_J", "Heating_Energy_J"),
+    "Operational_Metrics": ("Operating_Time_h", "Active_Time_h"),
+    "System_Status": ("Flow_Signal_Faulty",),
+}
+
+
+def hvac_metrics_payload(columns: Mapping[str, np.ndarray], index: int) -> dict:
+    """HVAC_Metrics payload for one position of a set of column arrays."""
+    return {
+        "HVAC_Metrics": {
+            group: {name: columns[name][index].item() for name in names}
+            for group, names in HVAC_METRIC_GROUPS.items()
+        }
+    }
+
+
+class _Snapshot(NamedTuple):
+    mtime_ns: int
+    length: int
+    columns: Dict[str, np.ndarray]
+
+
+class TelemetryStore:
+    """Columnar, in-memory view of a telemetry CSV.
+
+    The file is parsed once into one typed NumPy array per column and only
+    re-read when its mtime changes, so step lookups are plain array indexing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        # (mtime_ns, stop) -> hash of rows [0, stop), dropped when the file is re-read
+        self._hashes: Dict[tuple, str] = {}
+
+    def _load(self) -> _Snapshot:
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.mtime_ns == mtime_ns:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.mtime_ns == mtime_ns:
+                return snapshot
+            with span("csv_load", path=self.path):
+                df = pd.read_csv(
+                    self.path, usecols=list(HVAC_COLUMNS), dtype=HVAC_COLUMNS, float_precision="round_trip"
+                )
+                columns = {name: df[name].to_numpy(dtype=dtype) for name, dtype in HVAC_COLUMNS.items()}
+            for array in columns.values():
+                array.setflags(write=False)
+            snapshot = _Snapshot(mtime_ns=mtime_ns, length=len(df), columns=columns)
+            self._snapshot = snapshot
+            self._hashes = {}
+            return snapshot
+
+    def __len__(self) -> int:
+        return self._load().length
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(HVAC_COLUMNS)
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only array holding every value of a column."""
+        return self._load().columns[name]
+
+    def random_step(self) -> int:
+        return int(np.random.randint(self._load().length))
+
+    def hvac_metrics(self, step: int) -> dict:
+        """HVAC_Metrics payload for a single step, read straight from the arrays."""
+        snapshot = self._load()
+        if step < 0 or step >= snapshot.length:
+            raise IndexError(step)
+        return hvac_metrics_payload(snapshot.columns, step)
+
+    def range_hash(self, stop: Optional[int] = None) -> str:
+        """Content hash of rows [0, stop), every row by default.
+
+        Equal hashes of a prefix mean those rows are unchanged, so only what
+        was appended after them is new.
+        """
+        snapshot = self._load()
+        stop = snapshot.length if stop is None else min(stop, snapshot.length)
+        key = (snapshot.mtime_ns, stop)
+        digest = self._hashes.get(key)
+        if digest is None:
+            hasher = hashlib.blake2b(f"{stop}".encode(), digest_size=16)
+            for name in HVAC_COLUMNS:
+                hasher.update(snapshot.columns[name][:stop].tobytes())
+            digest = self._hashes[key] = hasher.hexdigest()
+        return digest
+
+    def rows(self) -> List[list]:
+        """All rows as plain Python lists, in column order."""
+        columns = self._load().columns
+        return list(map(list, zip(*(columns[name].tolist() for name in HVAC_COLUMNS))))
+
+
+_stores: Dict[str, TelemetryStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_telemetry_store(path: str = DATA_POINTS_PATH) -> TelemetryStore:
+    """Shared TelemetryStore for a CSV path, created on first use."""
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(key, TelemetryStore(path))
+    return store
@@ -0,0 +1,234 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from telemetry_store import HVAC_COLUMNS, TelemetryStore
+
+PERCENTILES = (5, 25, 50, 75, 95)
+# Deviation of Delta_Temperature_K from its setpoint (K) that counts as an episode
+SETPOINT_DEVIATION_K = 1.0
+# Episodes listed per kind in the digest; the rest are only counted
+MAX_EPISODES = 5
+
+
+def _numeric_columns() -> List[str]:
+    return [name for name, dtype in HVAC_COLUMNS.items() if dtype is not np.bool_]
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Rolling mean along axis 0 of a (rows, columns) array, via cumulative sums."""
+    cumsum = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), values]), axis=0)
+    return (cumsum[window:] - cumsum[:-window]) / window
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """(start, stop) step pairs of every run of True in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.column_stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _episodes(mask: np.ndarray, magnitude: Optional[np.ndarray] = None, offset: int = 0) -> Dict:
+    runs = _runs(mask)
+    starts, stops = runs[:, 0], runs[:, 1]
+    lengths = stops - starts
+    if magnitude is not None and len(runs):
+        # Per-run reductions over the masked steps only, no Python loop over steps
+        masked = np.flatnonzero(mask)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        means = np.add.reduceat(magnitude[masked], offsets) / lengths
+        peaks = np.maximum.reduceat(np.abs(magnitude[masked]), offsets)
+        order = np.argsort(-peaks, kind="stable")
+    else:
+        order = np.argsort(-lengths, kind="stable")
+
+    episodes = []
+    for i in order[:MAX_EPISODES]:
+        episode = {"start_step": offset + int(starts[i]), "end_step": offset + int(stops[i] - 1),
+                   "length": int(lengths[i])}
+        if magnitude is not None:
+            episode["mean_deviation"] = float(means[i])
+            episode["max_abs_deviation"] = float(peaks[i])
+        episodes.append(episode)
+    return {"count": len(runs), "steps": int(mask.sum()), "largest": episodes}
+
+
+def summarize_telemetry(store: TelemetryStore, window: Optional[int] = None, start: int = 0,
+                        stop: Optional[int] = None) -> Dict:
+    """Vectorized statistics over steps [start, stop), the whole series by
+    default, independent of its length.
+
+    Returns per-column distribution stats and linear trend, the peak and
+    trough rolling windows of each column, setpoint-deviation episodes for
+    Delta_Temperature_K and flow-signal fault episodes. Steps are numbered
+    from the start of the series, not of the range.
+    """
+    columns = _numeric_columns()
+    values = np.column_stack([store.column(name)[start:stop].astype(np.float64) for name in columns])
+    rows = values.shape[0]
+    if rows == 0:
+        return {"rows": 0, "first_step": start, "columns": {}}
+    window = min(rows, window or max(1, rows // 10))
+
+    percentiles = np.percentile(values, PERCENTILES, axis=0)
+    # Least-squares slope per column against the step index
+    steps = np.arange(rows, dtype=np.float64)
+    centered = steps - steps.mean()
+    denominator = float((centered ** 2).sum()) or 1.0
+    slopes = centered @ (values - values.mean(axis=0)) / denominator
+
+    rolling = _rolling_mean(values, window)
+    peak_starts = rolling.argmax(axis=0)
+    trough_starts = rolling.argmin(axis=0)
+
+    summary_columns = {}
+    for i, name in enumerate(columns):
+        summary_columns[name] = {
+            "min": float(values[:, i].min()),
+            "max": float(values[:, i].max()),
+            "mean": float(values[:, i].mean()),
+            "std": float(values[:, i].std()),
+            "percentiles": {f"p{p}": float(percentiles[j, i]) for j, p in enumerate(PERCENTILES)},
+            "first": float(values[0, i]),
+            "last": float(values[-1, i]),
+            "slope_per_step": float(slopes[i]),
+            "peak_window": {
+                "start_step": start + int(peak_starts[i]),
+                "end_step": start + int(peak_starts[i] + window - 1),
+                "mean": float(rolling[peak_starts[i], i]),
+            },
+            "trough_window": {
+                "start_step": start + int(trough_starts[i]),
+                "end_step": start + int(trough_starts[i] + window - 1),
+                "mean": float(rolling[trough_starts[i], i]),
+            },
+        }
+
+    deviation = _deviation(store, start, stop)
+    return {
+        "rows": rows,
+        "first_step": start,
+        "window": window,
+        "columns": summary_columns,
+        "setpoint_deviation": _episodes(np.abs(deviation) > SETPOINT_DEVIATION_K, deviation, start),
+        "flow_signal_faults": _episodes(store.column("Flow_Signal_Faulty")[start:stop], offset=start),
+    }
+
+
+def _deviation(store: TelemetryStore, start: int, stop: Optional[int]) -> np.ndarray:
+    return store.column("Delta_Temperature_K")[start:stop] - store.column("Setpoint_Delta_T_K")[start:stop]
+
+
+def _episode_totals(mask: np.ndarray, previous: Optional[Dict]) -> Dict:
+    count = len(_runs(mask))
+    # An episode still running at the end of the previous range continues into this one
+    if previous and previous["open"] and len(mask) and mask[0]:
+        count -= 1
+    return {
+        "count": (previous["count"] if previous else 0) + count,
+        "steps": (previous["steps"] if previous else 0) + int(mask.sum()),
+        "open": bool(mask[-1]) if len(mask) else bool(previous and previous["open"]),
+    }
+
+
+def accumulate_totals(store: TelemetryStore, start: int = 0, stop: Optional[int] = None,
+                      previous: Optional[Dict] = None) -> Dict:
+    """Running totals of steps [start, stop) folded into `previous`, the totals
+    of the steps before `start`.
+
+    Unlike summarize_telemetry these merge exactly, so statistics of a long
+    history are carried forward and only newly appended steps are read.
+    """
+    totals = {"rows": previous["rows"] if previous else 0, "columns": {}}
+    rows = len(store.column("Delta_Temperature_K")[start:stop])
+    for name in _numeric_columns():
+        values = store.column(name)[start:stop].astype(np.float64)
+        before = previous["columns"][name] if previous else None
+        if not rows:
+            totals["columns"][name] = before
+            continue
+        column = {
+            "sum": float(values.sum()),
+            "sum_squares": float((values ** 2).sum()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "first": float(values[0]),
+            "last": float(values[-1]),
+        }
+        if before:
+            column["sum"] += before["sum"]
+            column["sum_squares"] += before["sum_squares"]
+            column["min"] = min(column["min"], before["min"])
+            column["max"] = max(column["max"], before["max"])
+            column["first"] = before["first"]
+        totals["columns"][name] = column
+    totals["rows"] += rows
+    deviation = np.abs(_deviation(store, start, stop)) > SETPOINT_DEVIATION_K
+    totals["setpoint_deviation"] = _episode_totals(deviation, previous and previous["setpoint_deviation"])
+    totals["flow_signal_faults"] = _episode_totals(
+        store.column("Flow_Signal_Faulty")[start:stop], previous and previous["flow_signal_faults"]
+    )
+    return totals
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def format_digest(summary: Dict) -> str:
+    """Compact text rendering of summarize_telemetry for LLM prompts."""
+    if not summary["rows"]:
+        return "No samples."
+    first = summary.get("first_step", 0)
+    lines = [f"{summary['rows']} samples (steps {first}-{first + summary['rows'] - 1}), "
+             f"rolling window {summary.get('window')} steps."]
+    for name, stats in summary["columns"].items():
+        p = stats["percentiles"]
+        lines.append(
+            f"{name}: min {_fmt(stats['min'])}, max {_fmt(stats['max'])}, mean {_fmt(stats['mean'])}, "
+            f"std {_fmt(stats['std'])}, p5/p50/p95 {_fmt(p['p5'])}/{_fmt(p['p50'])}/{_fmt(p['p95'])}, "
+            f"first {_fmt(stats['first'])}, last {_fmt(stats['last'])}, trend {_fmt(stats['slope_per_step'])}/step, "
+            f"peak window steps {stats['peak_window']['start_step']}-{stats['peak_window']['end_step']} "
+            f"(mean {_fmt(stats['peak_window']['mean'])}), trough window steps "
+            f"{stats['trough_window']['start_step']}-{stats['trough_window']['end_step']} "
+            f"(mean {_fmt(stats['trough_window']['mean'])})"
+        )
+
+    deviation = summary["setpoint_deviation"]
+    lines.append(
+        f"Delta_Temperature_K vs Setpoint_Delta_T_K deviations beyond {SETPOINT_DEVIATION_K} K: "
+        f"{deviation['count']} episodes covering {deviation['steps']} steps."
+    )
+    for episode in deviation["largest"]:
+        lines.append(
+            f"  steps {episode['start_step']}-{episode['end_step']}: mean deviation "
+            f"{_fmt(episode['mean_deviation'])} K, max |deviation| {_fmt(episode['max_abs_deviation'])} K"
+        )
+
+    faults = summary["flow_signal_faults"]
+    lines.append(f"Flow_Signal_Faulty: {faults['count']} episodes covering {faults['steps']} steps.")
+    for episode in faults["largest"]:
+        lines.append(f"  steps {episode['start_step']}-{episode['end_step']} ({episode['length']} steps)")
+    return "\n".join(lines)
+
+
+def format_totals(totals: Dict) -> str:
+    """Compact text rendering of accumulate_totals for LLM prompts."""
+    rows = totals["rows"]
+    if not rows:
+        return "No samples."
+    lines = [f"{rows} samples (steps 0-{rows - 1})."]
+    for name, stats in totals["columns"].items():
+        mean = stats["sum"] / rows
+        std = max(stats["sum_squares"] / rows - mean ** 2, 0.0) ** 0.5
+        lines.append(
+            f"{name}: min {_fmt(stats['min'])}, max {_fmt(stats['max'])}, mean {_fmt(mean)}, std {_fmt(std)}, "
+            f"first {_fmt(stats['first'])}, last {_fmt(stats['last'])}"
+        )
+    deviation = totals["setpoint_deviation"]
+    lines.append(
+        f"Delta_Temperature_K vs Setpoint_Delta_T_K deviations beyond {SETPOINT_DEVIATION_K} K: "
+        f"{deviation['count']} episodes covering {deviation['steps']} steps."
+    )
+    faults = totals["flow_signal_faults"]
+    lines.append(f"Flow_Signal_Faulty: {faults['count']} episodes covering {faults['steps']} steps.")
+    return "\n".join(lines)
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain.chains")
+httpx = pytest.importorskip("httpx")
+
+QUESTION = "Does the current flow rate comply with the ventilation requirements?"
+
+
+@pytest.fixture(scope="module")
+def chat(tmp_path_factory):
+    """Posts chat requests to the app, started once for the module, and returns their X-Cache headers."""
+    from benchmarks.bench_endpoints import _isolate, _stub_clients
+
+    # Every store under a temporary directory, the OpenAI clients replaced by offline stubs
+    _isolate(str(tmp_path_factory.mktemp("app")))
+    _stub_clients(0.0)
+    from main import app
+
+    loop = asyncio.new_event_loop()
+    lifespan = app.router.lifespan_context(app)
+    loop.run_until_complete(lifespan.__aenter__())
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def post(requests):
+        headers = []
+        for body in requests:
+            response = await client.post("/chat", json=body)
+            response.raise_for_status()
+            headers.append(response.headers["X-Cache"])
+        return headers
+
+    yield lambda *requests: loop.run_until_complete(post(requests))
+    loop.run_until_complete(client.aclose())
+    loop.run_until_complete(lifespan.__aexit__(None, None, None))
+    # Let the background tasks the app cancelled on shutdown finish before the loop closes
+    pending = asyncio.all_tasks(loop)
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    loop.close()
+
+
+def test_repeated_question_on_the_same_readings_hits(chat):
+    sensor_data = {"HVAC_Metrics": {"Power_Consumption": {"Absolute_Power_W": 1200}}}
+    body = {"query": QUESTION, "sensor_data": sensor_data}
+
+    assert chat(body, body) == ["miss", "hit"]
+
+
+def test_turns_answered_from_a_replay_step_bypass_the_cache(chat):
+    body = {"query": QUESTION}
+
+    assert chat(body, body) == ["bypass", "bypass"]
@@ -0,0 +1,35 @@
+import pytest
+
+from chunking import StructuredChunker, section_id
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("4.2.1 Ventilation rates", "4.2.1"),
+    ("12. Inspections", "12"),
+    ("Section 4.2 General", "4.2"),
+    ("Article 7 Scope", "Article 7"),
+    ("ANNEX B Test methods", "Annex B"),
+    ("section 5 of this regulation applies to all units", None),
+    ("Schedule a technician visit before the heating season.", None),
+    ("3 Pa across the filter at rated flow", None),
+    ("12 months after commissioning the unit shall be inspected", None),
+    ("20 pascal at the outlet", None),
+    ("15 litres per second per occupant.", None),
+])
+def test_section_id(line, expected):
+    assert section_id(line) == expected
+
+
+def test_wrapped_numeric_line_stays_in_its_clause():
+    page = (
+        "4.2 Ventilation rates\n"
+        "Occupied rooms shall be supplied with outdoor air at a rate of at least\n"
+        "15 litres per second per person, measured at the supply terminal, and\n"
+        "20 pascal of static pressure shall be maintained at the outlet.\n"
+        "4.3 Filtration\n"
+        "Supply air shall pass through filters of class ePM1 50% or better."
+    )
+    chunks = list(StructuredChunker(min_tokens=0).chunks([(1, page)]))
+
+    assert [chunk.section for chunk in chunks] == ["4.2", "4.3"]
+    assert "at least\n15 litres per second" in chunks[0].text
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from compliance_schema import ComplianceOutputError, _repair, parse_compliance_results
+
+ITEM = '{"regulation": "R1", "compliance_issues": "None", "status": "compliant", "next_steps": "Keep logging."}'
+
+
+@pytest.mark.parametrize("text", [
+    f"```json\n[{ITEM}]\n```",
+    f"Here is the report:\n[{ITEM}]",
+    f"[{ITEM},]",
+    f'[{ITEM}, {{"regulation": "R2", "compliance_iss',
+    f"[{ITEM}]\nLet me know if you need more detail.",
+])
+def test_repair(text):
+    assert json.loads(_repair(text)) == [json.loads(ITEM)]
+
+
+def test_repair_ignores_brackets_and_quotes_inside_strings():
+    item = '{"regulation": "EN 16798 [part 1]", "next_steps": "Set \\"eco\\" mode {night}"}'
+    assert json.loads(_repair(f'[{item}, {{"regulation": "cut')) == [json.loads(item)]
+
+
+def test_parse_normalizes_status_and_unwraps_a_single_list():
+    text = json.dumps({"results": [{**json.loads(ITEM), "status": "Non Compliant"}]})
+    assert parse_compliance_results(text)[0]["status"] == "non-compliant"
+
+
+@pytest.mark.parametrize("text", ["", "No issues found.", f'[{ITEM.replace("compliant", "unknown")}]'])
+def test_parse_rejects_what_repair_cannot_fix(text):
+    with pytest.raises(ComplianceOutputError):
+        parse_compliance_results(text)
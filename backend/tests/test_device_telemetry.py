@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from device_telemetry import DEVICE_COLUMNS, DeviceRingBuffer, DeviceTelemetry, TelemetryIngestError
+
+
+def _reading(timestamp, power=100.0, **extra):
+    reading = {name: False if dtype is np.bool_ else 1.0 for name, dtype in DEVICE_COLUMNS.items()}
+    return {**reading, "Absolute_Power_W": power, "timestamp": timestamp, **extra}
+
+
+def test_ring_buffer_wraps_keeping_the_newest():
+    buffer = DeviceRingBuffer(capacity=4)
+    for n in range(6):
+        buffer.append(_reading(float(n), power=float(n)))
+
+    assert len(buffer) == 4
+    assert buffer.total == 6
+    assert [buffer.reading(i)[0] for i in range(4)] == [2.0, 3.0, 4.0, 5.0]
+    assert buffer.latest()[0] == 5.0
+    with pytest.raises(IndexError):
+        buffer.reading(4)
+
+
+def test_oversized_batch_keeps_its_newest_readings_and_rolls_up_all():
+    buffer = DeviceRingBuffer(capacity=3)
+    buffer.append_many([_reading(n * 10.0, power=float(n)) for n in range(8)])
+
+    timestamps, columns = buffer.snapshot()
+    assert timestamps.tolist() == [50.0, 60.0, 70.0]
+    assert columns["Absolute_Power_W"].tolist() == [5.0, 6.0, 7.0]
+    assert buffer.rollups["minute"].range(0, 120)["count"].sum() == 8
+
+
+def test_range_falls_back_to_rollups_once_raw_readings_are_gone():
+    buffer = DeviceRingBuffer(capacity=10)
+    buffer.append_many([_reading(n * 30.0, power=float(n)) for n in range(40)])
+
+    raw = buffer.range(900.0, 1170.0, ["Absolute_Power_W"], points=100)
+    assert raw["tier"] == "raw"
+    assert raw["series"]["Absolute_Power_W"]["v"] == [float(n) for n in range(30, 40)]
+
+    rolled = buffer.range(0.0, 1170.0, ["Absolute_Power_W"], points=100)
+    assert rolled["tier"] == "minute"
+    series = rolled["series"]["Absolute_Power_W"]
+    assert series["v"][0] == 0.5
+    assert series["max"][-1] == 39.0
+
+
+def test_ingest_stores_nothing_when_a_later_reading_is_invalid():
+    telemetry = DeviceTelemetry(retention=10)
+    readings = [_reading(1.0, device_id="a"), _reading(2.0, device_id="b", Flow_Signal_Faulty="False")]
+
+    with pytest.raises(TelemetryIngestError):
+        telemetry.ingest(readings)
+    assert telemetry.devices() == []
+
+
+def test_ingest_rejects_a_batch_over_the_device_limit():
+    telemetry = DeviceTelemetry(retention=10, max_devices=2)
+    telemetry.ingest([_reading(1.0, device_id="a")])
+
+    with pytest.raises(TelemetryIngestError):
+        telemetry.ingest([_reading(2.0, device_id="a"), _reading(2.0, device_id="b"), _reading(2.0, device_id="c")])
+    assert [device["device_id"] for device in telemetry.devices()] == ["a"]
+    assert telemetry.latest("a")[1] == 1.0
@@ -0,0 +1,30 @@
+from langchain_core.documents import Document
+
+from hybrid_retrieval import HybridRetriever
+from tokens import count_tokens
+
+
+def test_pack_truncated_first_passage_fills_the_budget():
+    budget = 60
+    oversized = Document("Ventilation rates " + "air " * 400, metadata={"source": "large.pdf", "page": 1})
+    small = Document("Filters shall be replaced yearly.", metadata={"source": "small.pdf", "page": 2})
+    retriever = HybridRetriever(vectorstore=None)
+
+    packed = retriever._pack("ventilation rates", [oversized, small], budget)
+
+    assert "Filters shall be replaced" not in packed
+    label = retriever._label(oversized)
+    body = packed.split(label, 1)[1]
+    assert count_tokens(body.strip()) + count_tokens(label) <= budget
+
+
+def test_pack_keeps_passages_within_budget():
+    docs = [
+        Document(f"Clause {n}. Supply air shall be filtered at grade {n}.", metadata={"source": f"doc{n}.pdf"})
+        for n in range(5)
+    ]
+    retriever = HybridRetriever(vectorstore=None)
+
+    packed = retriever._pack("supply air filtered", docs, 40)
+
+    assert 0 < packed.count("Clause") < len(docs)
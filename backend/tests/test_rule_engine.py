@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from rule_engine import Rule, RuleEngine
+
+
+def _engine():
+    return RuleEngine([
+        Rule(id="flow", regulation="Flow within range", metric="Relative_Flow_Percentage", op="between",
+             value=[20, 100], next_steps="Check the damper."),
+        Rule(id="setpoint", regulation="Setpoint tracked", metric="Delta_Temperature_K", minus="Setpoint_Delta_T_K",
+             abs=True, op="<=", value=2, next_steps="Retune the controller."),
+        Rule(id="fault", regulation="Flow signal healthy", metric="Flow_Signal_Faulty", op="==", value=False,
+             next_steps="Replace the flow sensor."),
+    ])
+
+
+def test_snapshot_results_use_the_llm_schema():
+    snapshot = {"HVAC_Metrics": {
+        "Flow_Performance": {"Relative_Flow_Percentage": 12, "Flow_Signal_Faulty": False},
+        "Temperature_Differential": {"Delta_Temperature_K": 5.5, "Setpoint_Delta_T_K": 5.0},
+    }}
+    results = {result["regulation"]: result for result in _engine().evaluate_snapshot(snapshot)}
+
+    assert results["Flow within range"]["status"] == "non-compliant"
+    assert results["Flow within range"]["next_steps"] == "Check the damper."
+    assert results["Setpoint tracked"]["status"] == "compliant"
+    assert results["Flow signal healthy"]["status"] == "compliant"
+    assert set(results["Flow signal healthy"]) == {"regulation", "compliance_issues", "status", "next_steps"}
+
+
+def test_rules_missing_a_column_are_skipped():
+    results = _engine().evaluate_snapshot({"HVAC_Metrics": {"Delta_Temperature_K": 5.5}})
+    assert results == []
+
+
+def test_series_count_violating_samples():
+    columns = {
+        "Delta_Temperature_K": np.array([5.0, 9.0, 5.5, 1.0]),
+        "Setpoint_Delta_T_K": np.array([5.0, 5.0, 5.0, 5.0]),
+    }
+    [result] = _engine().evaluate(columns)
+
+    assert result["status"] == "non-compliant"
+    assert "2 of 4 samples" in result["compliance_issues"]
+
+
+@pytest.mark.parametrize("rule", [
+    {"op": "~", "value": 1},
+    {"op": "<", "value": 1, "other": "Setpoint_Delta_T_K"},
+    {"op": "<"},
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        Rule(id="bad", regulation="Bad", metric="Delta_Temperature_K", next_steps="", **rule)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+READINGS = {"HVAC_Metrics": {"Power_Consumption": {"Absolute_Power_W": 1200}}}
+
+
+def _embedding(seed, dimensions=256):
+    return np.random.default_rng(seed).standard_normal(dimensions)
+
+
+def test_paraphrase_hits_only_in_its_own_scope():
+    cache = SemanticCache(threshold=0.95)
+    scope = cache.scope(READINGS, "1")
+    question = _embedding(0)
+    cache.put(scope, "1", question, "What is the flow?", "Flow is fine.")
+    paraphrase = question + 0.05 * _embedding(1)
+
+    assert cache.get(scope, paraphrase) == "Flow is fine."
+    assert cache.get(scope, _embedding(2)) is None
+    other = cache.scope({"HVAC_Metrics": {"Power_Consumption": {"Absolute_Power_W": 1500}}}, "1")
+    assert cache.get(other, question) is None
+
+
+def test_quantized_readings_share_a_scope():
+    cache = SemanticCache(quantize_digits=3)
+    nearby = {"HVAC_Metrics": {"Power_Consumption": {"Absolute_Power_W": 1200.4}}}
+
+    assert cache.scope(READINGS, "1") == cache.scope(nearby, "1")
+    assert cache.scope(READINGS, "1") != cache.scope(READINGS, "2")
+
+
+def test_expired_and_purged_entries_are_not_served():
+    cache = SemanticCache(ttl=-1)
+    scope = cache.scope(READINGS, "1")
+    cache.put(scope, "1", _embedding(0), "q", "a")
+    assert cache.get(scope, _embedding(0)) is None
+
+    cache = SemanticCache()
+    cache.put(scope, "1", _embedding(0), "q", "a")
+    assert cache.purge(keep_version="2") == 1
+    assert cache.get(scope, _embedding(0)) is None
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from telemetry_rollup import ROLLUP_COLUMNS, RollupTier, _merge_buckets, lttb_indices
+
+
+@pytest.mark.parametrize("points", [1, 2, 3, 10])
+def test_lttb_keeps_the_end_points(points):
+    x = np.arange(100, dtype=np.float64)
+    picked = lttb_indices(x, np.sin(x / 7), points).tolist()
+
+    assert len(picked) == points
+    assert picked[0] == 0
+    if points > 1:
+        assert picked[-1] == 99
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[613] = 50.0
+    picked = lttb_indices(x, y, 20)
+
+    assert 613 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_lttb_returns_every_sample_when_asked_for_more():
+    x = np.arange(5, dtype=np.float64)
+    assert lttb_indices(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def _values(n, seed=0):
+    return np.random.default_rng(seed).uniform(0, 100, (n, len(ROLLUP_COLUMNS)))
+
+
+def test_rollup_batch_matches_one_by_one():
+    timestamps = np.sort(np.random.default_rng(1).uniform(0, 3600, 500))
+    values = _values(500)
+    single, batch = RollupTier(60, 120), RollupTier(60, 120)
+    for timestamp, row in zip(timestamps, values):
+        single.add(timestamp, row)
+    batch.add_many(timestamps, values)
+
+    expected, got = single.range(0, 3600), batch.range(0, 3600)
+    for field in ("t", "count", "sum", "min", "max"):
+        np.testing.assert_allclose(got[field], expected[field])
+    assert got["count"].sum() == 500
+
+
+def test_rollup_wraps_and_drops_late_readings_out_of_the_window():
+    tier = RollupTier(60, 10)
+    row = np.ones(len(ROLLUP_COLUMNS))
+    for minute in range(25):
+        tier.add(minute * 60.0, row)
+    # Minute 3 shares a slot with minute 23 and is no longer retained
+    tier.add(3 * 60.0, row * 100)
+
+    buckets = tier.range(0, 25 * 60)
+    assert buckets["t"].tolist() == [minute * 60 for minute in range(15, 25)]
+    assert buckets["max"].max() == 1.0
+    assert not tier.covers(0)
+    assert tier.covers(15 * 60)
+
+
+def test_merged_buckets_keep_counts_and_extremes():
+    tier = RollupTier(60, 100)
+    values = _values(90, seed=2)
+    tier.add_many(np.arange(90) * 60.0, values)
+    buckets = tier.range(0, 90 * 60)
+    merged = _merge_buckets(buckets, 7)
+
+    assert len(merged["t"]) == 7
+    assert merged["count"].sum() == 90
+    np.testing.assert_allclose(merged["sum"].sum(axis=0), values.sum(axis=0))
+    np.testing.assert_allclose(merged["max"].max(axis=0), values.max(axis=0))
+    np.testing.assert_allclose(merged["min"].min(axis=0), values.min(axis=0))
@@ -0,0 +1,49 @@
+import logging
+import os
+import threading
+
+# tiktoken encoding of the chat model (gpt-4o uses o200k_base)
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """The tiktoken encoding, or None when it cannot be loaded (tiktoken
+    missing, or its BPE file not cached and no network)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding {TOKEN_ENCODING} unavailable, estimating tokens: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        # ~4 characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` within `max_tokens`."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        # Inverse of count_tokens' estimate, so the prefix counts as at most max_tokens
+        return text[:max_tokens * 4 - 1]
+    ids = encoding.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else encoding.decode(ids[:max_tokens])
@@ -66,8 +66,8 @@ export default function Navbar() {
                       onClick={async (e) => {
                         e.preventDefault();
                         try {
-                          const response = await axios.get(`${BASE_URL}/documents`);
-                          const uniqueFilenames = [...new Set(response.data.documents.map((doc: { source: string }) => doc.source.split('/').pop()))];
+                          const response = await axios.get(`${BASE_URL}/documents/sources`);
+                          const uniqueFilenames = [...new Set(response.data.sources.map((doc: { source: string }) => doc.source.split('/').pop()))];
                           const filenames = uniqueFilenames.join(', \n');
                           const message = response.data.count > 0 ? `Following documents have been uploaded: \n${filenames}` : 'No documents have been uploaded yet.';
                           toast.success(message, {
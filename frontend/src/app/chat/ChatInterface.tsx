@@ -23,6 +23,8 @@ export default function ChatInterface() {
   const [inputMessage, setInputMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Conversation kept by the backend; each request only carries the new message
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -42,23 +44,45 @@ export default function ChatInterface() {
       timestamp: new Date()
     };
     
-    const updatedMessages = [...messages, userMessage];
-    setMessages(updatedMessages);
+    setMessages(prev => [...prev, userMessage]);
     setInputMessage('');
     
+    const replyId = Date.now() + 1;
+    let replyStarted = false;
+
     try {
       setIsLoading(true);
-      const response = await fetchChatResponse(inputMessage, updatedMessages);
-      setMessages(prev => [...prev, { 
-        id: Date.now(),
-        content: response,
-        isUser: false,
-        timestamp: new Date()
-      }]);
+      // Render tokens as they arrive; the reply bubble replaces the spinner on the first one
+      await fetchChatResponse(inputMessage, sessionIdRef.current, (sessionId) => {
+        sessionIdRef.current = sessionId;
+      }, (token) => {
+        if (!replyStarted) {
+          replyStarted = true;
+          setIsLoading(false);
+          setMessages(prev => [...prev, {
+            id: replyId,
+            content: token,
+            isUser: false,
+            timestamp: new Date()
+          }]);
+          return;
+        }
+        setMessages(prev => prev.map(msg =>
+          msg.id === replyId ? { ...msg, content: msg.content + token } : msg
+        ));
+      });
+      if (!replyStarted) {
+        setMessages(prev => [...prev, {
+          id: replyId,
+          content: "No response received",
+          isUser: false,
+          timestamp: new Date()
+        }]);
+      }
     } catch (error) {
       console.error("Error fetching response:", error);
-      setMessages(prev => [...prev, { 
-        id: Date.now(),
+      setMessages(prev => [...prev.filter(msg => msg.id !== replyId), { 
+        id: replyId,
         content: "Sorry, I couldn't process your request. Please try again later.",
         isUser: false,
         timestamp: new Date()
@@ -138,34 +162,71 @@ export default function ChatInterface() {
   );
 }
 
-// Modify fetchChatResponse to include conversation history
-async function fetchChatResponse(query: string, messageHistory: Message[]): Promise<string> {
+// Streams the reply from /chat/stream (Server-Sent Events), calling onToken for each chunk.
+// The backend keeps the conversation: the first reply starts a session, later requests reuse it.
+async function fetchChatResponse(
+  query: string,
+  sessionId: string | null,
+  onSession: (sessionId: string) => void,
+  onToken: (token: string) => void
+): Promise<string> {
   try {
-    // Format conversation history to send to the API
-    const conversationHistory = messageHistory.map(msg => ({
-      content: msg.content,
-      isUser: msg.isUser
-    }));
-
-    console.log("History", conversationHistory);
-
-    const response = await fetch(`${process.env.NEXT_PUBLIC_BASE_URL}/chat`, {
+    const response = await fetch(`${process.env.NEXT_PUBLIC_BASE_URL}/chat/stream`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
       },
       body: JSON.stringify({ 
         query,
-        conversation_history: conversationHistory 
+        session_id: sessionId
       }),
     });
     
-    if (!response.ok) {
+    if (!response.ok || !response.body) {
       throw new Error(`HTTP error! Status: ${response.status}`);
     }
-    
-    const data = await response.json();
-    return data.response || "No response received";
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fullResponse = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === 'session') {
+          onSession(payload.session_id);
+        } else if (event === 'token') {
+          fullResponse += payload.token;
+          onToken(payload.token);
+        } else if (event === 'done') {
+          fullResponse = payload.response;
+        } else if (event === 'error') {
+          throw new Error(payload.detail);
+        }
+      }
+    }
+
+    return fullResponse;
   } catch (error) {
     console.error("API request error:", error);
     throw error;
@@ -1,8 +1,33 @@
 "use client";
 import { useState } from 'react';
 
+interface IngestionJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  files_total: number;
+  files_done: number;
+  error: string | null;
+}
+
+// Polls a background ingestion job until it finishes
+async function waitForIngestion(jobId: string, onProgress: (job: IngestionJob) => void): Promise<IngestionJob> {
+  while (true) {
+    const response = await fetch(`${process.env.NEXT_PUBLIC_BASE_URL}/index-pdf/${jobId}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch indexing status');
+    }
+    const job: IngestionJob = await response.json();
+    onProgress(job);
+    if (job.status === 'done' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+}
+
 export default function FileUpload() {
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState('');
   const [isSuccess, setIsSuccess] = useState(false);
   const [uploadedFiles, setUploadedFiles] = useState<string[]>([]);
 
@@ -29,7 +54,13 @@ export default function FileUpload() {
         }
         
         const data = await response.json();
-        console.log('Files successfully indexed:', data);
+        const job = await waitForIngestion(data.job_id, (current) => {
+          setProgress(`${current.files_done}/${current.files_total} files`);
+        });
+        if (job.status === 'failed') {
+          throw new Error(job.error || 'Indexing failed');
+        }
+        console.log('Files successfully indexed:', job);
         setUploadedFiles(Array.from(files).map(file => file.name));
         setIsSuccess(true);
       } catch (error) {
@@ -37,6 +68,7 @@ export default function FileUpload() {
         setIsSuccess(false);
       } finally {
         setIsLoading(false);
+        setProgress('');
       }
     }
   };
@@ -55,7 +87,7 @@ export default function FileUpload() {
           {isLoading ? (
             <div className="flex items-center justify-center gap-2">
               <div className="w-4 h-4 border-2 border-[#FF6600] border-t-transparent rounded-full animate-spin"></div>
-              Uploading...
+              {progress ? `Indexing ${progress}...` : 'Uploading...'}
             </div>
           ) : isSuccess ? (
             <div className="text-green-500">
@@ -44,6 +44,15 @@ interface HVACMetrics {
 }
 }
 
+type MetricGroups = HVACMetrics['HVAC_Metrics'];
+
+// Payload of the `snapshot` and `delta` events of /hvac-metrics/stream
+interface MetricsUpdate {
+  version: number;
+  timestamp: number;
+  HVAC_Metrics: { [G in keyof MetricGroups]?: Partial<MetricGroups[G]> };
+}
+
 export default function Home() {
   const [metrics, setMetrics] = useState<HVACMetrics>({
     HVAC_Metrics: {
@@ -75,46 +84,41 @@ export default function Home() {
   
   const [powerData, setPowerData] = useState<PowerDataPoint[]>([]);
   const [flowData, setFlowData] = useState<FlowDataPoint[]>([]);
-  const stepRef = useRef(1);
+  const metricsRef = useRef<HVACMetrics>(metrics);
 
-  const fetchData = async () => {
-    try {
-      const response = await fetch(
-        `${process.env.NEXT_PUBLIC_BASE_URL}/hvac-metrics/${stepRef.current}`
-      );
-      if (!response.ok) throw new Error('Failed to fetch data');
-      
-      const data: HVACMetrics = await response.json();
-      console.log('Faulty?', data.HVAC_Metrics.System_Status.Flow_Signal_Faulty, stepRef);
-      
-      // Update metrics state
-      setMetrics(data);
-      
-      // Update chart data
-      const timestamp = new Date().toLocaleTimeString();
-      
-      setPowerData(prev => [...prev.slice(-9), {
-        timestamp,
-        kW: data.HVAC_Metrics.Power_Consumption.Absolute_Power_W / 1000
-      }]);
-      
-      setFlowData(prev => [...prev.slice(-9), {
-        timestamp,
-        flow: data.HVAC_Metrics.Flow_Performance.Relative_Flow_Percentage,
-        setpoint: 75 // Setpoint from API or keep hardcoded
-      }]);
+  // Merge a snapshot or delta event into the current metrics and extend the charts
+  const applyUpdate = (update: MetricsUpdate) => {
+    const current = metricsRef.current.HVAC_Metrics;
+    const merged = { ...current };
+    (Object.keys(update.HVAC_Metrics) as (keyof MetricGroups)[]).forEach(group => {
+      Object.assign(merged, { [group]: { ...current[group], ...update.HVAC_Metrics[group] } });
+    });
+    const data: HVACMetrics = { HVAC_Metrics: merged };
+    metricsRef.current = data;
+    setMetrics(data);
 
-      stepRef.current++;
-    } catch (error) {
-      console.error('Error fetching HVAC data:', error);
-    }
+    const timestamp = new Date(update.timestamp * 1000).toLocaleTimeString();
+
+    setPowerData(prev => [...prev.slice(-9), {
+      timestamp,
+      kW: data.HVAC_Metrics.Power_Consumption.Absolute_Power_W / 1000
+    }]);
+
+    setFlowData(prev => [...prev.slice(-9), {
+      timestamp,
+      flow: data.HVAC_Metrics.Flow_Performance.Relative_Flow_Percentage,
+      setpoint: 75 // Setpoint from API or keep hardcoded
+    }]);
   };
 
   useEffect(() => {
-    const interval = setInterval(fetchData, 2500);
-    // Initial fetch
-    fetchData();
-    return () => clearInterval(interval);
+    // The server pushes a full snapshot first, then only the fields that changed
+    const source = new EventSource(`${process.env.NEXT_PUBLIC_BASE_URL}/hvac-metrics/stream`);
+    const onMessage = (event: MessageEvent) => applyUpdate(JSON.parse(event.data));
+    source.addEventListener('snapshot', onMessage);
+    source.addEventListener('delta', onMessage);
+    source.onerror = (error) => console.error('HVAC metrics stream error:', error);
+    return () => source.close();
   }, []);
 
   return (